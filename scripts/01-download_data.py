@@ -18,27 +18,43 @@
 
 
 #### Workspace setup ####
-import pandas as pd
-import os
-
-
-#### Download data ####
-raw_transit_path = "data/01-raw_data/public_transport_access.csv"
-raw_labour_path = "data/01-raw_data/labour_rates.csv"
-raw_commute_path = "data/01-raw_data/commute_times.csv"
-
-
-#### Save data ####
-public_transport_data = pd.read_csv(raw_transit_path)
-labour_data = pd.read_csv(raw_labour_path)
-commute_data = pd.read_csv(raw_commute_path)
-
-
-### Save as Parquet files ###
-transit_path = "data/01-raw_data/public_transport_access.parquet"
-labour_path = "data/01-raw_data/labour_rates.parquet"
-commute_path = "data/01-raw_data/commute_times.parquet"
-
-public_transport_data.to_parquet(transit_path, index=False)
-labour_data.to_parquet(labour_path, index=False)
-commute_data.to_parquet(commute_path, index=False)
+import argparse
+from stages import download_data
+
+
+#### Save as Parquet files ####
+
+# Each table is saved as a directory of Parquet files partitioned by year and dimension
+# (see download_data() in stages.py)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Save the StatCan CSV tables as Parquet")
+    parser.add_argument(
+        "--mode",
+        choices=["streaming", "eager"],
+        default="streaming",
+        help="'streaming' converts each table in bounded batches and drops unused "
+        "columns; 'eager' loads each full CSV with pandas first",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        help="Bytes of CSV parsed per batch in streaming mode",
+    )
+    parser.add_argument(
+        "--download",
+        action="store_true",
+        help="Download the full tables from StatCan instead of reading the CSVs, "
+        "skipping tables that are unchanged since their last download",
+    )
+    parser.add_argument(
+        "--base-url",
+        help="URL the table zips are downloaded from (defaults to StatCan's)",
+    )
+    args = parser.parse_args()
+
+    download_data(
+        mode=args.mode,
+        block_size=args.block_size,
+        download=args.download,
+        base_url=args.base_url,
+    )
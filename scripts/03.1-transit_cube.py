@@ -0,0 +1,18 @@
+#### Preamble ####
+# Purpose: Precompute the transit access cube that dashboards query
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: 02.1-clean_transit_data.py
+
+#### Workspace setup ####
+from stages import build_transit_cube
+
+#### Build cube ####
+
+# Reads data/02-analysis_data/clean_transit_data, and saves
+# data/02-analysis_data/transit_cube.npz (see build_transit_cube() in stages.py);
+# query it with transit_cube.py
+if __name__ == "__main__":
+    build_transit_cube()
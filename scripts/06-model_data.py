@@ -0,0 +1,17 @@
+#### Preamble ####
+# Purpose: Create regression models for participation rates
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: 03-analysis_data.py
+
+#### Workspace setup ####
+from stages import fit_participation_model
+
+#### Model data ####
+
+# Fits the participation model to data/02-analysis_data/analysis_data.parquet and
+# saves it to models/participation_model.npz (see fit_participation_model() in stages.py)
+if __name__ == "__main__":
+    fit_participation_model()
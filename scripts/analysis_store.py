@@ -0,0 +1,299 @@
+#### Preamble ####
+# Purpose: Builds a long-format store of every analysis variant (transit distance
+# category x demographic group x labour metric x commute mode) and slices wide
+# analysis datasets from it
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: 02.1-clean_transit_data.py, 02.2-clean_labour_data.py,
+# 02.3-clean_commute_data.py
+
+#### Workspace setup ####
+import numpy as np
+import pandas as pd
+from census_vintages import align_vintages
+from datasets import read_partitioned
+from tracing import path_bytes, span
+
+#### Define store layout ####
+
+store_path = "data/02-analysis_data/analysis_store.parquet"
+
+# One row per value. Transit rows are keyed by their variant (distance category and
+# demographic group); labour and commute rows are shared by every variant, and
+# commute rows are keyed by census year. Every transit variant is stored; the labour
+# metrics and commute modes are those the store was built with (by default the
+# analysis's, see stages.build_analysis_data()).
+STORE_COLUMNS = [
+    "Source",
+    "CMA_ID",
+    "CMA_Name",
+    "Year",
+    "Transit_Distance_Category",
+    "Transit_Profile_Characteristic",
+    "Metric",
+    "Value",
+]
+
+# Analysis column names of the stored metrics
+METRIC_COLUMNS = {
+    "Transit_Access_Prop": "Transit_Access_Prop",
+    "Car, truck or van": "Avg_Commute_Car",
+    "Public transit": "Avg_Commute_Transit",
+    "Sustainable transportation": "Avg_Commute_Sustainable",
+    "Total - Main mode of commuting": "Avg_Commute_All",
+    "Employment rate": "Employment_Rate",
+    "Participation rate": "Participation_Rate",
+    "Unemployment rate": "Unemployment_Rate",
+    "Population": "Population",
+}
+
+ANALYSIS_COLUMNS = [
+    "CMA_ID",
+    "CMA_Name",
+    "Year",
+    "Population",
+    "Log_Population",
+    "Transit_Access_Prop",
+    "Avg_Commute_Car",
+    "Avg_Commute_Transit",
+    "Commute_Ratio",
+    "Participation_Rate",
+    "Unemployment_Rate",
+]
+
+#### Define store functions ####
+
+
+def transit_variants(transit_data_path, years, categories=None, characteristics=None, unit="Percent"):
+    """
+    Averages the transit access values of every requested variant in one grouped pass.
+
+    Args:
+        transit_data_path: The clean transit dataset directory, or the clean transit
+                           data in memory.
+        years: Years to keep.
+        categories: (Optional) Distance categories to keep; all if None.
+        characteristics: (Optional) Demographic groups to keep; all if None.
+        unit: Unit of measure of the values to keep.
+
+    Returns:
+        The transit rows of the store, and the CMA names keyed by CMA_ID.
+    """
+    filters = [("Year", "in", years), ("Transit_Unit_of_Measure", "==", unit)]
+    if categories is not None:
+        filters.append(("Transit_Distance_Category", "in", categories))
+    if characteristics is not None:
+        filters.append(("Transit_Profile_Characteristic", "in", characteristics))
+
+    transit = read_partitioned(
+        transit_data_path,
+        columns=[
+            "CMA_ID",
+            "CMA",
+            "Year",
+            "Transit_Distance_Category",
+            "Transit_Profile_Characteristic",
+            "Transit_Value",
+        ],
+        filters=filters,
+    )
+    variant_cols = ["Transit_Distance_Category", "Transit_Profile_Characteristic"]
+    with span("groupby", "average transit variants", rows_in=len(transit)) as groupby_span:
+        means = (
+            transit.groupby(["CMA_ID", "Year", *variant_cols], observed=True)["Transit_Value"]
+            .mean()
+            .reset_index(name="Value")
+        )
+        groupby_span.set(rows_out=len(means))
+    cma_names = transit[["CMA_ID", "CMA"]].drop_duplicates().rename(columns={"CMA": "CMA_Name"})
+    return means.assign(Source="transit", Metric="Transit_Access_Prop"), cma_names
+
+
+def labour_variants(labour_data):
+    """
+    Averages the monthly labour values per CMA, metric and year in one grouped pass.
+
+    `labour_data` holds the rows of the metrics to store (read with
+    stages.labour_row_filters()).
+    """
+    with span("groupby", "average labour metrics", rows_in=len(labour_data)) as groupby_span:
+        means = (
+            labour_data.groupby(["CMA_ID", "Labour_Metric", "Year"], observed=True)["Labour_Value"]
+            .mean()
+            .reset_index(name="Value")
+            .rename(columns={"Labour_Metric": "Metric"})
+        )
+        groupby_span.set(rows_out=len(means))
+    return means.assign(Source="labour", Year=means["Year"].astype(int))
+
+
+def commute_variants(commute_data_path, modes):
+    """
+    Averages the commute times per CMA, census year and mode in one grouped pass.
+
+    Only the given `modes` are read. `commute_data_path` may also be the clean commute
+    data in memory.
+    """
+    commute = read_partitioned(
+        commute_data_path,
+        columns=["CMA_ID", "Census_Year", "Commute_Mode", "Commute_Value"],
+        filters=[("Commute_Mode", "in", modes)],
+    )
+    with span("groupby", "average commute modes", rows_in=len(commute)) as groupby_span:
+        means = (
+            commute.groupby(["CMA_ID", "Census_Year", "Commute_Mode"], observed=True)["Commute_Value"]
+            .mean()
+            .reset_index(name="Value")
+            .rename(columns={"Census_Year": "Year", "Commute_Mode": "Metric"})
+        )
+        groupby_span.set(rows_out=len(means))
+    return means.assign(Source="commute")
+
+
+def combine_store(transit_rows, labour_rows, commute_rows, cma_names):
+    """Stacks the rows of each source into the long store, with dimensions as categoricals."""
+    rows = [transit_rows, labour_rows, commute_rows]
+    with span("merge", "combine store", rows_in=sum(len(part) for part in rows)) as merge_span:
+        store = pd.concat(
+            [part.astype({col: object for col in part.columns if col != "Value"}) for part in rows],
+            ignore_index=True,
+        )
+        names = cma_names.astype(object).set_index("CMA_ID")["CMA_Name"]
+        store["CMA_Name"] = store["CMA_ID"].map(names)
+        store["Year"] = store["Year"].astype("Int64")
+
+        dimensions = [col for col in STORE_COLUMNS if col not in ("Year", "Value")]
+        store = store[STORE_COLUMNS].astype({col: "category" for col in dimensions})
+        merge_span.set(rows_out=len(store))
+    return store
+
+
+def write_analysis_store(store, path=store_path):
+    """Saves the store as one Parquet file, with its categorical dimensions dictionary-encoded."""
+    with span("write", "write analysis_store", rows_in=len(store)) as write_span:
+        store.to_parquet(path, index=False)
+        if write_span.enabled:
+            write_span.set(bytes_written=path_bytes(path))
+
+
+def read_analysis_store(path=store_path, distance_category=None, characteristic=None):
+    """
+    Reads the store, or only the rows one variant needs.
+
+    With a distance category and demographic group, only that variant's transit rows
+    are read, along with the shared labour and commute rows.
+    """
+    filters = None
+    if distance_category is not None and characteristic is not None:
+        filters = [
+            [
+                ("Source", "==", "transit"),
+                ("Transit_Distance_Category", "==", distance_category),
+                ("Transit_Profile_Characteristic", "==", characteristic),
+            ],
+            [("Source", "in", ["labour", "commute"])],
+        ]
+    with span("read", "read analysis_store") as read_span:
+        store = pd.read_parquet(path, filters=filters)
+        if read_span.enabled:
+            read_span.set(rows_out=len(store), bytes_read=path_bytes(path))
+    return store
+
+
+def slice_analysis_data(store, distance_category, characteristic, interpolate=False):
+    """
+    Builds the wide analysis data of one variant from the store, without recomputing anything.
+
+    Each transit year takes the commute times of the latest census year at or before
+    it, in one as-of join over every CMA (see census_vintages.align_vintages()).
+
+    Args:
+        store: The store (or the rows of it read for this variant).
+        distance_category: Transit_Distance_Category of the transit access measure.
+        characteristic: Transit_Profile_Characteristic of the transit access measure.
+        interpolate: If True, commute times of years between two census years are
+                     interpolated linearly between them.
+
+    Returns:
+        One row per CMA and year with transit access data, in the ANALYSIS_COLUMNS
+        layout followed by any other labour metrics and commute modes of the store
+        (e.g. Employment_Rate).
+    """
+    with span("filter", "select transit variant", rows_in=len(store)) as filter_span:
+        store = store.astype({"CMA_ID": object, "Metric": object})
+        source = store["Source"].astype(object)
+
+        is_variant = (
+            (source == "transit")
+            & (store["Transit_Distance_Category"] == distance_category)
+            & (store["Transit_Profile_Characteristic"] == characteristic)
+        )
+        transit = store.loc[is_variant, ["CMA_ID", "Year", "CMA_Name", "Value"]]
+        transit = transit.rename(columns={"Value": "Transit_Access_Prop"})
+        transit = transit.astype({"Year": "int64", "CMA_Name": object})
+        transit = transit.sort_values(["CMA_ID", "Year"]).reset_index(drop=True)
+        filter_span.set(rows_out=len(transit))
+
+    with span("pivot", "pivot labour and commute metrics") as pivot_span:
+        commute = store[source == "commute"].astype({"Year": "int64"})
+        commute = commute.pivot(index=["CMA_ID", "Year"], columns="Metric", values="Value")
+        labour = store[source == "labour"].astype({"Year": "int64"})
+        pivot_span.set(rows_in=len(commute) + len(labour))
+        labour = labour.pivot(index=["CMA_ID", "Year"], columns="Metric", values="Value")
+        pivot_span.set(rows_out=len(commute) + len(labour))
+
+    with span("merge", "align census years", rows_in=len(transit)) as merge_span:
+        commute = commute.reset_index().rename(columns={"Year": "Census_Year"})
+        commute = commute.rename_axis(columns=None)
+        commute = align_vintages(transit, commute, interpolate=interpolate)
+        merge_span.set(rows_out=len(commute))
+
+    with span("merge", "join metrics to transit access", rows_in=len(transit)) as merge_span:
+        commute = commute.drop(columns="Census_Year")
+        analysis_data = transit.join(commute).join(labour, on=["CMA_ID", "Year"])
+        analysis_data = analysis_data.rename(columns=METRIC_COLUMNS)
+        merge_span.set(rows_out=len(analysis_data))
+
+    extra_columns = [col for col in analysis_data.columns if col not in ANALYSIS_COLUMNS]
+    analysis_data = analysis_data.reindex(columns=[*ANALYSIS_COLUMNS, *extra_columns])
+
+    # Commute Ratio (Transit time relative to Car time), and Log Population
+    # (Logarithm of Population to reduce skewness)
+    analysis_data["Commute_Ratio"] = (
+        analysis_data["Avg_Commute_Transit"] / analysis_data["Avg_Commute_Car"]
+    )
+    analysis_data["Log_Population"] = np.log10(analysis_data["Population"])
+
+    return analysis_data.astype({"CMA_ID": "category", "CMA_Name": "category"})
+
+
+def update_labour_values(aggregates, path=store_path):
+    """
+    Overwrites the labour rows of the store whose running sums changed.
+
+    Args:
+        aggregates: Running sums from labour_aggregates.refresh_labour_aggregates(),
+                    indexed by (CMA_ID, Labour_Metric, Year). Keys without a row in
+                    the store (e.g. a year outside the analysis) are skipped.
+        path: The store file.
+    """
+    store = read_analysis_store(path)
+    counts = aggregates["Labour_Count"]
+    means = aggregates["Labour_Sum"] / counts.where(counts > 0)
+
+    labour_rows = np.flatnonzero((store["Source"] == "labour").to_numpy())
+    labour = store.iloc[labour_rows]
+    store_keys = pd.MultiIndex.from_arrays([
+        labour["CMA_ID"].astype(object),
+        labour["Metric"].astype(object),
+        labour["Year"].astype("int64"),
+    ])
+    positions = store_keys.get_indexer(means.index)
+    found = positions >= 0
+
+    values = store["Value"].to_numpy(copy=True)
+    values[labour_rows[positions[found]]] = means.to_numpy()[found]
+    store["Value"] = values
+    write_analysis_store(store, path)
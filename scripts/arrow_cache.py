@@ -0,0 +1,264 @@
+#### Preamble ####
+# Purpose: Keeps uncompressed Arrow IPC copies of the partitioned Parquet datasets,
+# which later stages open memory-mapped instead of decoding the Parquet again
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/arrow_cache.py [--root DIR] [--clear]
+
+#### Workspace setup ####
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+from tracing import path_bytes, span
+
+#### Define cache settings ####
+
+# Cache entries, one directory per dataset with the dataset's partition layout, and
+# a JSON file per entry recording what it was built from. Parquet stays the archival
+# format; the cache can be deleted at any time and is rebuilt as stages rerun.
+CACHE_DIR = "data/.cache"
+
+# Total size the cache is kept under, in bytes; the least recently used entries are
+# evicted first. IPC files are uncompressed, so an entry is typically 3 to 4 times
+# the size of its Parquet dataset. 0 turns the cache off.
+CACHE_BYTES = int(os.environ.get("PIPELINE_CACHE_BYTES", 4 * 2**30))
+
+# Datasets read by more than one stage or on every rerun of a stage
+CACHED_DATASETS = [
+    "data/01-raw_data/public_transport_access",
+    "data/01-raw_data/labour_rates",
+    "data/01-raw_data/commute_times",
+    "data/02-analysis_data/clean_transit_data",
+    "data/02-analysis_data/clean_labour_data",
+    "data/02-analysis_data/clean_commute_data",
+]
+
+# Memory-mapped reads: a cached column is paged in from the file (or the page cache)
+# as Arrow buffers, without a copy or any decompression or decoding
+MMAP_FILESYSTEM = pafs.LocalFileSystem(use_mmap=True)
+
+#### Define cache functions ####
+
+
+def entry_paths(root, dataset):
+    """Returns the directory and JSON file of a dataset's cache entry."""
+    entry_dir = os.path.join(root, CACHE_DIR, os.path.basename(dataset))
+    return entry_dir, entry_dir + ".json"
+
+
+def stat_signature(digest, path):
+    """Adds the relative path, size and modification time of every file under `path` to a digest."""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            stat = os.stat(file_path)
+            relative_path = os.path.relpath(file_path, path)
+            digest.update(f"{relative_path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+
+
+def producer_inputs(dataset):
+    """Returns the inputs of the pipeline stage that writes a dataset."""
+    from pipeline import STAGES
+
+    for stage in STAGES.values():
+        if dataset in stage["outputs"]:
+            return stage["inputs"]
+    return []
+
+
+def cache_key(root, dataset):
+    """
+    Hashes what a cache entry depends on: its Parquet dataset and its producer's inputs.
+
+    Only file sizes and modification times are hashed, so checking an entry costs a
+    directory listing rather than a read. Rewriting the Parquet (by any means) or
+    changing an input of the stage that writes it invalidates the entry.
+    """
+    digest = hashlib.sha256()
+    for path in [dataset, *producer_inputs(dataset)]:
+        digest.update(path.encode())
+        stat_signature(digest, os.path.join(root, path))
+    return digest.hexdigest()
+
+
+def invalidate(root, dataset):
+    """Deletes a dataset's cache entry, if any."""
+    entry_dir, entry_json = entry_paths(root, dataset)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(entry_json)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def write_cache(root, dataset, partitioning):
+    """
+    Copies a Parquet dataset into its IPC cache entry, then evicts entries over the budget.
+
+    The copy streams one Parquet file at a time, so memory is bounded by the largest
+    file rather than the dataset. IPC files hold one dictionary per column, so the
+    dictionaries of each file's row groups are unified before it is written.
+
+    Args:
+        root: Directory the data paths are relative to.
+        dataset: A path in CACHED_DATASETS.
+        partitioning: The dataset's Hive partitioning (datasets.partitioning()).
+    """
+    if CACHE_BYTES <= 0 or dataset not in CACHED_DATASETS:
+        return
+    invalidate(root, dataset)
+
+    entry_dir, entry_json = entry_paths(root, dataset)
+    tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+    source = ds.dataset(
+        os.path.join(root, dataset), format="parquet", partitioning=partitioning
+    )
+    ipc_format = ds.IpcFileFormat()
+
+    with span("write", f"cache {os.path.basename(dataset)}") as write_span:
+        try:
+            rows = 0
+            batches = []
+            fragment = None
+            scanned = source.scanner(fragment_readahead=1).scan_batches()
+            for index, tagged in enumerate(itertools.chain(scanned, [None])):
+                if batches and (tagged is None or tagged.fragment.path != fragment):
+                    table = pa.Table.from_batches(batches).unify_dictionaries()
+                    ds.write_dataset(
+                        table,
+                        tmp_dir,
+                        format=ipc_format,
+                        partitioning=partitioning,
+                        # Zero-padded so the files list, and so read, in the Parquet's order
+                        basename_template=f"part-{index:06d}-{{i}}.arrow",
+                        file_options=ipc_format.make_write_options(compression=None),
+                        existing_data_behavior="overwrite_or_ignore",
+                        preserve_order=True,
+                    )
+                    rows += table.num_rows
+                    batches = []
+                if tagged is not None:
+                    batches.append(tagged.record_batch)
+                    fragment = tagged.fragment.path
+            os.makedirs(tmp_dir, exist_ok=True)
+            os.rename(tmp_dir, entry_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        entry_bytes = path_bytes(entry_dir)
+        write_span.set(rows_in=rows, bytes_written=entry_bytes)
+
+    entry = {
+        "dataset": dataset,
+        "key": cache_key(root, dataset),
+        "rows": rows,
+        "bytes": entry_bytes,
+    }
+    tmp_json = f"{entry_json}.tmp-{os.getpid()}"
+    with open(tmp_json, "w") as f:
+        json.dump(entry, f, indent=2, sort_keys=True)
+    os.replace(tmp_json, entry_json)
+    evict(root)
+
+
+def open_cache(root, dataset, partitioning):
+    """
+    Opens a dataset's cache entry memory-mapped, if it is still valid.
+
+    Returns:
+        A pyarrow Dataset over the IPC files, or None if the dataset is not cached or
+        its Parquet or producer's inputs changed since the entry was written (in
+        which case the entry is deleted).
+    """
+    if CACHE_BYTES <= 0 or dataset not in CACHED_DATASETS:
+        return None
+    entry_dir, entry_json = entry_paths(root, dataset)
+    try:
+        with open(entry_json) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if entry["key"] != cache_key(root, dataset):
+        invalidate(root, dataset)
+        return None
+    try:
+        cached = ds.dataset(
+            entry_dir, format="ipc", partitioning=partitioning, filesystem=MMAP_FILESYSTEM
+        )
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    # The JSON file's modification time is the entry's last use, for eviction
+    os.utime(entry_json)
+    return cached
+
+
+def cache_entries(root):
+    """Returns the cache entries under `root`, least recently used first."""
+    cache_dir = os.path.join(root, CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        entry_json = os.path.join(cache_dir, name)
+        try:
+            with open(entry_json) as f:
+                entry = json.load(f)
+            entry["last_used"] = os.stat(entry_json).st_mtime
+        except (OSError, ValueError):
+            continue
+        entries.append(entry)
+    return sorted(entries, key=lambda entry: entry["last_used"])
+
+
+def evict(root, budget=None):
+    """
+    Deletes the least recently used cache entries until the cache fits the budget.
+
+    Returns:
+        The datasets whose entries were deleted.
+    """
+    budget = CACHE_BYTES if budget is None else budget
+    entries = cache_entries(root)
+    total = sum(entry["bytes"] for entry in entries)
+    evicted = []
+    for entry in entries:
+        if total <= budget:
+            break
+        invalidate(root, entry["dataset"])
+        total -= entry["bytes"]
+        evicted.append(entry["dataset"])
+    return evicted
+
+
+#### Show the cache ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or clear the Arrow IPC dataset cache")
+    parser.add_argument("--root", default=".", help="Directory the data paths are relative to")
+    parser.add_argument("--clear", action="store_true", help="Delete every cache entry")
+    args = parser.parse_args()
+
+    if args.clear:
+        evict(args.root, budget=0)
+    entries = cache_entries(args.root)
+    for entry in reversed(entries):
+        print(f"{entry['dataset']:<45} {entry['rows']:>12} rows {entry['bytes'] / 2**20:>9.1f} MB")
+    total = sum(entry["bytes"] for entry in entries)
+    print(f"{len(entries)} entries, {total / 2**20:.1f} MB of {CACHE_BYTES / 2**20:.0f} MB")
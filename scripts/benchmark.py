@@ -0,0 +1,273 @@
+#### Preamble ####
+# Purpose: Benchmarks each pipeline stage on synthetic StatCan-shaped data, recording
+# wall time, peak memory and throughput, and saves the results for diffing
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/benchmark.py [--geographies N] [--years N] [--months N]
+# [--demographics N] [--repeat N] [--output results.json] [--compare baseline.json]
+
+#### Workspace setup ####
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from datasets import partitioning
+from pipeline import SCRIPTS_DIR, PROJECT_ROOT, STAGES
+from synthetic_data import SyntheticScale, write_synthetic_data
+
+#### Define benchmark settings ####
+
+# Stages timed, in the order they run; 05 is the R package install and is left out
+BENCHMARK_STAGES = ["01", "02.1", "02.2", "02.3", "03", "04", "06"]
+
+# Benchmark results, one JSON file per scale, kept in the repository so a change in
+# performance between versions shows up in `git diff`
+RESULTS_DIR = "other/benchmarks"
+
+# Slowdown (as a fraction of the baseline) flagged by --compare
+REGRESSION_THRESHOLD = 0.2
+
+#### Define benchmark functions ####
+
+
+def count_rows(path):
+    """Returns the number of data rows of a StatCan CSV, Parquet file or dataset directory."""
+    if path.endswith(".csv"):
+        with open(path, "rb") as f:
+            lines = sum(block.count(b"\n") for block in iter(lambda: f.read(1024 * 1024), b""))
+        # Header line and the blank lines StatCan appends
+        return lines - 3
+    if os.path.isdir(path):
+        return ds.dataset(path, format="parquet", partitioning=partitioning(path)).count_rows()
+    return ds.dataset(path, format="parquet").count_rows()
+
+
+def stage_input_rows(stage, root):
+    """Returns the rows a stage reads: the sum of its data inputs' rows."""
+    return sum(
+        count_rows(os.path.join(root, input_path))
+        for input_path in stage["inputs"]
+        if not input_path.startswith("data/00-reference")
+    )
+
+
+def measure_stage(stage, root, log_path):
+    """
+    Runs one stage's script in a child process from `root`.
+
+    The child's peak resident set size comes from its own resource usage (wait4),
+    so it excludes the benchmark process and the other stages. The model registry
+    is turned off, so every run of 06 fits its model rather than loading the fit of
+    an earlier run.
+
+    Returns:
+        Wall time in seconds, peak RSS in bytes, and the exit code.
+    """
+    script_path = os.path.join(SCRIPTS_DIR, stage["script"])
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, script_path],
+            cwd=root,
+            env={**os.environ, "MODEL_REGISTRY_BYTES": "0"},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return wall_seconds, peak_rss, process.returncode
+
+
+def run_benchmark(scale, root, repeat=1, seed=0):
+    """
+    Generates synthetic data under `root` and times each stage on it.
+
+    Each stage is run `repeat` times in a row and its best wall time and lowest peak
+    RSS are kept, which filters out noise from other work on the machine. A stage
+    whose dependencies failed is skipped (see failed_stages()).
+
+    Args:
+        scale: A SyntheticScale.
+        root: Scratch directory the data is written to and the stages run in.
+        repeat: Runs per stage.
+        seed: Seed of the synthetic values.
+
+    Returns:
+        A dict of the scale, the environment and each stage's results.
+    """
+    # A child's peak RSS starts from its parent's, so the data is written by a process
+    # of its own and the benchmark process stays as small as the stages it starts
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        csv_rows = pool.apply(write_synthetic_data, (root, scale), {"seed": seed})
+    generate_seconds = time.perf_counter() - start
+
+    stages = {}
+    failed = set()
+    for name in BENCHMARK_STAGES:
+        stage = STAGES[name]
+        if failed & set(stage["depends_on"]):
+            stages[name] = {"skipped": "a dependency failed"}
+            failed.add(name)
+            continue
+
+        log_path = os.path.join(root, f"stage_{name}.log")
+        runs = [measure_stage(stage, root, log_path) for _ in range(repeat)]
+        wall_seconds = min(run[0] for run in runs)
+        exit_code = max((run[2] for run in runs), key=abs)
+        if exit_code:
+            failed.add(name)
+            with open(log_path) as log:
+                print(log.read()[-2000:], end="")
+
+        rows = stage_input_rows(stage, root)
+        stages[name] = {
+            "script": stage["script"],
+            "exit_code": exit_code,
+            "rows": rows,
+            "wall_seconds": round(wall_seconds, 3),
+            "peak_rss_mb": round(min(run[1] for run in runs) / 2**20, 1),
+            "rows_per_second": round(rows / wall_seconds) if wall_seconds else None,
+        }
+        print(
+            f"[{name}] {stages[name]['wall_seconds']:.2f}s, "
+            f"{stages[name]['peak_rss_mb']:.0f} MB peak RSS, "
+            f"{stages[name]['rows_per_second']} rows/s (exit {exit_code})"
+        )
+
+    return {
+        "scale": asdict(scale),
+        "seed": seed,
+        "repeat": repeat,
+        "csv_rows": csv_rows,
+        "generate_seconds": round(generate_seconds, 3),
+        "environment": {
+            "python": platform.python_version(),
+            "pyarrow": pa.__version__,
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": stages,
+    }
+
+
+def failed_stages(results):
+    """Returns a message for each stage of a run that exited non-zero or was skipped."""
+    messages = []
+    for name, stage in results["stages"].items():
+        if "skipped" in stage:
+            messages.append(f"[{name}] skipped ({stage['skipped']})")
+        elif stage["exit_code"]:
+            messages.append(f"[{name}] failed (exit {stage['exit_code']})")
+    return messages
+
+
+def results_path(scale):
+    """Returns the default results file of a scale, relative to the project root."""
+    name = f"benchmark_{scale.geographies}g_{scale.years}y_{scale.months}m_{scale.demographics}d.json"
+    return os.path.join(RESULTS_DIR, name)
+
+
+def write_results(results, path):
+    """Saves results as sorted, indented JSON so runs diff cleanly between versions."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Prints each stage's change in wall time and peak RSS against a baseline run.
+
+    Returns:
+        The stages whose wall time or peak RSS grew by more than `threshold`.
+    """
+    regressions = []
+    for name, stage in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if not before or "wall_seconds" not in before or "wall_seconds" not in stage:
+            continue
+        time_change = stage["wall_seconds"] / before["wall_seconds"] - 1
+        rss_change = stage["peak_rss_mb"] / before["peak_rss_mb"] - 1
+        flag = ""
+        if time_change > threshold or rss_change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"[{name}] wall time {time_change:+.0%}, peak RSS {rss_change:+.0%}{flag}")
+    return regressions
+
+
+#### Run benchmark ####
+
+if __name__ == "__main__":
+    defaults = SyntheticScale()
+    parser = argparse.ArgumentParser(
+        description="Time each pipeline stage on synthetic StatCan-shaped data"
+    )
+    parser.add_argument("--geographies", type=int, default=defaults.geographies)
+    parser.add_argument("--years", type=int, default=defaults.years)
+    parser.add_argument("--months", type=int, default=defaults.months)
+    parser.add_argument("--demographics", type=int, default=defaults.demographics)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workdir",
+        help="Scratch directory for the synthetic data (a temporary one is removed afterwards)",
+    )
+    parser.add_argument(
+        "--output",
+        help=f"Results file (default: {RESULTS_DIR}/benchmark_<scale>.json under the project root)",
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="BASELINE",
+        help="Results file of an earlier run to compare against; exits with an error on a regression",
+    )
+    args = parser.parse_args()
+
+    scale = SyntheticScale(args.geographies, args.years, args.months, args.demographics)
+    root = args.workdir or tempfile.mkdtemp(prefix="benchmark_")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    try:
+        results = run_benchmark(scale, root, repeat=args.repeat, seed=args.seed)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    # A failed stage's timings are not comparable, so its results are never saved
+    failures = failed_stages(results)
+    if failures:
+        print("\n".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+    output_path = args.output or os.path.join(PROJECT_ROOT, results_path(scale))
+    write_results(results, output_path)
+    print(f"Saved results to {output_path}")
+
+    if baseline is not None and compare_results(results, baseline):
+        sys.exit(1)
@@ -0,0 +1,108 @@
+#### Preamble ####
+# Purpose: Aligns census-vintage data (e.g. the 2016 and 2021 commute tables) to the
+# geographies and years of the annual transit and labour data
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+
+#### Workspace setup ####
+import numpy as np
+import pandas as pd
+
+#### Define vintage settings ####
+
+# A DGUID starts with the census vintage of its geography (e.g. 2016S0503535 and
+# 2021S0503535 are Toronto in the 2016 and 2021 boundaries); the rest is the same
+# across vintages unless the boundaries changed, which the DGUID crosswalk handles
+VINTAGE_DIGITS = 4
+
+#### Define vintage functions ####
+
+
+def dguid_vintages(ids):
+    """Returns the distinct census vintages of a collection of DGUIDs, sorted."""
+    ids = pd.Index(pd.unique(np.asarray(ids, dtype=object)))
+    return sorted(ids.str[:VINTAGE_DIGITS].astype(int).unique())
+
+
+def remap_vintage(column, vintage):
+    """
+    Rewrites every DGUID in a column to the given census vintage.
+
+    Categorical columns are rewritten through their categories, so each distinct
+    DGUID is rewritten once however many rows hold it; the same geography in
+    several vintages ends up as one category.
+
+    Args:
+        column: A Series of DGUIDs, after the crosswalk has been applied (so any
+                geography whose boundaries changed already has its new DGUID).
+        vintage: Census year to rewrite them to, e.g. 2021.
+
+    Returns:
+        A new Series with the rewritten DGUIDs, categorical if `column` was.
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        remapped = str(vintage) + column.astype(object).str[VINTAGE_DIGITS:]
+        return remapped.rename(column.name)
+
+    categories = str(vintage) + column.cat.categories.astype(object).str[VINTAGE_DIGITS:]
+    category_codes, new_categories = pd.factorize(categories)
+    # Missing DGUIDs have code -1, which picks the trailing -1
+    codes = np.append(category_codes, -1)[column.cat.codes.to_numpy()]
+    remapped = pd.Categorical.from_codes(codes, categories=new_categories)
+    return pd.Series(remapped, index=column.index, name=column.name)
+
+
+def align_vintages(rows, census, by="CMA_ID", on="Year", interpolate=False):
+    """
+    Matches each (geography, year) row to the latest census vintage at or before its year.
+
+    The match is one sorted as-of join per geography key over every row at once, so
+    its cost grows with the number of rows, not with the number of years or
+    geographies. Years before a geography's first vintage get no values.
+
+    Args:
+        rows: Frame with `by` and `on` columns, e.g. the transit access rows.
+        census: Frame with `by`, `Census_Year` and value columns, one row per
+                geography and vintage.
+        by: Geography key shared by both frames, in the same DGUID vintage.
+        on: Year column of `rows`.
+        interpolate: If True, years between two vintages are interpolated linearly
+                     between their values; years after the latest vintage keep
+                     its values.
+
+    Returns:
+        A frame indexed like `rows`, with the `Census_Year` matched and the value
+        columns of `census`.
+    """
+    value_cols = [col for col in census.columns if col not in (by, "Census_Year")]
+
+    # The as-of join needs both sides sorted by year and the keys in the same dtype
+    keys = rows[[by, on]].astype({by: object, on: "int64"}).sort_values(on, kind="stable")
+    census = census.astype({by: object, "Census_Year": "int64"})
+    census = census.sort_values("Census_Year", kind="stable")
+
+    def join(direction):
+        joined = pd.merge_asof(
+            keys, census, left_on=on, right_on="Census_Year", by=by, direction=direction
+        )
+        joined.index = keys.index
+        return joined
+
+    aligned = join("backward")
+    if interpolate:
+        following = join("forward")
+        gap = (following["Census_Year"] - aligned["Census_Year"]).to_numpy(dtype="float64")
+        elapsed = (keys[on] - aligned["Census_Year"]).to_numpy(dtype="float64")
+        # Zero at a vintage, after the latest one, and where there is no earlier one
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = np.where(gap > 0, elapsed / gap, 0.0)
+        for col in value_cols:
+            previous = aligned[col].to_numpy(dtype="float64")
+            change = following[col].to_numpy(dtype="float64") - previous
+            aligned[col] = previous + np.where((weight > 0) & ~np.isnan(change), weight * change, 0.0)
+
+    aligned["Census_Year"] = aligned["Census_Year"].astype("Int64")
+    return aligned.loc[rows.index, ["Census_Year", *value_cols]]
@@ -0,0 +1,291 @@
+#### Preamble ####
+# Purpose: Profiles the columns of a Parquet dataset in one streaming pass over its row groups
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/column_profile.py <dataset> [--output profile.json]
+
+#### Workspace setup ####
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from datasets import partitioning
+from tracing import span
+
+#### Define profiling settings ####
+
+# Columns with at most this many distinct values get exact value counts;
+# larger ones fall back to the HyperLogLog estimate
+EXACT_THRESHOLD = 100
+
+# Example values kept per column
+SAMPLE_SIZE = 5
+
+# HyperLogLog precision: 2**14 registers give a ~0.8% standard error in 16 KB
+HLL_PRECISION = 14
+
+#### Define profiling functions ####
+
+
+def bit_length(values):
+    """
+    Returns the number of significant bits of each value in a uint64 array.
+
+    The exponent np.frexp returns is the bit length. Each 32-bit half converts to
+    float64 exactly, so the lengths are exact for every value.
+    """
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    lengths = np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+    return lengths.astype(np.uint8)
+
+
+class HyperLogLog:
+    """Approximate distinct counter over 64-bit hashes (Flajolet et al., 2007)."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        """Adds an array of uint64 hashes."""
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        remainder = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        rank = (64 - self.precision) - bit_length(remainder) + 1
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        """Returns the estimated number of distinct hashes added."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+def batch_value_counts(values):
+    """Returns the distinct values of a non-null Arrow array and how often each occurs."""
+    if pa.types.is_dictionary(values.type):
+        counts = np.bincount(values.indices.to_numpy(), minlength=len(values.dictionary))
+        used = np.flatnonzero(counts)
+        return values.dictionary.take(used), counts[used]
+    value_counts = pc.value_counts(values)
+    return value_counts.field("values"), value_counts.field("counts").to_numpy()
+
+
+def value_hashes(values):
+    """
+    Hashes each value of a non-null, plain Arrow array to a uint64.
+
+    A value's hash does not depend on the array holding it (the values are hashed as
+    validation.row_hashes hashes a dictionary), so hashes add up across batches.
+    """
+    return pd.util.hash_array(values.to_numpy(zero_copy_only=False), categorize=False)
+
+
+class ColumnProfile:
+    """Running statistics for one column, updated one batch at a time."""
+
+    def __init__(self, exact_threshold, sample_size, rng):
+        self.rows = 0
+        self.nulls = 0
+        self.seen = 0
+        self.hll = HyperLogLog()
+        self.exact_counts = {}
+        self.is_exact = True
+        self.exact_threshold = exact_threshold
+        self.sample = []
+        self.sample_size = sample_size
+        self.rng = rng
+        self.is_numeric = None
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        """
+        Adds a batch of values (an Arrow array).
+
+        The batch's distinct values are found once, from the dictionary of a dictionary
+        column (as the categorical columns load) or by one hash pass otherwise, and
+        only they are hashed and counted: repeats leave a HyperLogLog unchanged.
+        Numbers no longer counted exactly are hashed in place instead.
+        """
+        self.rows += len(values)
+        self.nulls += values.null_count
+        if values.null_count:
+            values = pc.drop_null(values)
+        if not len(values):
+            return
+
+        if self.is_numeric is None:
+            value_type = values.type.value_type if pa.types.is_dictionary(values.type) else values.type
+            self.is_numeric = pa.types.is_integer(value_type) or pa.types.is_floating(value_type)
+
+        if self.is_exact or not self.is_numeric or pa.types.is_dictionary(values.type):
+            distinct, counts = batch_value_counts(values)
+            self.hll.add(value_hashes(distinct))
+            if self.is_exact:
+                self.add_counts(distinct, counts)
+        else:
+            self.hll.add(value_hashes(values))
+
+        if self.is_numeric:
+            if pa.types.is_dictionary(values.type):
+                values = values.dictionary_decode()
+            numbers = values.to_numpy()
+            batch_min, batch_max = numbers.min(), numbers.max()
+            self.min = batch_min if self.min is None else min(self.min, batch_min)
+            self.max = batch_max if self.max is None else max(self.max, batch_max)
+            self.total += float(numbers.sum())
+
+        self.sample_reservoir(values)
+        self.seen += len(values)
+
+    def add_counts(self, distinct, counts):
+        """Adds a batch's value counts, or stops counting once there are too many distinct values."""
+        if len(distinct) <= self.exact_threshold:
+            for value, count in zip(distinct.to_pylist(), counts.tolist()):
+                self.exact_counts[value] = self.exact_counts.get(value, 0) + count
+        if len(distinct) > self.exact_threshold or len(self.exact_counts) > self.exact_threshold:
+            self.is_exact = False
+            self.exact_counts = None
+
+    def sample_reservoir(self, values):
+        """Keeps a uniform sample of the non-null values seen so far (reservoir sampling)."""
+        fill = min(self.sample_size - len(self.sample), len(values))
+
+        # Value i of the stream replaces a random slot with probability k / (i + 1);
+        # the slots are drawn first, so only the accepted values are taken from the batch
+        positions = self.seen + np.arange(fill, len(values))
+        slots = (self.rng.random(len(positions)) * (positions + 1)).astype(np.int64)
+        accepted = np.flatnonzero(slots < self.sample_size)
+        taken = values.take(np.concatenate([np.arange(fill), fill + accepted])).to_pylist()
+
+        self.sample.extend(taken[:fill])
+        for slot, value in zip(slots[accepted], taken[fill:]):
+            self.sample[slot] = value
+
+    def to_dict(self):
+        """Returns the profile as JSON-serializable values."""
+        profile = {
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "distinct": len(self.exact_counts) if self.is_exact else self.hll.count(),
+            "distinct_is_exact": self.is_exact,
+            "examples": [to_json_value(value) for value in self.sample],
+        }
+        if self.is_exact:
+            profile["value_counts"] = {
+                str(value): count for value, count in sorted(self.exact_counts.items())
+            }
+        if self.is_numeric and self.seen:
+            profile["min"] = to_json_value(self.min)
+            profile["max"] = to_json_value(self.max)
+            profile["mean"] = self.total / self.seen
+        return profile
+
+
+def to_json_value(value):
+    """Converts a NumPy scalar to the matching Python value."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def profile_parquet(
+    path,
+    columns=None,
+    exact_threshold=EXACT_THRESHOLD,
+    sample_size=SAMPLE_SIZE,
+    seed=0,
+):
+    """
+    Profiles the columns of a Parquet file or partitioned dataset in one streaming pass.
+
+    Only one record batch is in memory at a time. Each column gets its row and null
+    counts, a HyperLogLog estimate of its distinct values (exact value counts if it
+    has at most `exact_threshold` of them), a reservoir sample of example values, and
+    min/max/mean if it is numeric.
+
+    Args:
+        path: A Parquet file, or a dataset directory registered in datasets.PARTITION_FIELDS.
+        columns: (Optional) Columns to profile. Profiles every column if None.
+        exact_threshold: Largest number of distinct values counted exactly.
+        sample_size: Example values kept per column.
+        seed: Seed for the reservoir sample, so repeated runs give identical profiles.
+
+    Returns:
+        A dict that can be saved with write_profile() and diffed between runs.
+    """
+    if os.path.isdir(path):
+        dataset = ds.dataset(path, format="parquet", partitioning=partitioning(path))
+    else:
+        dataset = ds.dataset(path, format="parquet")
+    columns = columns or dataset.schema.names
+
+    rng = np.random.default_rng(seed)
+    profiles = {col: ColumnProfile(exact_threshold, sample_size, rng) for col in columns}
+    rows = 0
+    with span("profile", f"profile {os.path.basename(os.path.normpath(path))}") as profile_span:
+        # Decoded on this thread: the profile is the slow side, and a threaded scan
+        # decodes batches far ahead of it, holding them all in memory
+        for batch in dataset.to_batches(columns=columns, use_threads=False):
+            rows += batch.num_rows
+            for col in columns:
+                profiles[col].update(batch.column(col))
+        profile_span.set(rows_in=rows)
+
+    return {
+        "dataset": str(path),
+        "rows": rows,
+        "columns": {col: profiles[col].to_dict() for col in columns},
+    }
+
+
+def write_profile(profile, profile_path):
+    """Saves a profile as sorted, indented JSON so profiles diff cleanly between runs."""
+    os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+
+
+def print_profile(profile):
+    """Prints a short summary of each column of a profile."""
+    for col, column_profile in profile["columns"].items():
+        approx = "" if column_profile["distinct_is_exact"] else "~"
+        print(
+            f"--- {col} ({approx}{column_profile['distinct']} unique values, "
+            f"{column_profile['nulls']} missing) ---"
+        )
+        print(column_profile["examples"])
+        print("\n")
+
+
+#### Profile a dataset ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the columns of a Parquet dataset")
+    parser.add_argument("path", help="Parquet file or partitioned dataset directory")
+    parser.add_argument("--output", help="Save the profile as JSON to this path")
+    parser.add_argument("--exact-threshold", type=int, default=EXACT_THRESHOLD)
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+    args = parser.parse_args()
+
+    profile = profile_parquet(
+        args.path, exact_threshold=args.exact_threshold, sample_size=args.sample_size
+    )
+    print_profile(profile)
+    if args.output:
+        write_profile(profile, args.output)
@@ -0,0 +1,162 @@
+#### Preamble ####
+# Purpose: Applies the geography crosswalk (DGUID remaps, drops and splits) to a dataset
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+
+#### Workspace setup ####
+import os
+
+import numpy as np
+import pandas as pd
+
+#### Define crosswalk settings ####
+
+# Hand-curated table of geography fixes, one row per (source DGUID, target) pair:
+#   remap: the source DGUID is replaced by a single target DGUID
+#   drop:  rows with the source DGUID are removed
+#   split: rows are copied once per target DGUID, with values scaled by `weight`
+# Rows are grouped by `dataset` (the raw table they apply to) and `version`, so a
+# revised set of boundary fixes can be added without changing past results.
+# It is reference data of the repository, so it is found from the project root
+# rather than the working directory (which may hold other data, e.g. synthetic).
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+crosswalk_path = os.path.join(PROJECT_ROOT, "data/00-reference/dguid_crosswalk.csv")
+
+CROSSWALK_VERSION = 1
+
+CROSSWALK_ACTIONS = {"remap", "drop", "split"}
+
+#### Define crosswalk functions ####
+
+
+def load_crosswalk(dataset, version=CROSSWALK_VERSION, path=crosswalk_path):
+    """
+    Reads the crosswalk rows for one dataset and version, checking they are well formed.
+
+    Args:
+        dataset: Raw table the fixes apply to, e.g. "labour_rates".
+        version: Crosswalk version to use.
+        path: Crosswalk CSV file.
+    """
+    crosswalk = pd.read_csv(
+        path,
+        dtype={"source_dguid": str, "target_dguid": str, "target_geo": str},
+    )
+    crosswalk = crosswalk[
+        (crosswalk["dataset"] == dataset) & (crosswalk["version"] == version)
+    ].reset_index(drop=True)
+
+    unknown = set(crosswalk["action"]) - CROSSWALK_ACTIONS
+    if unknown:
+        raise ValueError(f"Unknown crosswalk action(s): {sorted(unknown)}")
+
+    actions = crosswalk.groupby("source_dguid")["action"].agg(["nunique", "first", "size"])
+    if (actions["nunique"] > 1).any():
+        raise ValueError("Each source DGUID must have a single crosswalk action")
+    if ((actions["first"] != "split") & (actions["size"] > 1)).any():
+        raise ValueError("Only split rows may share a source DGUID")
+
+    is_drop = crosswalk["action"] == "drop"
+    if crosswalk.loc[~is_drop, "target_dguid"].isna().any():
+        raise ValueError("Remap and split rows need a target DGUID")
+
+    crosswalk["weight"] = crosswalk["weight"].fillna(1.0)
+    return crosswalk
+
+
+def replace_values(column, rows, new_values):
+    """
+    Returns a copy of `column` with the values at `rows` (a mask or positions) replaced.
+
+    Categorical columns are rewritten through their codes, with any new values added
+    as categories, so the strings are never expanded row by row.
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        values = column.to_numpy(dtype=object, copy=True)
+        values[rows] = new_values
+        return pd.Series(values, index=column.index, name=column.name)
+
+    categories = column.cat.categories.union(pd.Index(new_values).unique(), sort=False)
+    codes = column.cat.codes.to_numpy().copy()
+    codes[rows] = categories.get_indexer(new_values)
+    replaced = pd.Categorical.from_codes(codes, categories=categories)
+    return pd.Series(replaced, index=column.index, name=column.name).cat.remove_unused_categories()
+
+
+def apply_crosswalk(df, crosswalk, id_col="DGUID", name_col="GEO", value_cols=()):
+    """
+    Applies every remap, drop and split in a crosswalk to a dataset in one vectorized pass.
+
+    Each row's ID is looked up once in a hash index of the crosswalk's source DGUIDs;
+    rows are then repeated zero (drop), one (remap or untouched) or several (split)
+    times with a single take, and their IDs, names and values rewritten in place.
+    The cost is one join however many fixes the crosswalk holds.
+
+    Args:
+        df: The dataset to fix.
+        crosswalk: Rows from load_crosswalk().
+        id_col: Column holding the DGUIDs.
+        name_col: (Optional) Column holding geography names, replaced by `target_geo`
+                  where the crosswalk gives one.
+        value_cols: Columns multiplied by the crosswalk weight (e.g. counts that are
+                    apportioned across split parts). Averages and rates are left as is.
+
+    Returns:
+        A new DataFrame with the fixes applied. Categorical ID and name columns stay
+        categorical.
+    """
+    # A dataset (or vintage) without fixes is returned as it is
+    if crosswalk.empty:
+        return df.copy()
+
+    # Targets grouped by source DGUID; drops have no targets
+    crosswalk = crosswalk.sort_values("source_dguid", kind="stable")
+    targets = crosswalk[crosswalk["action"] != "drop"]
+    sources = pd.Index(crosswalk["source_dguid"].unique())
+    target_counts = (
+        targets.groupby("source_dguid").size().reindex(sources, fill_value=0).to_numpy()
+    )
+    target_starts = np.cumsum(target_counts) - target_counts
+
+    # Position of each row's DGUID among the sources, or -1 if it is not in the crosswalk
+    # (looked up once per category for categorical IDs)
+    ids = df[id_col]
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        # Missing IDs have code -1, which picks the trailing -1
+        category_pos = np.append(sources.get_indexer(ids.cat.categories), -1)
+        source_pos = category_pos[ids.cat.codes.to_numpy()]
+    else:
+        source_pos = sources.get_indexer(ids.astype(object))
+    matched = source_pos >= 0
+    repeats = np.where(matched, target_counts[source_pos], 1)
+
+    row_idx = np.repeat(np.arange(len(df)), repeats)
+    fixed = df.iloc[row_idx].reset_index(drop=True)
+
+    # For each output row, which of its source's targets it takes
+    pos = np.repeat(source_pos, repeats)
+    out_matched = pos >= 0
+    offset = np.arange(len(row_idx)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    target_idx = target_starts[pos[out_matched]] + offset[out_matched]
+
+    target_dguid = targets["target_dguid"].to_numpy()[target_idx]
+    target_geo = targets["target_geo"].to_numpy()[target_idx]
+    weight = targets["weight"].to_numpy()[target_idx]
+
+    fixed[id_col] = replace_values(fixed[id_col], out_matched, target_dguid)
+
+    if name_col:
+        has_geo = pd.notna(target_geo)
+        fixed[name_col] = replace_values(
+            fixed[name_col], np.flatnonzero(out_matched)[has_geo], target_geo[has_geo]
+        )
+
+    for col in value_cols:
+        values = fixed[col].to_numpy(dtype="float64", copy=True)
+        values[out_matched] *= weight
+        fixed[col] = values
+
+    return fixed
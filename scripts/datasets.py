@@ -0,0 +1,465 @@
+#### Preamble ####
+# Purpose: Defines the partitioned Parquet layout of the raw and clean datasets
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+
+#### Workspace setup ####
+import functools
+import itertools
+import operator
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from arrow_cache import invalidate, open_cache, write_cache
+from tracing import path_bytes, span
+from utility_functions import build_id_index
+
+#### Define dataset layout ####
+
+# Each dataset is a directory of Hive-style partitions (e.g. REF_DATE=2023/...),
+# keyed by year and the dimension its readers filter on most
+PARTITION_FIELDS = {
+    "data/01-raw_data/public_transport_access": [
+        pa.field("REF_DATE", pa.int64()),
+        pa.field("Distance-capacity public transit service area", pa.string()),
+    ],
+    "data/01-raw_data/labour_rates": [
+        pa.field("REF_YEAR", pa.int64()),
+        pa.field("Data type", pa.string()),
+    ],
+    "data/01-raw_data/commute_times": [
+        pa.field("REF_DATE", pa.int64()),
+    ],
+    "data/02-analysis_data/clean_transit_data": [
+        pa.field("Year", pa.int64()),
+        pa.field("Transit_Distance_Category", pa.string()),
+    ],
+    "data/02-analysis_data/clean_labour_data": [
+        pa.field("Year", pa.string()),
+        pa.field("Labour_Data_Type", pa.string()),
+    ],
+    "data/02-analysis_data/clean_commute_data": [
+        pa.field("Census_Year", pa.int64()),
+        pa.field("Commute_Mode", pa.string()),
+    ],
+    "data/02-analysis_data/labour_months": [
+        pa.field("Time_Period", pa.string()),
+    ],
+}
+
+# Rows per Parquet row group, so predicates can skip row groups inside a partition
+MAX_ROWS_PER_GROUP = 128 * 1024
+
+# Fewest rows a row group is written with (except a partition's last), so many
+# small batches do not leave many small row groups
+MIN_ROWS_PER_GROUP = 16 * 1024
+
+# Largest dictionary page a partition appended to batch by batch is written with.
+# Each open file keeps a buffer this size per column (1 MB by default); a column
+# whose dictionary outgrows it (e.g. a measured value) falls back to plain encoding
+DICTIONARY_PAGE_BYTES = 64 * 1024
+
+#### Define dataset functions ####
+
+
+def split_dataset_path(dataset_path):
+    """
+    Splits a dataset directory into the root it is under and its registered path.
+
+    Paths may be relative to the project root or point at the same layout under
+    another root (e.g. /scratch/run/data/01-raw_data/labour_rates).
+    """
+    dataset_path = os.path.normpath(dataset_path).replace(os.sep, "/")
+    for registered_path in PARTITION_FIELDS:
+        if dataset_path == registered_path:
+            return ".", registered_path
+        if dataset_path.endswith("/" + registered_path):
+            return dataset_path[: -len(registered_path) - 1], registered_path
+    raise KeyError(f"{dataset_path} is not a registered dataset")
+
+
+def partition_fields(dataset_path):
+    """Returns the partition fields of a registered dataset directory."""
+    return PARTITION_FIELDS[split_dataset_path(dataset_path)[1]]
+
+
+def partitioning(dataset_path):
+    """Returns the Hive partitioning of a registered dataset directory."""
+    return ds.partitioning(pa.schema(partition_fields(dataset_path)), flavor="hive")
+
+
+def read_partitioning(dataset_path):
+    """
+    Returns the Hive partitioning a registered dataset directory is read with.
+
+    String partition keys are read dictionary-encoded, so each row holds an index
+    into the partition's key rather than its own copy of the string, and the column
+    converts to a categorical without building a Python object per row.
+    """
+    fields = [
+        pa.field(field.name, pa.dictionary(pa.int32(), field.type))
+        if pa.types.is_string(field.type)
+        else field
+        for field in partition_fields(dataset_path)
+    ]
+    return ds.partitioning(pa.schema(fields), flavor="hive", dictionaries="infer")
+
+
+def open_dataset(dataset_path):
+    """
+    Opens a registered dataset directory for scanning, with read_partitioning().
+
+    A valid Arrow IPC copy of the dataset (see arrow_cache.py) is opened
+    memory-mapped instead of the Parquet files; both give the same rows in the
+    same order.
+    """
+    root, registered_path = split_dataset_path(dataset_path)
+    cached = open_cache(root, registered_path, read_partitioning(dataset_path))
+    if cached is not None:
+        return cached
+    return ds.dataset(dataset_path, format="parquet", partitioning=read_partitioning(dataset_path))
+
+
+def to_frame(table):
+    """
+    Converts an Arrow table that is not used afterwards to a DataFrame.
+
+    Each column's Arrow buffers are released as soon as it is converted, and the
+    columns are not consolidated into 2D blocks (which copies them again), so the
+    data is in memory about once rather than twice or three times at the peak.
+    """
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
+def partition_cols(dataset_path):
+    """Returns the partition column names of a registered dataset directory."""
+    return [field.name for field in partition_fields(dataset_path)]
+
+
+def read_partitioned(dataset_path, columns=None, filters=None):
+    """
+    Reads a partitioned dataset, pushing the projection and row predicates down to Parquet.
+
+    Partitions whose keys fail `filters` are never opened, and row groups whose
+    statistics fail them are never decoded. String dimensions come back as
+    categoricals with lexically sorted categories, so groupings and pivots keep
+    the same row order as they would with plain strings.
+
+    Args:
+        dataset_path: A directory registered in PARTITION_FIELDS, or the same data
+                      already in memory as a DataFrame (e.g. the output of an earlier
+                      stage of a warm pipeline run; see select_rows()).
+        columns: (Optional) Columns to read, in output order. Reads all columns if None.
+        filters: (Optional) Row predicates in pyarrow's DNF form, e.g.
+                 [("Year", "in", [2023, 2024])] or a list of such lists for OR.
+    """
+    if isinstance(dataset_path, pd.DataFrame):
+        return select_rows(dataset_path, columns, filters)
+
+    with span("read", f"read {os.path.basename(os.path.normpath(dataset_path))}") as read_span:
+        # A valid Arrow IPC copy of the dataset (see arrow_cache.py) is read
+        # memory-mapped instead, with the same partition pruning and predicates
+        dataset = open_dataset(dataset_path)
+        cached = dataset if isinstance(dataset.format, ds.IpcFileFormat) else None
+        expression = pq.filters_to_expression(filters) if filters else None
+        data = to_frame(dataset.to_table(columns=columns, filter=expression))
+        if read_span.enabled:
+            read_span.set(
+                rows_out=len(data),
+                columns=len(data.columns),
+                cached=cached is not None,
+                bytes_read=path_bytes(
+                    fragment_paths(dataset_path, filters)
+                    if cached is None
+                    else [fragment.path for fragment in cached.get_fragments(filter=expression)]
+                ),
+            )
+
+    for col in data.columns:
+        if isinstance(data[col].dtype, pd.CategoricalDtype):
+            data[col] = sort_categories(data[col])
+    return data
+
+
+def read_batches(dataset_path, columns=None, filters=None, batch_rows=MAX_ROWS_PER_GROUP):
+    """
+    Reads a partitioned dataset as a sequence of DataFrames of at most `batch_rows` rows.
+
+    Takes the same arguments as read_partitioned() and gives the same rows in the
+    same order, but only one batch is in memory at a time, so a stage can transform
+    and write a dataset larger than its memory budget. Categoricals are not tidied,
+    so each batch may carry categories it has no rows for. At least one (possibly
+    empty) DataFrame is always yielded.
+    """
+    if isinstance(dataset_path, pd.DataFrame):
+        for start in range(0, max(len(dataset_path), 1), batch_rows):
+            yield select_rows(dataset_path.iloc[start : start + batch_rows], columns, filters)
+        return
+
+    dataset = open_dataset(dataset_path)
+    expression = pq.filters_to_expression(filters) if filters else None
+    scanner = dataset.scanner(columns=columns, filter=expression, batch_size=batch_rows)
+
+    # Row groups (and so record batches) are often much smaller than a batch, and
+    # each conversion has a fixed cost, so they are gathered up to `batch_rows` rows
+    batches, rows, yielded = [], 0, False
+    for batch in itertools.chain(scanner.to_batches(), [None]):
+        if batches and (batch is None or rows + batch.num_rows > batch_rows):
+            yield to_frame(pa.Table.from_batches(batches))
+            batches, rows, yielded = [], 0, True
+        if batch is not None and batch.num_rows:
+            batches.append(batch)
+            rows += batch.num_rows
+    if not yielded:
+        yield scanner.projected_schema.empty_table().to_pandas()
+
+
+def select_rows(data, columns=None, filters=None):
+    """
+    Applies read_partitioned()'s projection and row predicates to a DataFrame in memory.
+
+    The predicates are evaluated by the same Arrow expressions as on disk and the
+    categoricals are tidied the same way, so a stage handed its input in memory sees
+    the rows and dtypes it would have read from the saved dataset.
+    """
+    with span("filter", "select in-memory rows", rows_in=len(data)) as filter_span:
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        expression = pq.filters_to_expression(filters) if filters else None
+        data = to_frame(ds.dataset(table).to_table(columns=columns, filter=expression))
+        filter_span.set(rows_out=len(data))
+
+    for col in data.columns:
+        if isinstance(data[col].dtype, pd.CategoricalDtype):
+            data[col] = sort_categories(data[col])
+    return data
+
+
+def fragment_paths(dataset_path, filters=None):
+    """Returns the files of a dataset left after pruning partitions that fail `filters`."""
+    dataset = ds.dataset(dataset_path, format="parquet", partitioning=partitioning(dataset_path))
+    expression = pq.filters_to_expression(filters) if filters else None
+    return [fragment.path for fragment in dataset.get_fragments(filter=expression)]
+
+
+def sort_categories(series):
+    """
+    Drops unused categories (e.g. ones filtered out) and sorts the rest lexically.
+
+    The codes are rewritten with one lookup into a small per-category mapping, so
+    the rows are neither sorted nor copied more than once (pandas'
+    remove_unused_categories() and reorder_categories() each do both).
+    """
+    categories = series.cat.categories
+    codes = series.cat.codes.to_numpy()
+
+    # Missing values have code -1, which marks and maps through the trailing slot
+    used = np.zeros(len(categories) + 1, dtype=bool)
+    used[codes] = True
+    kept = np.flatnonzero(used[:-1])
+    kept = kept[categories[kept].argsort()]
+    mapping = np.full(len(categories) + 1, -1, dtype=codes.dtype)
+    mapping[kept] = np.arange(len(kept), dtype=codes.dtype)
+
+    sorted_values = pd.Categorical.from_codes(
+        mapping[codes], dtype=pd.CategoricalDtype(categories[kept], ordered=series.cat.ordered)
+    )
+    return pd.Series(sorted_values, index=series.index, name=series.name)
+
+
+def read_transit_ids(transit_data_path="data/02-analysis_data/clean_transit_data"):
+    """
+    Indexes the CMA IDs of the clean transit data (an IdIndex) for ID consistency checks.
+
+    `transit_data_path` may also be the clean transit data in memory.
+    """
+    transit_ids = read_partitioned(transit_data_path, columns=["CMA_ID", "CMA"])
+    return build_id_index(transit_ids, "CMA_ID", "CMA")
+
+
+def write_partitioned(data, dataset_path):
+    """
+    Replaces a dataset directory with `data` split into Hive-style partitions.
+
+    Categorical (dictionary-encoded) columns are stored with their Arrow schema, so
+    readers load them already encoded rather than as one string per row.
+
+    Args:
+        data: A DataFrame, Arrow table, Arrow RecordBatchReader, or an iterable of
+              DataFrames with the same columns (the last two are written batch by
+              batch; see frames_reader()).
+        dataset_path: A directory registered in PARTITION_FIELDS.
+    """
+    if isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    elif not isinstance(data, (pa.Table, pa.RecordBatchReader)):
+        data = frames_reader(data)
+
+    root, registered_path = split_dataset_path(dataset_path)
+    invalidate(root, registered_path)
+    if os.path.exists(dataset_path):
+        shutil.rmtree(dataset_path)
+
+    with span("write", f"write {os.path.basename(os.path.normpath(dataset_path))}") as write_span:
+        if isinstance(data, pa.Table):
+            ds.write_dataset(
+                data,
+                dataset_path,
+                format="parquet",
+                partitioning=partitioning(dataset_path),
+                max_rows_per_group=MAX_ROWS_PER_GROUP,
+                min_rows_per_group=MIN_ROWS_PER_GROUP,
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            rows = data.num_rows
+        else:
+            rows = append_partitions(data, dataset_path)
+        if write_span.enabled:
+            write_span.set(rows_in=rows, bytes_written=path_bytes(dataset_path))
+
+    # Later stages (and reruns) read the dataset from an uncompressed IPC copy
+    write_cache(root, registered_path, partitioning(dataset_path))
+
+
+def append_partitions(reader, dataset_path):
+    """
+    Writes a RecordBatchReader into an empty dataset directory one batch at a time.
+
+    Each batch's rows are split by partition and appended to that partition's file
+    (laid out as write_dataset() would), in the order they were read. At most
+    MIN_ROWS_PER_GROUP rows are held back per partition, where write_dataset()
+    queues up to 64M rows across every open partition, so a stage writing in
+    chunks stays near the memory of one chunk.
+
+    Returns:
+        The number of rows written.
+    """
+    names = partition_cols(dataset_path)
+    layout = partitioning(dataset_path)
+    file_schema = pa.schema(
+        [field for field in reader.schema if field.name not in names],
+        metadata=reader.schema.metadata,
+    )
+    writers, pending, rows = {}, {}, 0
+    os.makedirs(dataset_path, exist_ok=True)
+
+    def flush(directory):
+        if directory not in writers:
+            os.makedirs(os.path.join(dataset_path, directory), exist_ok=True)
+            writers[directory] = pq.ParquetWriter(
+                os.path.join(dataset_path, directory, "part-0.parquet"),
+                file_schema,
+                dictionary_pagesize_limit=DICTIONARY_PAGE_BYTES,
+            )
+        writers[directory].write_table(
+            pa.concat_tables(pending.pop(directory)), row_group_size=MAX_ROWS_PER_GROUP
+        )
+
+    try:
+        for batch in reader:
+            rows += batch.num_rows
+            table = pa.Table.from_batches([batch])
+            codes = partition_codes(table, names)
+            # Each distinct code is one partition, keyed by the values of its first row
+            for code, first in zip(*np.unique(codes, return_index=True)):
+                key = {name: table[name][int(first)].as_py() for name in names}
+                expression = functools.reduce(
+                    operator.and_,
+                    [
+                        pc.field(name).is_null() if value is None else pc.field(name) == value
+                        for name, value in key.items()
+                    ],
+                )
+                directory = layout.format(expression)[0]
+                partition_rows = table.filter(pa.array(codes == code)).drop_columns(names)
+                pending.setdefault(directory, []).append(partition_rows)
+                if sum(part.num_rows for part in pending[directory]) >= MIN_ROWS_PER_GROUP:
+                    flush(directory)
+        for directory in list(pending):
+            flush(directory)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def partition_codes(table, names):
+    """
+    Numbers each row of a table by the combination of its values in the columns `names`.
+
+    Rows with the same values (nulls included) get the same number. The columns are
+    compared by their dictionary indices, so no string is decoded or hashed per row.
+    """
+    codes = np.zeros(table.num_rows, dtype=np.int64)
+    for name in names:
+        column = table[name].combine_chunks()
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        # A null's index is one past the dictionary's last value
+        indices = pc.fill_null(column.indices, len(column.dictionary))
+        codes = codes * (len(column.dictionary) + 1) + indices.to_numpy()
+    return codes
+
+
+def frames_reader(frames):
+    """
+    Wraps an iterable of DataFrames as an Arrow RecordBatchReader, converting one at a time.
+
+    Each DataFrame's categoricals may have their own categories (and so code widths),
+    so every batch is cast to the first one's schema with 32-bit dictionary indices.
+    """
+    frames = iter(frames)
+    first = pa.RecordBatch.from_pandas(next(frames), preserve_index=False)
+    schema = pa.schema(
+        [
+            field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+            if pa.types.is_dictionary(field.type)
+            else field
+            for field in first.schema
+        ]
+    )
+
+    def batches():
+        yield first.cast(schema)
+        for frame in frames:
+            yield pa.RecordBatch.from_pandas(frame, preserve_index=False).cast(schema)
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def replace_partitions(data, dataset_path):
+    """
+    Overwrites only the partitions of a dataset that `data` has rows for.
+
+    Other partitions are left untouched, so updating a few partitions costs in
+    proportion to their size rather than the whole dataset's.
+
+    Args:
+        data: A DataFrame or Arrow table.
+        dataset_path: A directory registered in PARTITION_FIELDS.
+    """
+    if isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+
+    root, registered_path = split_dataset_path(dataset_path)
+    invalidate(root, registered_path)
+    with span("write", f"replace {os.path.basename(os.path.normpath(dataset_path))}") as write_span:
+        ds.write_dataset(
+            data,
+            dataset_path,
+            format="parquet",
+            partitioning=partitioning(dataset_path),
+            max_rows_per_group=MAX_ROWS_PER_GROUP,
+            min_rows_per_group=MIN_ROWS_PER_GROUP,
+            existing_data_behavior="delete_matching",
+        )
+        write_span.set(rows_in=data.num_rows)
+    write_cache(root, registered_path, partitioning(dataset_path))
@@ -0,0 +1,138 @@
+#### Preamble ####
+# Purpose: Streams Statistics Canada CSV tables into Parquet with bounded memory
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+
+#### Workspace setup ####
+import csv
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+from datasets import partition_cols, write_partitioned
+from tracing import path_bytes, span
+
+#### Define ingestion settings ####
+
+# StatCan bookkeeping columns that no later stage reads
+UNUSED_STATCAN_COLUMNS = [
+    "UOM_ID",
+    "SCALAR_FACTOR",
+    "SCALAR_ID",
+    "VECTOR",
+    "COORDINATE",
+    "STATUS",
+    "SYMBOL",
+    "TERMINATED",
+    "DECIMALS",
+]
+
+# Bytes of CSV parsed per batch, which bounds the memory held at any one time
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Repeated string dimensions are stored as dictionary-encoded columns
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+#### Define ingestion functions ####
+
+
+def read_csv_header(csv_path):
+    """Returns the column names of a StatCan CSV without reading its body."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f))
+
+
+def statcan_column_types(columns):
+    """
+    Builds explicit Arrow types for a StatCan table so every batch shares one schema.
+
+    VALUE is always a float and REF_DATE is left to type inference (a year in the
+    annual tables, 'YYYY-MM' in the monthly ones); every other column is a
+    dictionary-encoded string dimension.
+    """
+    column_types = {}
+    for col in columns:
+        if col == "VALUE":
+            column_types[col] = pa.float64()
+        elif col != "REF_DATE":
+            column_types[col] = DICTIONARY_TYPE
+    return column_types
+
+
+def add_ref_year(batch):
+    """Adds a REF_YEAR column derived from a 'YYYY' or 'YYYY-MM' REF_DATE column."""
+    ref_date = pc.cast(batch.column("REF_DATE"), pa.string())
+    ref_year = pc.cast(pc.utf8_slice_codeunits(ref_date, 0, 4), pa.int64())
+    return batch.append_column("REF_YEAR", ref_year)
+
+
+def stream_csv_to_parquet(
+    source,
+    dataset_path,
+    drop_columns=UNUSED_STATCAN_COLUMNS,
+    block_size=DEFAULT_BLOCK_SIZE,
+    columns=None,
+):
+    """
+    Converts a StatCan CSV to a partitioned Parquet dataset one bounded batch at a time.
+
+    Args:
+        source: Path to the CSV file, or a binary file object positioned at its start.
+        dataset_path: Destination dataset directory, registered in datasets.PARTITION_FIELDS.
+        drop_columns: Columns to leave out of the Parquet output.
+        block_size: Bytes of CSV parsed per batch, which bounds peak memory.
+        columns: (Optional) Header of the CSV. Read from `source` when it is a path;
+                 required for file objects.
+
+    Returns:
+        The number of rows written.
+    """
+    if columns is None and isinstance(source, (str, os.PathLike)):
+        columns = read_csv_header(source)
+
+    if columns is None:
+        raise ValueError("columns must be given when streaming from a file object")
+
+    keep_cols = [col for col in columns if col not in drop_columns]
+    convert_options = pv.ConvertOptions(
+        include_columns=keep_cols,
+        column_types=statcan_column_types(keep_cols),
+        strings_can_be_null=True,
+    )
+
+    reader = pv.open_csv(
+        source,
+        read_options=pv.ReadOptions(block_size=block_size),
+        convert_options=convert_options,
+    )
+
+    schema = reader.schema
+    derive_ref_year = "REF_YEAR" in partition_cols(dataset_path)
+    if derive_ref_year:
+        schema = schema.append(pa.field("REF_YEAR", pa.int64()))
+
+    num_rows = 0
+
+    def batches():
+        nonlocal num_rows
+        for batch in reader:
+            if batch.num_rows == 0:
+                continue
+            if derive_ref_year:
+                batch = add_ref_year(batch)
+            num_rows += batch.num_rows
+            yield batch
+
+    with span("ingest", f"ingest {os.path.basename(dataset_path)}") as ingest_span:
+        write_partitioned(pa.RecordBatchReader.from_batches(schema, batches()), dataset_path)
+        if ingest_span.enabled:
+            ingest_span.set(
+                rows_out=num_rows,
+                bytes_read=path_bytes(source) if isinstance(source, (str, os.PathLike)) else None,
+                bytes_written=path_bytes(dataset_path),
+            )
+    return num_rows
@@ -0,0 +1,211 @@
+#### Preamble ####
+# Purpose: Keeps running monthly sums of the labour metrics so new StatCan releases
+# can be folded into the annual averages without recomputing the full history
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: 03-analysis_data.py (a full run writes the initial state)
+
+#### Workspace setup ####
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from datasets import read_partitioned, write_partitioned, replace_partitions
+from tracing import path_bytes, span
+
+#### Define aggregation state ####
+
+# Every monthly value folded into the sums, partitioned by month so a revised month's
+# old values can be read back (and subtracted) without touching the other months
+ledger_path = "data/02-analysis_data/labour_months"
+
+# Running sum and count of non-missing values per (CMA_ID, Labour_Metric, Year)
+aggregates_path = "data/02-analysis_data/labour_aggregates.parquet"
+
+KEY_COLS = ["CMA_ID", "Labour_Metric", "Year"]
+MONTH_COLS = ["CMA_ID", "Labour_Metric", "Year", "Time_Period", "Labour_Value"]
+
+#### Define aggregation functions ####
+
+
+def monthly_values(labour_data):
+    """Keeps the columns of the monthly labour values that the running sums need."""
+    monthly = labour_data[MONTH_COLS].copy()
+    monthly["Year"] = monthly["Year"].astype(int)
+    return monthly
+
+
+def running_sums(monthly, sign=1):
+    """
+    Sums the monthly values per (CMA_ID, Labour_Metric, Year).
+
+    Missing values count towards neither the sum nor the count, as in a mean.
+    With sign=-1 the contributions are negated, to take months back out.
+    """
+    values = monthly["Labour_Value"]
+    with span("groupby", "sum labour months", rows_in=len(monthly)) as groupby_span:
+        contributions = pd.DataFrame({
+            "CMA_ID": monthly["CMA_ID"].astype(object),
+            "Labour_Metric": monthly["Labour_Metric"].astype(object),
+            "Year": monthly["Year"].astype(int),
+            "Labour_Sum": sign * values.fillna(0.0),
+            "Labour_Count": sign * values.notna().astype("int64"),
+        })
+        sums = contributions.groupby(KEY_COLS, sort=True).sum()
+        groupby_span.set(rows_out=len(sums))
+    return sums
+
+
+def read_aggregates(path=aggregates_path):
+    """Reads the persisted running sums, indexed by (CMA_ID, Labour_Metric, Year)."""
+    return pd.read_parquet(path).set_index(KEY_COLS)
+
+
+def write_aggregates(aggregates, path=aggregates_path):
+    """Saves the running sums, replacing the file in one step."""
+    tmp_path = path + ".tmp"
+    with span("write", "write labour_aggregates", rows_in=len(aggregates)) as write_span:
+        aggregates.reset_index().to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        if write_span.enabled:
+            write_span.set(bytes_written=path_bytes(path))
+
+
+def rebuild_labour_aggregates(labour_data, ledger_path=ledger_path, aggregates_path=aggregates_path):
+    """
+    Replaces the persisted state with running sums over the full monthly history.
+
+    Args:
+        labour_data: Every filtered monthly labour value, with the columns in MONTH_COLS.
+        ledger_path: Dataset directory of the monthly values folded into the sums.
+        aggregates_path: Parquet file of the running sums.
+    """
+    monthly = monthly_values(labour_data)
+    write_partitioned(monthly, ledger_path)
+    write_aggregates(running_sums(monthly), aggregates_path)
+
+
+def unaggregated_months(labour_data_path, ledger_path=ledger_path):
+    """
+    Returns the months of the clean labour data that are not in the running sums yet.
+
+    Only the partitions from the latest aggregated year on are scanned, so the cost
+    does not grow with the length of the history.
+    """
+    aggregated = read_partitioned(ledger_path, columns=["Time_Period"])["Time_Period"]
+    aggregated = set(aggregated.unique())
+    filters = [("Year", ">=", max(aggregated)[:4])] if aggregated else None
+    published = read_partitioned(labour_data_path, columns=["Time_Period"], filters=filters)
+    return sorted(set(published["Time_Period"].unique()) - aggregated)
+
+
+def refresh_labour_aggregates(
+    labour_data_path,
+    labour_filters,
+    months=None,
+    ledger_path=ledger_path,
+    aggregates_path=aggregates_path,
+):
+    """
+    Folds newly published or revised months into the persisted running sums.
+
+    The given months are read from the clean labour data and from the ledger; their
+    previous values (if any) are subtracted from the sums and the new values added,
+    so a refresh costs in proportion to the months it touches, not the full history.
+
+    Args:
+        labour_data_path: The clean labour dataset directory.
+        labour_filters: The rows that count towards the sums, in pyarrow's DNF form
+                        (a list of AND-ed condition lists), as used by the full build.
+        months: (Optional) 'YYYY-MM' periods to fold in. Revised months must be listed;
+                defaults to the months not aggregated yet.
+        ledger_path: Dataset directory of the monthly values folded into the sums.
+        aggregates_path: Parquet file of the running sums.
+
+    Returns:
+        The updated running sums of every (CMA_ID, Labour_Metric, Year) the refresh
+        touched, with a zero count where no values are left.
+    """
+    if not (os.path.exists(aggregates_path) and os.path.isdir(ledger_path)):
+        raise FileNotFoundError(
+            "No persisted labour aggregates found; run 03-analysis_data.py without "
+            "--incremental first"
+        )
+
+    if months is None:
+        months = unaggregated_months(labour_data_path, ledger_path)
+    months = sorted(set(months))
+    if not months:
+        return read_aggregates(aggregates_path).iloc[:0]
+
+    # Only the year partitions holding these months are opened
+    month_filters = [
+        ("Time_Period", "in", months),
+        ("Year", "in", sorted({month[:4] for month in months})),
+    ]
+    new_months = monthly_values(read_partitioned(
+        labour_data_path,
+        columns=MONTH_COLS,
+        filters=[conditions + month_filters for conditions in labour_filters],
+    ))
+    old_months = read_partitioned(
+        ledger_path, columns=MONTH_COLS, filters=[("Time_Period", "in", months)]
+    )
+
+    delta = running_sums(new_months).add(running_sums(old_months, sign=-1), fill_value=0)
+    aggregates = read_aggregates(aggregates_path).add(delta, fill_value=0)
+    aggregates["Labour_Count"] = aggregates["Labour_Count"].astype("int64")
+    changed = aggregates.loc[delta.index]
+
+    # Keys whose months were all withdrawn no longer need a running sum
+    aggregates = aggregates[aggregates["Labour_Count"] != 0]
+
+    # Swap in the new months' values, removing months that no longer have any rows
+    if len(new_months):
+        replace_partitions(new_months, ledger_path)
+    for month in set(months) - set(new_months["Time_Period"].unique()):
+        shutil.rmtree(os.path.join(ledger_path, f"Time_Period={month}"), ignore_errors=True)
+    write_aggregates(aggregates, aggregates_path)
+
+    return changed
+
+
+def annual_means(aggregates):
+    """Turns running sums into annual means, one row per (CMA_ID, Year) and one column per metric."""
+    counts = aggregates["Labour_Count"]
+    means = (aggregates["Labour_Sum"] / counts.where(counts > 0)).rename(None)
+    return means.unstack("Labour_Metric")
+
+
+def update_analysis_rows(analysis_data, aggregates, column_names):
+    """
+    Overwrites the labour columns of the analysis rows whose running sums changed.
+
+    Args:
+        analysis_data: The analysis data, updated in place.
+        aggregates: Running sums of the changed keys, from refresh_labour_aggregates().
+        column_names: Maps labour metrics to their analysis column names; metrics
+                      without an entry keep their own name (e.g. Population).
+
+    Returns:
+        The number of analysis rows updated. Keys without an analysis row (e.g. a year
+        with no transit data) are skipped.
+    """
+    updates = annual_means(aggregates).rename(columns=column_names)
+    analysis_keys = pd.MultiIndex.from_arrays(
+        [analysis_data["CMA_ID"].astype(object), analysis_data["Year"]]
+    )
+    rows = analysis_keys.get_indexer(updates.index)
+    found = rows >= 0
+    rows = rows[found]
+
+    for col in updates.columns:
+        analysis_data.iloc[rows, analysis_data.columns.get_loc(col)] = updates[col].to_numpy()[found]
+    if "Population" in updates.columns:
+        log_population = np.log10(analysis_data["Population"].to_numpy()[rows])
+        analysis_data.iloc[rows, analysis_data.columns.get_loc("Log_Population")] = log_population
+
+    return len(np.unique(rows))
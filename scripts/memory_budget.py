@@ -0,0 +1,144 @@
+#### Preamble ####
+# Purpose: Estimates how much memory a stage needs to hold its input whole, so a
+# stage over the memory budget can clean its data in chunks instead
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: PIPELINE_MEMORY_BUDGET=536870912 python scripts/02.1-clean_transit_data.py
+#        python scripts/02.1-clean_transit_data.py --memory-budget 512
+
+#### Workspace setup ####
+import os
+import resource
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from datasets import MAX_ROWS_PER_GROUP, read_partitioning
+
+#### Define budget settings ####
+
+# Peak resident memory a cleaning stage is kept under, in bytes. A stage whose input
+# would not fit reads and writes it in chunks of datasets.MAX_ROWS_PER_GROUP rows.
+# 0 (the default) means no budget: every stage holds its data in memory whole.
+MEMORY_BUDGET = int(os.environ.get("PIPELINE_MEMORY_BUDGET", 0))
+
+# A stage holding its data whole has it in memory about this many times at its
+# peak: the Arrow table being converted, the DataFrame, and the Arrow table it is
+# written from (measured on synthetic data, see benchmark.py)
+WORKING_COPIES = 3
+
+# A stage processing in chunks has about this many chunks in memory at its peak:
+# the batch being converted, the cleaned DataFrame, and the Arrow batch and row
+# groups it is written from
+CHUNK_WORKING_COPIES = 4
+
+# Memory a stage takes on top of its data either way: the Parquet writers of the
+# partitions it writes, the copy into the Arrow cache, the column profile and the
+# transit IDs the labour and commute data are checked against (measured on
+# synthetic data, see benchmark.py)
+STAGE_OVERHEAD_BYTES = 96 * 2**20
+
+# Bytes per row of a string column read as Python objects: a pointer and a short str
+PYTHON_STRING_BYTES = 64
+
+#### Define budget functions ####
+
+
+def resident_bytes():
+    """Returns this process's resident memory in bytes (its peak so far where that is all there is)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def value_bytes(data_type):
+    """Returns the bytes per row a column of an Arrow type takes once converted to pandas."""
+    if pa.types.is_dictionary(data_type):
+        return data_type.index_type.bit_width // 8
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        return PYTHON_STRING_BYTES
+    try:
+        return max(data_type.bit_width // 8, 1)
+    except ValueError:
+        return PYTHON_STRING_BYTES
+
+
+def estimate_frame_bytes(dataset_path, columns=None, filters=None):
+    """
+    Estimates the memory a read_partitioned() call would return, without reading any data.
+
+    Rows are counted from the Parquet footers of the partitions left after pruning
+    by `filters`; row predicates are not applied, so the estimate errs high.
+
+    Args:
+        dataset_path: A registered dataset directory, or the data in memory.
+        columns, filters: As for datasets.read_partitioned().
+    """
+    if isinstance(dataset_path, pd.DataFrame):
+        data = dataset_path if columns is None else dataset_path[columns]
+        return int(data.memory_usage(index=False, deep=True).sum())
+
+    dataset = ds.dataset(dataset_path, format="parquet", partitioning=read_partitioning(dataset_path))
+    expression = pq.filters_to_expression(filters) if filters else None
+    rows = sum(fragment.count_rows() for fragment in dataset.get_fragments(filter=expression))
+    return rows * estimate_row_bytes(dataset_path, columns)
+
+
+def estimate_row_bytes(dataset_path, columns=None):
+    """Estimates the memory one row of a read_partitioned() call takes, from the dataset's schema."""
+    if isinstance(dataset_path, pd.DataFrame):
+        data = dataset_path if columns is None else dataset_path[columns]
+        return int(data.memory_usage(index=False, deep=True).sum()) // max(len(data), 1)
+
+    schema = ds.dataset(
+        dataset_path, format="parquet", partitioning=read_partitioning(dataset_path)
+    ).schema
+    return sum(value_bytes(schema.field(col).type) for col in columns or schema.names)
+
+
+def fits_budget(dataset_path, columns=None, filters=None, budget=None):
+    """
+    Checks whether a stage can hold a read of `dataset_path` in memory whole.
+
+    Prints the estimate when it does not, since the stage then processes it in chunks.
+
+    Args:
+        dataset_path, columns, filters: As for datasets.read_partitioned().
+        budget: (Optional) Peak resident memory in bytes; MEMORY_BUDGET if None.
+                0 means no budget.
+
+    Returns:
+        True if there is no budget or the stage's estimated peak is within it.
+
+    Raises:
+        ValueError: If the budget is below the estimated peak of processing in chunks.
+    """
+    budget = MEMORY_BUDGET if budget is None else budget
+    if budget <= 0:
+        return True
+    floor = resident_bytes() + STAGE_OVERHEAD_BYTES
+    peak = floor + WORKING_COPIES * estimate_frame_bytes(dataset_path, columns, filters)
+    if peak <= budget:
+        return True
+
+    chunk_bytes = MAX_ROWS_PER_GROUP * estimate_row_bytes(dataset_path, columns)
+    chunk_peak = floor + CHUNK_WORKING_COPIES * chunk_bytes
+    if chunk_peak > budget:
+        raise ValueError(
+            f"The {budget / 2**20:.0f} MB memory budget is below the estimated "
+            f"{chunk_peak / 2**20:.0f} MB peak of processing in chunks"
+        )
+    print(
+        f"Estimated peak of {peak / 2**20:.0f} MB is over the {budget / 2**20:.0f} MB "
+        "memory budget; processing in chunks"
+    )
+    return False
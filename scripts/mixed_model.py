@@ -0,0 +1,564 @@
+#### Preamble ####
+# Purpose: Fits linear mixed models with a random intercept per group, as lme4::lmer
+# does for formulas of the form y ~ x1 + ... + (1 | group)
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+
+#### Workspace setup ####
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+#### Define model settings ####
+
+# Golden-section search tolerance on theta, the ratio of the random-intercept
+# standard deviation to the residual standard deviation
+THETA_TOLERANCE = 1e-10
+
+# Relative step of the finite differences used for the Satterthwaite degrees of freedom
+DERIVATIVE_STEP = 1e-4
+
+#### Define model functions ####
+
+
+def design_matrix(data, terms, factors=None):
+    """
+    Builds the fixed-effects design matrix of a model, with R's default coding.
+
+    Args:
+        data: DataFrame holding the model columns.
+        terms: Numeric columns entered as they are.
+        factors: (Optional) Dict of categorical columns to their levels; the first level
+                 is the baseline and each other level gets a treatment dummy named as R
+                 does, e.g. 'as.factor(Year)2024'.
+
+    Returns:
+        The design matrix (with an intercept column first) and its column names.
+    """
+    columns = [np.ones(len(data))]
+    names = ["(Intercept)"]
+    for term in terms:
+        columns.append(data[term].to_numpy(dtype="float64"))
+        names.append(term)
+    for col, levels in (factors or {}).items():
+        values = data[col].to_numpy()
+        for level in levels[1:]:
+            columns.append((values == level).astype("float64"))
+            names.append(f"as.factor({col}){level}")
+    return np.column_stack(columns), names
+
+
+def model_formula(response, terms, group_col, factors=()):
+    """Returns the lme4 formula of a random-intercept model, e.g. 'y ~ x + as.factor(Year) + (1 | CMA_ID)'."""
+    predictors = list(terms) + [f"as.factor({col})" for col in factors]
+    return f"{response} ~ {' + '.join(predictors)} + (1 | {group_col})"
+
+
+@dataclass
+class GroupStatistics:
+    """
+    Sufficient statistics of a random-intercept model's data.
+
+    With a random intercept, the likelihood depends on the data only through the
+    overall cross-products and each group's size and column sums, so every
+    evaluation of it costs O(groups * p^2) however many rows there are.
+
+    Every field may carry leading batch dimensions (e.g. one entry per resampled
+    replicate), in which case the functions below fit all of them at once.
+    """
+
+    XtX: np.ndarray
+    Xty: np.ndarray
+    yty: float
+    sizes: np.ndarray
+    X_sums: np.ndarray
+    y_sums: np.ndarray
+
+    @property
+    def nobs(self):
+        return self.sizes.sum(axis=-1)
+
+    @property
+    def p(self):
+        return self.XtX.shape[-1]
+
+
+def group_statistics(X, y, group_codes, n_groups):
+    """Computes the sufficient statistics of a random-intercept model in one pass over the rows."""
+    X_sums = np.zeros((n_groups, X.shape[1]))
+    np.add.at(X_sums, group_codes, X)
+    return GroupStatistics(
+        XtX=X.T @ X,
+        Xty=X.T @ y,
+        yty=float(y @ y),
+        sizes=np.bincount(group_codes, minlength=n_groups).astype("float64"),
+        X_sums=X_sums,
+        y_sums=np.bincount(group_codes, weights=y, minlength=n_groups),
+    )
+
+
+def solve_fixed_effects(stats, theta):
+    """
+    Returns the GLS estimate of the fixed effects at a given theta.
+
+    Returns:
+        The estimates, the Cholesky factor of X'V^-1 X (in units of the residual
+        variance), the penalized residual sum of squares, and log|V| (likewise scaled).
+    """
+    theta_sq = np.asarray(theta, dtype="float64")[..., None] ** 2
+    shrink = theta_sq / (1 + stats.sizes * theta_sq)
+    weighted_sums = stats.X_sums * shrink[..., None]
+    A = stats.XtX - np.einsum("...gi,...gj->...ij", weighted_sums, stats.X_sums)
+    b = stats.Xty - np.einsum("...gi,...g->...i", weighted_sums, stats.y_sums)
+    c = stats.yty - np.einsum("...g,...g->...", shrink, stats.y_sums**2)
+
+    L = np.linalg.cholesky(A)
+    z = np.linalg.solve(L, b[..., None])
+    beta = np.linalg.solve(np.swapaxes(L, -1, -2), z)[..., 0]
+    rss = c - np.einsum("...i,...i->...", b, beta)
+    logdet_V = np.log1p(stats.sizes * theta_sq).sum(axis=-1)
+    return beta, L, rss, logdet_V
+
+
+def log_diagonal_sum(L):
+    """Returns the sum of the logs of the diagonal of (a batch of) triangular factors."""
+    return np.log(np.diagonal(L, axis1=-2, axis2=-1)).sum(axis=-1)
+
+
+def profiled_deviance(stats, theta, reml=True):
+    """
+    Returns the deviance at theta with the fixed effects and residual variance profiled out.
+
+    This is lme4's objective: the REML criterion if reml is True, otherwise -2 log-likelihood.
+    """
+    _, L, rss, logdet_V = solve_fixed_effects(stats, theta)
+    if reml:
+        dof = stats.nobs - stats.p
+        logdet_A = 2 * log_diagonal_sum(L)
+        return logdet_V + logdet_A + dof * (1 + np.log(2 * np.pi * rss / dof))
+    n = stats.nobs
+    return logdet_V + n * (1 + np.log(2 * np.pi * rss / n))
+
+
+def deviance(stats, theta, sigma, reml=True):
+    """Returns the deviance at given theta and residual standard deviation, without profiling."""
+    _, L, rss, logdet_V = solve_fixed_effects(stats, theta)
+    dof = stats.nobs - stats.p if reml else stats.nobs
+    dev = logdet_V + dof * np.log(2 * np.pi * sigma**2) + rss / sigma**2
+    if reml:
+        dev += 2 * log_diagonal_sum(L)
+    return dev
+
+
+def minimize_theta(objective, shape=(), tolerance=THETA_TOLERANCE):
+    """
+    Minimizes a one-dimensional objective over theta >= 0, for a batch of problems at once.
+
+    A log-spaced grid brackets each minimum, which golden-section search then refines.
+    Every step evaluates the whole batch in one vectorized call.
+
+    Args:
+        objective: Maps an array of thetas of the given shape to their objective values.
+        shape: Batch shape; () for a single problem.
+        tolerance: Relative width of the final bracket.
+    """
+    grid = np.concatenate([[0.0], np.logspace(-4, 3, 57)])
+    values = np.stack([objective(np.full(shape, theta)) for theta in grid])
+    best = np.argmin(values, axis=0)
+    lower = grid[np.maximum(best - 1, 0)]
+    upper = grid[np.minimum(best + 1, len(grid) - 1)]
+
+    ratio = (math.sqrt(5) - 1) / 2
+    a, b = lower + (1 - ratio) * (upper - lower), lower + ratio * (upper - lower)
+    fa, fb = objective(a), objective(b)
+    while np.any(upper - lower > tolerance * np.maximum(1.0, upper)):
+        # Keep the half of each bracket holding the lower point, and evaluate
+        # one new point per problem
+        go_left = fa < fb
+        upper = np.where(go_left, b, upper)
+        lower = np.where(go_left, lower, a)
+        new = np.where(
+            go_left, lower + (1 - ratio) * (upper - lower), lower + ratio * (upper - lower)
+        )
+        f_new = objective(new)
+        a, b = np.where(go_left, new, b), np.where(go_left, a, new)
+        fa, fb = np.where(go_left, f_new, fb), np.where(go_left, fa, f_new)
+
+    # The boundary (no group variance) is kept where it beats the interior minimum
+    theta = (lower + upper) / 2
+    return np.where(objective(np.zeros(shape)) <= objective(theta), 0.0, theta)
+
+
+def fit_statistics(stats, reml=True):
+    """
+    Fits random-intercept models from their sufficient statistics.
+
+    Args:
+        stats: GroupStatistics, optionally with leading batch dimensions.
+        reml: Fit by REML if True, otherwise by maximum likelihood.
+
+    Returns:
+        theta, the fixed effects, sigma, the standard errors of the fixed effects,
+        and the Cholesky factor of X'V^-1 X, each with the batch shape of `stats`.
+    """
+    theta = minimize_theta(
+        lambda value: profiled_deviance(stats, value, reml), shape=np.shape(stats.yty)
+    )
+    beta, L, rss, _ = solve_fixed_effects(stats, theta)
+    dof = stats.nobs - stats.p if reml else stats.nobs
+    sigma = np.sqrt(rss / dof)
+    L_inv = np.linalg.inv(L)
+    std_err = sigma[..., None] * np.sqrt((L_inv**2).sum(axis=-2))
+    return theta, beta, sigma, std_err, L
+
+
+def student_t_sf(t, df):
+    """Returns P(T > t) for Student's t distribution, via the regularized incomplete beta function."""
+    x = df / (df + t**2)
+    tail = 0.5 * incomplete_beta(df / 2, 0.5, x)
+    return tail if t >= 0 else 1 - tail
+
+
+def incomplete_beta(a, b, x, max_iter=500, eps=1e-15):
+    """Regularized incomplete beta function I_x(a, b), by Lentz's continued fraction."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        return 1 - incomplete_beta(b, a, 1 - x, max_iter, eps)
+
+    log_front = (
+        math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+        + a * math.log(x) + b * math.log1p(-x)
+    )
+    tiny = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, max_iter + 1):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+        if abs(c * d - 1) < eps:
+            break
+    return math.exp(log_front) * fraction / a
+
+
+def satterthwaite_df(stats, theta, sigma, reml=True, step=DERIVATIVE_STEP):
+    """
+    Returns Satterthwaite's degrees of freedom for each fixed effect, as lmerTest reports.
+
+    `theta` and `sigma` may be arrays matching the batch shape of `stats`.
+
+    The covariance of (theta, sigma) is taken from the numerical Hessian of the
+    deviance, and the gradient of each coefficient's variance from finite differences.
+    """
+    params = np.stack([np.asarray(theta, dtype="float64"), np.asarray(sigma, dtype="float64")])
+    steps = step * np.maximum(np.abs(params), 1.0)
+    unit = np.eye(2).reshape(2, 2, *[1] * (params.ndim - 1))
+
+    def dev(point):
+        return deviance(stats, point[0], point[1], reml)
+
+    hessian = np.empty((2, 2, *params.shape[1:]))
+    for i in range(2):
+        for j in range(2):
+            ei = unit[i] * steps
+            ej = unit[j] * steps
+            hessian[i, j] = (
+                dev(params + ei + ej) - dev(params + ei - ej)
+                - dev(params - ei + ej) + dev(params - ei - ej)
+            ) / (4 * steps[i] * steps[j])
+    varpar_cov = 2 * np.linalg.inv(np.moveaxis(hessian, (0, 1), (-2, -1)))
+
+    def coef_variances(point):
+        _, L, _, _ = solve_fixed_effects(stats, point[0])
+        L_inv = np.linalg.inv(L)
+        return point[1][..., None] ** 2 * (L_inv**2).sum(axis=-2)
+
+    gradients = np.stack([
+        (coef_variances(params + unit[k] * steps)
+         - coef_variances(params - unit[k] * steps)) / (2 * steps[k][..., None])
+        for k in range(2)
+    ], axis=-1)
+    variances = coef_variances(params)
+    return 2 * variances**2 / np.einsum(
+        "...ik,...kl,...il->...i", gradients, varpar_cov, gradients
+    )
+
+
+@dataclass
+class MixedModelResult:
+    """
+    A fitted random-intercept model. Printing it gives an lmer-style summary.
+
+    `ranef` holds the conditional modes of the random intercepts, one per entry of
+    `group_levels`; `vcov` is the covariance of the fixed effects and `df` their
+    Satterthwaite degrees of freedom.
+    """
+
+    response: str
+    terms: list
+    factors: dict
+    group_col: str
+    coef_names: list
+    coef: np.ndarray
+    vcov: np.ndarray
+    df: np.ndarray
+    theta: float
+    sigma: float
+    group_levels: np.ndarray
+    ranef: np.ndarray
+    reml: bool
+    deviance: float
+    nobs: int
+
+    @property
+    def std_err(self):
+        return np.sqrt(np.diag(self.vcov))
+
+    @property
+    def t_value(self):
+        return self.coef / self.std_err
+
+    @property
+    def p_value(self):
+        return np.array([
+            2 * student_t_sf(abs(t), df) for t, df in zip(self.t_value, self.df)
+        ])
+
+    @property
+    def group_variance(self):
+        """Variance of the random intercepts (tau_00)."""
+        return (self.theta * self.sigma) ** 2
+
+    @property
+    def residual_variance(self):
+        """Residual variance (sigma^2)."""
+        return self.sigma**2
+
+    @property
+    def icc(self):
+        """Share of the total variance due to differences between groups."""
+        return self.group_variance / (self.group_variance + self.residual_variance)
+
+    @property
+    def formula(self):
+        return model_formula(self.response, self.terms, self.group_col, self.factors)
+
+    def fixed_effects(self):
+        """Returns the fixed-effects table (estimates, standard errors, df, t and p values)."""
+        return pd.DataFrame(
+            {
+                "Estimate": self.coef,
+                "Std. Error": self.std_err,
+                "df": self.df,
+                "t value": self.t_value,
+                "Pr(>|t|)": self.p_value,
+            },
+            index=pd.Index(self.coef_names),
+        )
+
+    def variance_components(self):
+        """Returns the random-effects table (variance and standard deviation per group)."""
+        return pd.DataFrame(
+            {
+                "Groups": [self.group_col, "Residual"],
+                "Name": ["(Intercept)", ""],
+                "Variance": [self.group_variance, self.residual_variance],
+                "Std.Dev.": [self.theta * self.sigma, self.sigma],
+            }
+        )
+
+    def predict(self, data, include_ranef=True):
+        """
+        Predicts the response for new rows.
+
+        Rows whose group was seen in fitting get its random intercept when
+        include_ranef is True; other rows get the population-level prediction.
+        """
+        X, _ = design_matrix(data, self.terms, self.factors)
+        prediction = X @ self.coef
+        if include_ranef:
+            group_pos = pd.Index(self.group_levels).get_indexer(
+                data[self.group_col].astype(object)
+            )
+            seen = group_pos >= 0
+            prediction[seen] += self.ranef[group_pos[seen]]
+        return prediction
+
+    def __str__(self):
+        criterion = "REML criterion at convergence" if self.reml else "Deviance"
+        lines = [
+            f"Linear mixed model fit by {'REML' if self.reml else 'maximum likelihood'}",
+            f"Formula: {self.formula}",
+            "",
+            f"{criterion}: {self.deviance:.1f}",
+            "",
+            "Random effects:",
+            self.variance_components().to_string(index=False),
+            f"Number of obs: {self.nobs}, groups:  {self.group_col}, {len(self.group_levels)}",
+            "",
+            "Fixed effects:",
+            self.fixed_effects().to_string(float_format=lambda value: f"{value:.6g}"),
+        ]
+        return "\n".join(lines)
+
+
+@dataclass
+class ModelDesign:
+    """
+    The numeric form of a model's data: the design matrix, response and group codes.
+
+    Rows are sorted by group (and within a group by the factor columns), so each
+    group's rows are contiguous.
+    """
+
+    X: np.ndarray
+    y: np.ndarray
+    group_codes: np.ndarray
+    group_levels: pd.Index
+    coef_names: list
+    factors: dict
+
+
+def model_design(data, response, terms, group_col, factors=()):
+    """Builds the ModelDesign of `response ~ terms + as.factor(factors) + (1 | group_col)`."""
+    factors = list(factors)
+    data = data.dropna(subset=[response, group_col, *terms, *factors])
+    data = data.assign(**{group_col: data[group_col].astype(object)})
+    data = data.sort_values([group_col, *factors], kind="stable")
+    factor_levels = {col: sorted(data[col].unique()) for col in factors}
+
+    X, coef_names = design_matrix(data, terms, factor_levels)
+    group_codes, group_levels = pd.factorize(data[group_col], sort=True)
+    return ModelDesign(
+        X=X,
+        y=data[response].to_numpy(dtype="float64"),
+        group_codes=group_codes,
+        group_levels=group_levels,
+        coef_names=coef_names,
+        factors=factor_levels,
+    )
+
+
+def fit_random_intercept(data, response, terms, group_col, factors=(), reml=True):
+    """
+    Fits `response ~ terms + as.factor(factors) + (1 | group_col)` as lme4::lmer does.
+
+    The data are reduced to per-group sufficient statistics once; the profiled
+    deviance is then minimized over theta alone, and each evaluation costs
+    O(groups * p^2) rather than O(n^2). Rows with missing model values are dropped.
+
+    Args:
+        data: DataFrame holding the model columns.
+        response: The outcome column.
+        terms: Numeric predictor columns.
+        group_col: Column identifying the groups that get a random intercept.
+        factors: (Optional) Predictor columns entered as treatment-coded factors.
+        reml: Fit by REML (lmer's default) if True, otherwise by maximum likelihood.
+
+    Returns:
+        A MixedModelResult.
+    """
+    design = model_design(data, response, terms, group_col, factors)
+    stats = group_statistics(design.X, design.y, design.group_codes, len(design.group_levels))
+
+    theta, beta, sigma, _, L = fit_statistics(stats, reml)
+    theta, sigma = float(theta), float(sigma)
+    L_inv = np.linalg.inv(L)
+
+    # Conditional modes of the random intercepts: each group's residual sum, shrunk
+    residual_sums = stats.y_sums - stats.X_sums @ beta
+    ranef = theta**2 / (1 + stats.sizes * theta**2) * residual_sums
+
+    return MixedModelResult(
+        response=response,
+        terms=list(terms),
+        factors=design.factors,
+        group_col=group_col,
+        coef_names=design.coef_names,
+        coef=beta,
+        vcov=sigma**2 * (L_inv.T @ L_inv),
+        df=satterthwaite_df(stats, theta, sigma, reml),
+        theta=theta,
+        sigma=sigma,
+        group_levels=np.asarray(design.group_levels, dtype=str),
+        ranef=ranef,
+        reml=reml,
+        deviance=float(profiled_deviance(stats, theta, reml)),
+        nobs=int(stats.nobs),
+    )
+
+
+def save_model(result, model_path):
+    """Saves a fitted model as an uncompressed .npz archive, which loads without unpickling."""
+    np.savez(
+        model_path,
+        response=result.response,
+        terms=np.array(result.terms, dtype=str),
+        factor_cols=np.array(list(result.factors), dtype=str),
+        factor_levels=np.array(
+            [str(level) for levels in result.factors.values() for level in levels], dtype=str
+        ),
+        factor_level_counts=np.array([len(levels) for levels in result.factors.values()]),
+        factor_level_types=np.array(
+            [type(levels[0]).__name__ for levels in result.factors.values()], dtype=str
+        ),
+        group_col=result.group_col,
+        coef_names=np.array(result.coef_names, dtype=str),
+        coef=result.coef,
+        vcov=result.vcov,
+        df=result.df,
+        theta=result.theta,
+        sigma=result.sigma,
+        group_levels=result.group_levels,
+        ranef=result.ranef,
+        reml=result.reml,
+        deviance=result.deviance,
+        nobs=result.nobs,
+    )
+
+
+def load_model(model_path):
+    """Loads a model saved by save_model()."""
+    with np.load(model_path, allow_pickle=False) as saved:
+        level_types = {"int": int, "int64": np.int64, "float": float, "float64": np.float64}
+        level_ends = np.cumsum(saved["factor_level_counts"])
+        factors = {
+            str(col): [level_types.get(str(level_type), str)(level) for level in levels]
+            for col, levels, level_type in zip(
+                saved["factor_cols"],
+                np.split(saved["factor_levels"], level_ends[:-1]),
+                saved["factor_level_types"],
+            )
+        }
+        return MixedModelResult(
+            response=str(saved["response"]),
+            terms=[str(term) for term in saved["terms"]],
+            factors=factors,
+            group_col=str(saved["group_col"]),
+            coef_names=[str(name) for name in saved["coef_names"]],
+            coef=saved["coef"],
+            vcov=saved["vcov"],
+            df=saved["df"],
+            theta=float(saved["theta"]),
+            sigma=float(saved["sigma"]),
+            group_levels=saved["group_levels"],
+            ranef=saved["ranef"],
+            reml=bool(saved["reml"]),
+            deviance=float(saved["deviance"]),
+            nobs=int(saved["nobs"]),
+        )
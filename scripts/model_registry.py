@@ -0,0 +1,314 @@
+#### Preamble ####
+# Purpose: Keeps fitted random-intercept models keyed by a hash of their data, formula
+# and estimator options, so a model that was fitted before is loaded instead of refitted
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/model_registry.py [--clear]
+#        python scripts/model_registry.py --predict rows.csv [--key KEY] [--output predictions.csv]
+
+#### Workspace setup ####
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from mixed_model import (
+    DERIVATIVE_STEP,
+    THETA_TOLERANCE,
+    fit_random_intercept,
+    load_model,
+    model_formula,
+    save_model,
+)
+
+#### Define registry settings ####
+
+# One directory per fitted model, named by its key, holding the model (model.npz, as
+# written by mixed_model.save_model()) and its fitted values (fitted.arrow), with a
+# JSON file per entry describing it. Entries can be deleted at any time and are
+# refitted when next asked for.
+REGISTRY_DIR = "models/registry"
+
+# Total size the registry is kept under, in bytes; the least recently used entries
+# are evicted first. 0 turns the registry off.
+REGISTRY_BYTES = int(os.environ.get("MODEL_REGISTRY_BYTES", 256 * 2**20))
+
+# Estimator settings that change the fit, hashed into every key so entries fitted
+# under other settings are not reused
+ESTIMATOR_OPTIONS = {
+    "estimator": "fit_random_intercept",
+    "theta_tolerance": THETA_TOLERANCE,
+    "derivative_step": DERIVATIVE_STEP,
+}
+
+#### Define registry functions ####
+
+
+@dataclass
+class RegisteredModel:
+    """
+    A fitted model from the registry.
+
+    `fitted` holds the group and factor columns of every row the model was fitted
+    to, with its fitted value (random intercept included) and residual; `cached`
+    is True if the model was loaded rather than fitted.
+    """
+
+    key: str
+    model: object
+    fitted: pd.DataFrame
+    cached: bool
+
+
+def model_key(data, response, terms, group_col, factors=(), reml=True):
+    """
+    Hashes what a fit depends on: the model's columns of `data`, its formula and options.
+
+    Each row of the model columns is hashed in one vectorized pass; the row hashes
+    are sorted before they are combined, so the same rows in another order (which
+    give the same fit) get the same key.
+    """
+    columns = [response, *terms, group_col, *factors]
+    spec = {
+        "formula": model_formula(response, terms, group_col, factors),
+        "columns": columns,
+        "reml": reml,
+        **ESTIMATOR_OPTIONS,
+    }
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode())
+    row_hashes = pd.util.hash_pandas_object(data[columns], index=False).to_numpy()
+    digest.update(np.sort(row_hashes).tobytes())
+    return digest.hexdigest()
+
+
+def entry_paths(key, registry_dir=REGISTRY_DIR):
+    """Returns the directory and JSON file of a registry entry."""
+    entry_dir = os.path.join(registry_dir, key)
+    return entry_dir, entry_dir + ".json"
+
+
+def read_fitted(path):
+    """Reads fitted values saved as an Arrow IPC file, memory-mapped."""
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def load_registered(key, registry_dir=REGISTRY_DIR):
+    """
+    Loads a registry entry.
+
+    Returns:
+        A RegisteredModel, or None if there is no (complete) entry for `key`.
+    """
+    entry_dir, entry_json = entry_paths(key, registry_dir)
+    try:
+        model = load_model(os.path.join(entry_dir, "model.npz"))
+        fitted = read_fitted(os.path.join(entry_dir, "fitted.arrow"))
+        # The JSON file's modification time is the entry's last use, for eviction
+        os.utime(entry_json)
+    except (OSError, ValueError, KeyError, pa.ArrowInvalid):
+        return None
+    return RegisteredModel(key=key, model=model, fitted=fitted, cached=True)
+
+
+def fit_cached(data, response, terms, group_col, factors=(), reml=True, registry_dir=REGISTRY_DIR):
+    """
+    Returns the model `response ~ terms + as.factor(factors) + (1 | group_col)` fitted
+    to `data`, from the registry if it was fitted before.
+
+    Args:
+        data: DataFrame holding the model columns.
+        response, terms, group_col, factors, reml: As for
+            mixed_model.fit_random_intercept().
+        registry_dir: Directory of the registry.
+
+    Returns:
+        A RegisteredModel.
+    """
+    factors = list(factors)
+    key = model_key(data, response, terms, group_col, factors, reml)
+    if REGISTRY_BYTES > 0:
+        registered = load_registered(key, registry_dir)
+        if registered is not None:
+            return registered
+
+    model = fit_random_intercept(data, response, terms, group_col, factors, reml)
+    rows = data.dropna(subset=[response, group_col, *terms, *factors])
+    fitted = rows[[group_col, *factors]].astype({group_col: object}).reset_index(drop=True)
+    fitted["Fitted"] = model.predict(rows)
+    fitted["Residual"] = rows[response].to_numpy(dtype="float64") - fitted["Fitted"].to_numpy()
+    registered = RegisteredModel(key=key, model=model, fitted=fitted, cached=False)
+
+    if REGISTRY_BYTES > 0:
+        write_entry(registered, registry_dir)
+    return registered
+
+
+def write_entry(registered, registry_dir=REGISTRY_DIR):
+    """Saves a fitted model into the registry, then evicts entries over the budget."""
+    entry_dir, entry_json = entry_paths(registered.key, registry_dir)
+    tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+    try:
+        os.makedirs(tmp_dir)
+        save_model(registered.model, os.path.join(tmp_dir, "model.npz"))
+        feather.write_feather(
+            registered.fitted, os.path.join(tmp_dir, "fitted.arrow"), compression="uncompressed"
+        )
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(tmp_dir, entry_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    entry = {
+        "key": registered.key,
+        "formula": registered.model.formula,
+        "reml": registered.model.reml,
+        "nobs": registered.model.nobs,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "bytes": sum(
+            os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir)
+        ),
+    }
+    tmp_json = f"{entry_json}.tmp-{os.getpid()}"
+    with open(tmp_json, "w") as f:
+        json.dump(entry, f, indent=2, sort_keys=True)
+    os.replace(tmp_json, entry_json)
+    evict(registry_dir)
+
+
+def predict_batch(model, rows, data=None, include_ranef=True):
+    """
+    Predicts the response of a fitted model for a batch of rows in one pass, without refitting.
+
+    Args:
+        model: A MixedModelResult, or the key of a registry entry.
+        rows: DataFrame with the model's group and factor columns (e.g. CMA_ID and
+              Year), and its terms unless `data` is given.
+        data: (Optional) DataFrame the terms of `rows` are looked up in (e.g. the
+              analysis data), matched on the group and factor columns.
+        include_ranef: Add each seen group's random intercept; groups the model was
+                       not fitted to get the population-level prediction.
+
+    Returns:
+        The group and factor columns of `rows` with a 'Predicted' column, in the
+        order of `rows`.
+    """
+    if isinstance(model, str):
+        registered = load_registered(model)
+        if registered is None:
+            raise FileNotFoundError(f"No registered model with key {model}")
+        model = registered.model
+
+    keys = [model.group_col, *model.factors]
+    missing = [col for col in keys if col not in rows.columns]
+    if missing:
+        raise ValueError(f"Rows are missing the column(s): {', '.join(missing)}")
+
+    # Factors are treatment coded, so a level the model has not seen would silently
+    # get the baseline's effect
+    for col, levels in model.factors.items():
+        unknown = set(pd.unique(rows[col])) - set(levels)
+        if unknown:
+            raise ValueError(f"{col} has level(s) the model was not fitted to: {sorted(unknown)}")
+
+    rows = rows.reset_index(drop=True)
+    missing_terms = [term for term in model.terms if term not in rows.columns]
+    if missing_terms:
+        if data is None:
+            raise ValueError(f"Rows are missing the term(s): {', '.join(missing_terms)}")
+        lookup = data[[*keys, *missing_terms]].astype({model.group_col: object})
+        rows = rows.astype({model.group_col: object}).merge(
+            lookup.drop_duplicates(keys), on=keys, how="left", validate="many_to_one"
+        )
+
+    predictions = rows[keys].copy()
+    predictions["Predicted"] = model.predict(rows, include_ranef=include_ranef)
+    return predictions
+
+
+def registry_entries(registry_dir=REGISTRY_DIR):
+    """Returns the registry entries, least recently used first."""
+    if not os.path.isdir(registry_dir):
+        return []
+    entries = []
+    for name in os.listdir(registry_dir):
+        if not name.endswith(".json"):
+            continue
+        entry_json = os.path.join(registry_dir, name)
+        try:
+            with open(entry_json) as f:
+                entry = json.load(f)
+            entry["last_used"] = os.stat(entry_json).st_mtime
+        except (OSError, ValueError):
+            continue
+        entries.append(entry)
+    return sorted(entries, key=lambda entry: entry["last_used"])
+
+
+def evict(registry_dir=REGISTRY_DIR, budget=None):
+    """
+    Deletes the least recently used registry entries until the registry fits the budget.
+
+    Returns:
+        The keys of the entries deleted.
+    """
+    budget = REGISTRY_BYTES if budget is None else budget
+    entries = registry_entries(registry_dir)
+    total = sum(entry["bytes"] for entry in entries)
+    evicted = []
+    for entry in entries:
+        if total <= budget:
+            break
+        entry_dir, entry_json = entry_paths(entry["key"], registry_dir)
+        os.remove(entry_json)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= entry["bytes"]
+        evicted.append(entry["key"])
+    return evicted
+
+
+#### Show the registry ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the model registry, or predict from a registered model")
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    parser.add_argument(
+        "--predict",
+        metavar="ROWS_CSV",
+        help="Predict for the rows of a CSV (e.g. CMA_ID and Year columns); missing "
+        "terms are looked up in the analysis data",
+    )
+    parser.add_argument("--key", help="Entry to predict from (default: the most recently used)")
+    parser.add_argument("--output", help="Save the predictions to this CSV instead of printing them")
+    args = parser.parse_args()
+
+    if args.clear:
+        evict(budget=0)
+
+    entries = registry_entries()
+    if args.predict:
+        if not entries and args.key is None:
+            raise FileNotFoundError("The registry is empty; fit a model first (06-model_data.py)")
+        key = args.key or entries[-1]["key"]
+        rows = pd.read_csv(args.predict)
+        analysis_data = pd.read_parquet("data/02-analysis_data/analysis_data.parquet")
+        predictions = predict_batch(key, rows, data=analysis_data)
+        if args.output:
+            predictions.to_csv(args.output, index=False)
+        else:
+            print(predictions.to_string(index=False))
+    else:
+        for entry in reversed(entries):
+            print(f"{entry['key'][:12]}  {entry['nobs']:>8} obs {entry['bytes'] / 2**10:>9.1f} KB  {entry['formula']}")
+        total = sum(entry["bytes"] for entry in entries)
+        print(f"{len(entries)} entries, {total / 2**20:.1f} MB of {REGISTRY_BYTES / 2**20:.0f} MB")
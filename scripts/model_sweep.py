@@ -0,0 +1,306 @@
+#### Preamble ####
+# Purpose: Fits the participation model's specification over a grid of outcomes and
+# transit-access definitions in vectorized batches, returning one tidy table
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: 03-analysis_data.py
+# Usage: python scripts/model_sweep.py [--jobs N] [--output sweep.csv]
+
+#### Workspace setup ####
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from analysis_store import store_path as analysis_store_path
+from mixed_model import (
+    GroupStatistics,
+    design_matrix,
+    fit_statistics,
+    satterthwaite_df,
+    student_t_sf,
+)
+
+#### Define sweep settings ####
+
+# Fits per vectorized batch (and per task sent to a worker)
+CHUNK_SIZE = 64
+
+# Outcomes and covariates of the participation model; the transit access
+# proportion is the predictor swept over its definitions
+SWEEP_OUTCOMES = ["Participation_Rate", "Unemployment_Rate"]
+SWEEP_COVARIATES = ["Commute_Ratio", "Log_Population"]
+
+#### Define sweep functions ####
+
+
+@dataclass
+class SweepDesign:
+    """
+    The parts of the data shared by every fit in a sweep.
+
+    Rows, groups, covariates and year dummies are fixed; each fit only swaps in one
+    outcome column of `outcomes` and one predictor column of `predictors`, and drops
+    the rows where either is missing.
+    """
+
+    X: np.ndarray
+    outcomes: np.ndarray
+    predictors: np.ndarray
+    group_codes: np.ndarray
+    n_groups: int
+    coef_names: list
+    reml: bool
+
+
+def sweep_design(data, outcomes, predictors, terms, group_col, factors=(), predictor_name=None, reml=True):
+    """
+    Builds the SweepDesign of `outcome ~ predictor + terms + as.factor(factors) + (1 | group_col)`.
+
+    Args:
+        data: DataFrame holding every outcome, predictor and covariate column.
+        outcomes: Outcome columns.
+        predictors: Columns swept as the focal predictor, one per fit.
+        terms: Covariates shared by every fit.
+        group_col: Column identifying the groups that get a random intercept.
+        factors: (Optional) Treatment-coded factor columns shared by every fit.
+        predictor_name: Name of the focal predictor's coefficient in the results;
+                        defaults to 'predictor'.
+        reml: Fit by REML if True, otherwise by maximum likelihood.
+    """
+    factors = list(factors)
+    data = data.dropna(subset=[group_col, *terms, *factors])
+    data = data.assign(**{group_col: data[group_col].astype(object)})
+    data = data.sort_values([group_col, *factors], kind="stable")
+    factor_levels = {col: sorted(data[col].unique()) for col in factors}
+
+    # The focal predictor sits in column 1; it is filled in per fit
+    X, coef_names = design_matrix(data, [predictors[0], *terms], factor_levels)
+    coef_names[1] = predictor_name or "predictor"
+
+    group_codes, group_levels = pd.factorize(data[group_col], sort=True)
+    return SweepDesign(
+        X=X,
+        outcomes=data[list(outcomes)].to_numpy(dtype="float64"),
+        predictors=data[list(predictors)].to_numpy(dtype="float64"),
+        group_codes=group_codes,
+        n_groups=len(group_levels),
+        coef_names=coef_names,
+        reml=reml,
+    )
+
+
+def sweep_statistics(design, outcome_idx, predictor_idx):
+    """
+    Builds the sufficient statistics of a batch of fits in one set of matrix products.
+
+    Rows where a fit's outcome or predictor is missing are zeroed out, which drops
+    them from every sum (and from their group's size). Group sums are scattered by
+    group code, with each fit's groups offset into a block of its own.
+    """
+    X = np.broadcast_to(design.X, (len(outcome_idx), *design.X.shape)).copy()
+    X[:, :, 1] = design.predictors[:, predictor_idx].T
+    y = design.outcomes[:, outcome_idx].T
+    present = ~(np.isnan(X[:, :, 1]) | np.isnan(y))
+    X = np.where(present[..., None], X, 0.0)
+    y = np.where(present, y, 0.0)
+
+    n_fits, _, p = X.shape
+    n_cells = n_fits * design.n_groups
+    codes = (np.arange(n_fits)[:, None] * design.n_groups + design.group_codes).ravel()
+    X_sums = np.zeros((n_cells, p))
+    np.add.at(X_sums, codes, X.reshape(-1, p))
+
+    return GroupStatistics(
+        XtX=np.einsum("bni,bnj->bij", X, X),
+        Xty=np.einsum("bni,bn->bi", X, y),
+        yty=np.einsum("bn,bn->b", y, y),
+        sizes=np.bincount(codes, weights=present.ravel(), minlength=n_cells).reshape(n_fits, -1),
+        X_sums=X_sums.reshape(n_fits, design.n_groups, p),
+        y_sums=np.bincount(codes, weights=y.ravel(), minlength=n_cells).reshape(n_fits, -1),
+    )
+
+
+def fit_sweep_chunk(design, outcome_idx, predictor_idx):
+    """
+    Fits one batch of (outcome, predictor) combinations.
+
+    Returns:
+        Fixed effects, standard errors and Satterthwaite df, each (fits, p), and the
+        residual and group variances and numbers of observations, each (fits,).
+    """
+    stats = sweep_statistics(design, outcome_idx, predictor_idx)
+    theta, beta, sigma, std_err, _ = fit_statistics(stats, design.reml)
+    df = satterthwaite_df(stats, theta, sigma, design.reml)
+    return beta, std_err, df, sigma**2, (theta * sigma) ** 2, stats.nobs
+
+
+# Design shared with the worker processes, set once per worker by init_worker()
+_worker_design = None
+
+
+def init_worker(design):
+    """Receives the design once per worker process instead of once per task."""
+    global _worker_design
+    _worker_design = design
+
+
+def run_worker_chunk(outcome_idx, predictor_idx):
+    return fit_sweep_chunk(_worker_design, outcome_idx, predictor_idx)
+
+
+def model_sweep(
+    data,
+    outcomes,
+    predictors,
+    terms,
+    group_col,
+    factors=(),
+    predictor_name=None,
+    reml=True,
+    jobs=None,
+    chunk_size=CHUNK_SIZE,
+):
+    """
+    Fits a random-intercept model for every combination of outcome and focal predictor.
+
+    The shared structure (rows, groups, covariates, factor dummies) is built once;
+    the fits are then solved `chunk_size` at a time as vectorized batches, spread
+    over a process pool. Combinations too sparse or collinear to fit are left out.
+
+    Args:
+        data, outcomes, predictors, terms, group_col, factors, predictor_name, reml:
+            As in sweep_design().
+        jobs: Worker processes; all CPUs if None, in-process if 1.
+        chunk_size: Fits per batch.
+
+    Returns:
+        A tidy DataFrame with one row per (outcome, predictor, term), holding the
+        estimate, standard error, Satterthwaite df, t and p values, and the fit's
+        number of observations and variance components.
+    """
+    design = sweep_design(
+        data, outcomes, predictors, terms, group_col, factors, predictor_name, reml
+    )
+    combos = np.array(list(itertools.product(range(len(outcomes)), range(len(predictors)))))
+
+    # Leave out combinations whose design is rank deficient (e.g. too few rows)
+    stats = sweep_statistics(design, combos[:, 0], combos[:, 1])
+    p = design.X.shape[1]
+    fittable = (np.linalg.matrix_rank(stats.XtX) == p) & (stats.nobs > p)
+    combos = combos[fittable]
+
+    chunks = [combos[start:start + chunk_size] for start in range(0, len(combos), chunk_size)]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(chunks) <= 1:
+        results = [fit_sweep_chunk(design, chunk[:, 0], chunk[:, 1]) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_worker, initargs=(design,)
+        ) as executor:
+            results = list(executor.map(
+                run_worker_chunk, [chunk[:, 0] for chunk in chunks], [chunk[:, 1] for chunk in chunks]
+            ))
+
+    beta, std_err, df, residual_var, group_var, nobs = (
+        np.concatenate(parts) for parts in zip(*results)
+    )
+    n_fits, n_terms = beta.shape
+    t_value = beta / std_err
+    p_value = np.array([2 * student_t_sf(abs(t), d) for t, d in zip(t_value.ravel(), df.ravel())])
+
+    return pd.DataFrame({
+        "outcome": np.repeat(np.asarray(outcomes, dtype=object)[combos[:, 0]], n_terms),
+        "predictor": np.repeat(np.asarray(predictors, dtype=object)[combos[:, 1]], n_terms),
+        "term": np.tile(design.coef_names, n_fits),
+        "estimate": beta.ravel(),
+        "std_error": std_err.ravel(),
+        "df": df.ravel(),
+        "t_value": t_value.ravel(),
+        "p_value": p_value,
+        "nobs": np.repeat(nobs.astype("int64"), n_terms),
+        "group_variance": np.repeat(group_var, n_terms),
+        "residual_variance": np.repeat(residual_var, n_terms),
+    })
+
+
+def transit_access_grid(analysis_data, store_path=analysis_store_path):
+    """
+    Adds one transit access column per (distance category, demographic group) to the analysis data.
+
+    The transit access values are read from the analysis store built by 03-analysis_data.py.
+
+    Returns:
+        The widened analysis data, and a DataFrame mapping each new column to its
+        Transit_Distance_Category and Transit_Profile_Characteristic.
+    """
+    transit = pd.read_parquet(store_path, filters=[("Source", "==", "transit")])
+    access = transit.astype({"CMA_ID": object, "Year": "int64"}).pivot_table(
+        index=["CMA_ID", "Year"],
+        columns=["Transit_Distance_Category", "Transit_Profile_Characteristic"],
+        values="Value",
+        observed=True,
+    )
+    definitions = access.columns.to_frame(index=False).astype(object)
+    definitions.insert(0, "predictor", [f"{category} | {group}" for category, group in access.columns])
+    access.columns = definitions["predictor"].tolist()
+
+    grid = analysis_data.assign(CMA_ID=analysis_data["CMA_ID"].astype(object)).join(
+        access, on=["CMA_ID", "Year"]
+    )
+    return grid, definitions
+
+
+def transit_access_sweep(analysis_data, outcomes=SWEEP_OUTCOMES, jobs=None, chunk_size=CHUNK_SIZE):
+    """
+    Fits the participation model's specification for each outcome and transit access definition.
+
+    Returns:
+        The tidy results of model_sweep(), with the distance category and demographic
+        group of each fit's transit access definition.
+    """
+    grid, definitions = transit_access_grid(analysis_data)
+    results = model_sweep(
+        grid,
+        outcomes=outcomes,
+        predictors=definitions["predictor"].tolist(),
+        terms=SWEEP_COVARIATES,
+        group_col="CMA_ID",
+        factors=["Year"],
+        predictor_name="Transit_Access_Prop",
+        jobs=jobs,
+        chunk_size=chunk_size,
+    )
+    return definitions.merge(results, on="predictor").drop(columns="predictor")
+
+
+#### Run the sweep ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fit the participation model over every outcome and transit access definition"
+    )
+    parser.add_argument("--data", default="data/02-analysis_data/analysis_data.parquet")
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--output", help="Save the results table as CSV to this path")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = transit_access_sweep(
+        pd.read_parquet(args.data), jobs=args.jobs, chunk_size=args.chunk_size
+    )
+    elapsed = time.perf_counter() - start
+
+    focal = results[results["term"] == "Transit_Access_Prop"]
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(focal.drop(columns=["term", "group_variance", "residual_variance"]).to_string(index=False))
+    print(f"\n{len(focal)} fits in {elapsed:.2f}s")
+    if args.output:
+        results.to_csv(args.output, index=False)
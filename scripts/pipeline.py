@@ -0,0 +1,734 @@
+#### Preamble ####
+# Purpose: Runs the data pipeline (scripts 01 to 04 and the model fit in 06), skipping stages
+# that are up to date
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/pipeline.py [--dry-run] [--force STAGE ...] [--jobs N] [--validate]
+# [--trace trace.jsonl] [--profile STAGE] [--warm] [--watch SECONDS]
+#        cae-pipeline [...], once the project is installed (e.g. `uv sync`)
+
+#### Workspace setup ####
+import argparse
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import chdir, redirect_stderr, redirect_stdout
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPTS_DIR)
+
+# Fingerprints of the last successful run of each stage, relative to the project root
+STATE_PATH = "data/.pipeline_state.json"
+
+# The geography crosswalk is reference data of the repository, so it is read from the
+# project root even when the pipeline runs on data under another root (see crosswalk.py)
+CROSSWALK_PATH = os.path.join(PROJECT_ROOT, "data/00-reference/dguid_crosswalk.csv")
+
+#### Define the pipeline ####
+
+# Each stage lists the stages it depends on, the files of code it runs (relative to
+# scripts/), and the data it reads and writes (relative to the project root).
+# A stage is rerun only when the hash of its code or inputs changes, or when its
+# outputs are missing or were modified since it last ran.
+# Each stage's entry point is its function in stages.py. In parallel mode it runs
+# inside a worker process, receiving the stage's shared inputs from the parent
+# instead of reading them again. In warm mode every stage runs in this process and
+# is handed the DataFrames earlier stages returned ("frames", by the name under
+# which a stage "returns" its output) instead of reading them back from disk.
+STAGES = {
+    "01": {
+        "script": "01-download_data.py",
+        "entry_point": "download_data",
+        "depends_on": [],
+        "code": [
+            "01-download_data.py",
+            "stages.py",
+            "utility_functions.py",
+            "ingest.py",
+            "statcan_download.py",
+            "datasets.py",
+            "arrow_cache.py",
+            "tracing.py",
+        ],
+        "inputs": [
+            "data/01-raw_data/public_transport_access.csv",
+            "data/01-raw_data/labour_rates.csv",
+            "data/01-raw_data/commute_times.csv",
+        ],
+        "outputs": [
+            "data/01-raw_data/public_transport_access",
+            "data/01-raw_data/labour_rates",
+            "data/01-raw_data/commute_times",
+        ],
+    },
+    "02.1": {
+        "script": "02.1-clean_transit_data.py",
+        "entry_point": "clean_transit",
+        "returns": "clean_transit_data",
+        "depends_on": ["01"],
+        "code": [
+            "02.1-clean_transit_data.py",
+            "stages.py",
+            "utility_functions.py",
+            "datasets.py",
+            "arrow_cache.py",
+            "column_profile.py",
+            "memory_budget.py",
+            "tracing.py",
+        ],
+        "inputs": ["data/01-raw_data/public_transport_access"],
+        "outputs": [
+            "data/02-analysis_data/clean_transit_data",
+            "data/02-analysis_data/profiles/clean_transit_data.json",
+        ],
+    },
+    "02.2": {
+        "script": "02.2-clean_labour_data.py",
+        "entry_point": "clean_labour",
+        "shared_inputs": ["transit_ids"],
+        "frames": ["clean_transit_data"],
+        "returns": "clean_labour_data",
+        "depends_on": ["02.1"],
+        "code": [
+            "02.2-clean_labour_data.py",
+            "stages.py",
+            "utility_functions.py",
+            "datasets.py",
+            "arrow_cache.py",
+            "crosswalk.py",
+            "memory_budget.py",
+            "tracing.py",
+        ],
+        "inputs": [
+            CROSSWALK_PATH,
+            "data/01-raw_data/labour_rates",
+            "data/02-analysis_data/clean_transit_data",
+        ],
+        "outputs": ["data/02-analysis_data/clean_labour_data"],
+    },
+    "02.3": {
+        "script": "02.3-clean_commute_data.py",
+        "entry_point": "clean_commute",
+        "shared_inputs": ["transit_ids"],
+        "frames": ["clean_transit_data"],
+        "returns": "clean_commute_data",
+        "depends_on": ["02.1"],
+        "code": [
+            "02.3-clean_commute_data.py",
+            "stages.py",
+            "utility_functions.py",
+            "datasets.py",
+            "arrow_cache.py",
+            "crosswalk.py",
+            "census_vintages.py",
+            "memory_budget.py",
+            "tracing.py",
+        ],
+        "inputs": [
+            CROSSWALK_PATH,
+            "data/01-raw_data/commute_times",
+            "data/02-analysis_data/clean_transit_data",
+        ],
+        "outputs": ["data/02-analysis_data/clean_commute_data"],
+    },
+    "03": {
+        "script": "03-analysis_data.py",
+        "entry_point": "build_analysis_data",
+        "frames": ["clean_transit_data", "clean_labour_data", "clean_commute_data"],
+        "returns": "analysis_data",
+        "depends_on": ["02.2", "02.3"],
+        "code": [
+            "03-analysis_data.py",
+            "stages.py",
+            "utility_functions.py",
+            "datasets.py",
+            "arrow_cache.py",
+            "labour_aggregates.py",
+            "analysis_store.py",
+            "census_vintages.py",
+            "query_plan.py",
+            "tracing.py",
+        ],
+        "inputs": [
+            "data/02-analysis_data/clean_transit_data",
+            "data/02-analysis_data/clean_labour_data",
+            "data/02-analysis_data/clean_commute_data",
+        ],
+        "outputs": [
+            "data/02-analysis_data/analysis_data.csv",
+            "data/02-analysis_data/analysis_data.parquet",
+            "data/02-analysis_data/labour_months",
+            "data/02-analysis_data/labour_aggregates.parquet",
+            "data/02-analysis_data/analysis_store.parquet",
+        ],
+    },
+    "03.1": {
+        "script": "03.1-transit_cube.py",
+        "entry_point": "build_transit_cube",
+        "frames": ["clean_transit_data"],
+        "returns": "transit_cube",
+        "depends_on": ["02.1"],
+        "code": [
+            "03.1-transit_cube.py",
+            "stages.py",
+            "utility_functions.py",
+            "datasets.py",
+            "arrow_cache.py",
+            "transit_cube.py",
+            "tracing.py",
+        ],
+        "inputs": ["data/02-analysis_data/clean_transit_data"],
+        "outputs": ["data/02-analysis_data/transit_cube.npz"],
+    },
+    "04": {
+        "script": "04-test_data.py",
+        "entry_point": "test_data",
+        "depends_on": ["03"],
+        "code": [
+            "04-test_data.py",
+            "stages.py",
+            "utility_functions.py",
+            "validation.py",
+            "datasets.py",
+            "arrow_cache.py",
+            "tracing.py",
+        ],
+        "inputs": [
+            "data/01-raw_data/public_transport_access",
+            "data/01-raw_data/labour_rates",
+            "data/01-raw_data/commute_times",
+            "data/02-analysis_data/clean_transit_data",
+            "data/02-analysis_data/clean_labour_data",
+            "data/02-analysis_data/clean_commute_data",
+            "data/02-analysis_data/analysis_data.parquet",
+        ],
+        "outputs": [],
+    },
+    "06": {
+        "script": "06-model_data.py",
+        "entry_point": "fit_participation_model",
+        "frames": ["analysis_data"],
+        "depends_on": ["03"],
+        "code": ["06-model_data.py", "stages.py", "mixed_model.py", "model_registry.py", "tracing.py"],
+        "inputs": ["data/02-analysis_data/analysis_data.parquet"],
+        "outputs": ["models/participation_model.npz"],
+    },
+}
+
+#### Define pipeline functions ####
+
+
+def load_transit_ids(root):
+    """Reads the distinct CMA IDs and names of the clean transit data once for all workers."""
+    from datasets import read_transit_ids
+
+    return read_transit_ids(os.path.join(root, "data/02-analysis_data/clean_transit_data"))
+
+
+# Inputs loaded once by the parent and passed to every stage that lists them
+SHARED_INPUTS = {
+    "transit_ids": load_transit_ids,
+}
+
+
+def topological_order(stages):
+    """Returns the stage names ordered so every stage comes after its dependencies."""
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through stage {name}")
+        visiting.add(name)
+        for dependency in stages[name]["depends_on"]:
+            visit(dependency)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+def dependency_levels(stages):
+    """Groups the stages into levels whose members depend only on earlier levels."""
+    levels = {}
+    for name in topological_order(stages):
+        dependencies = stages[name]["depends_on"]
+        levels[name] = 1 + max((levels[dep] for dep in dependencies), default=-1)
+    return [
+        [name for name in levels if levels[name] == level]
+        for level in range(max(levels.values()) + 1)
+    ]
+
+
+def load_state(root):
+    """Reads the pipeline state file, or returns an empty state on the first run."""
+    path = os.path.join(root, STATE_PATH)
+    if not os.path.exists(path):
+        return {"files": {}, "stages": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(root, state):
+    """Writes the pipeline state file atomically."""
+    path = os.path.join(root, STATE_PATH)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def file_digest(path, file_cache):
+    """
+    Returns the SHA-256 of a file's contents.
+
+    Digests are cached by (size, modification time) so unchanged files, including
+    multi-gigabyte raw tables, are not re-read on every run.
+    """
+    stat = os.stat(path)
+    cached = file_cache.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    file_cache[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return digest.hexdigest()
+
+
+def path_digest(path, file_cache):
+    """Returns a digest of a file, or of every file under a directory, or None if missing."""
+    if os.path.isfile(path):
+        return file_digest(path, file_cache)
+    if not os.path.isdir(path):
+        return None
+
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.startswith("."):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_digest(file_path, file_cache).encode())
+    return digest.hexdigest()
+
+
+def stage_fingerprint(stage, root, file_cache):
+    """Hashes a stage's code and input data into one fingerprint."""
+    digest = hashlib.sha256()
+    for code_file in stage["code"]:
+        digest.update(code_file.encode())
+        digest.update(file_digest(os.path.join(SCRIPTS_DIR, code_file), file_cache).encode())
+    for input_path in stage["inputs"]:
+        digest.update(input_path.encode())
+        digest.update(str(path_digest(os.path.join(root, input_path), file_cache)).encode())
+    return digest.hexdigest()
+
+
+def output_digests(stage, root, file_cache):
+    """Returns the current digest of each of a stage's outputs."""
+    return {
+        output: path_digest(os.path.join(root, output), file_cache)
+        for output in stage["outputs"]
+    }
+
+
+def stale_reason(name, stage, root, state, file_cache, force):
+    """Returns why a stage needs to run, or None if it is up to date."""
+    if name in force:
+        return "forced"
+
+    previous = state["stages"].get(name)
+    if previous is None:
+        return "never run"
+    if previous["fingerprint"] != stage_fingerprint(stage, root, file_cache):
+        return "code or inputs changed"
+
+    current_outputs = output_digests(stage, root, file_cache)
+    if any(digest is None for digest in current_outputs.values()):
+        return "outputs missing"
+    if current_outputs != previous["outputs"]:
+        return "outputs modified"
+    return None
+
+
+class StageFailed(RuntimeError):
+    """A stage exited with an error or wrote data that failed validation."""
+
+
+def run_stage(name, stage, root, profile_path=None):
+    """
+    Runs one stage's script from the project root and returns its wall time in seconds.
+
+    With a profile path, the stage's stacks are sampled while it runs and saved there
+    (see tracing.py).
+
+    Raises:
+        StageFailed: If the script exits with a non-zero status (its own output,
+                     including any traceback, has already been printed).
+    """
+    script_path = os.path.join(SCRIPTS_DIR, stage["script"])
+    env = dict(os.environ, PIPELINE_PROFILE=profile_path) if profile_path else None
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, script_path], cwd=root, env=env)
+    if process.returncode:
+        raise StageFailed(f"[{name}] failed (exit {process.returncode})")
+    return time.perf_counter() - start
+
+
+def run_stage_in_worker(name, root, shared):
+    """
+    Runs one stage's entry point inside a pool worker, capturing everything it prints.
+
+    Returns:
+        The stage's log, its wall time in seconds, and a traceback if it failed.
+    """
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    os.chdir(root)
+
+    stage = STAGES[name]
+    log = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    with redirect_stdout(log), redirect_stderr(log):
+        try:
+            import stages
+            from tracing import span
+
+            with span("stage", stage["script"]):
+                getattr(stages, stage["entry_point"])(**shared)
+        except Exception:
+            error = traceback.format_exc()
+    return log.getvalue(), time.perf_counter() - start, error
+
+
+def run_stage_warm(name, stage, root, frames):
+    """
+    Runs one stage's entry point in this process and returns its wall time in seconds.
+
+    The stage is handed the DataFrames it lists under "frames" that earlier stages
+    left in `frames`, and reads the rest from disk. Its own output is added to
+    `frames` for the stages after it.
+
+    Raises:
+        StageFailed: If the stage raises (its traceback is printed first).
+    """
+    import stages
+    from tracing import span
+
+    inputs = {key: frames[key] for key in stage.get("frames", []) if key in frames}
+    start = time.perf_counter()
+    try:
+        with chdir(root), span("stage", stage["script"], frames=sorted(inputs)):
+            output = getattr(stages, stage["entry_point"])(**inputs)
+    except Exception as error:
+        traceback.print_exc()
+        raise StageFailed(f"[{name}] failed ({type(error).__name__})") from error
+    if "returns" in stage:
+        # A stage that processed its data in chunks (over the memory budget) returns
+        # None, and the stages after it read its output from disk
+        if output is None:
+            frames.pop(stage["returns"], None)
+        else:
+            frames[stage["returns"]] = output
+    return time.perf_counter() - start
+
+
+def run_stages_in_parallel(names, root, jobs):
+    """
+    Runs independent stages concurrently in a process pool.
+
+    Shared inputs are loaded once here and sent to each worker. Each stage's log is
+    printed as one block when it finishes, so output from concurrent stages does not
+    interleave.
+
+    Returns:
+        A dict of stage name to wall time in seconds.
+    """
+    shared_names = {
+        input_name
+        for name in names
+        for input_name in STAGES[name].get("shared_inputs", [])
+    }
+    shared_values = {
+        input_name: SHARED_INPUTS[input_name](root) for input_name in shared_names
+    }
+
+    elapsed = {}
+    failed = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(names))) as pool:
+        futures = {
+            pool.submit(
+                run_stage_in_worker,
+                name,
+                root,
+                {key: shared_values[key] for key in STAGES[name].get("shared_inputs", [])},
+            ): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            log, elapsed[name], error = future.result()
+            print(f"----- [{name}] log -----")
+            print(log, end="")
+            if error:
+                print(error, end="")
+                failed.append(name)
+    if failed:
+        raise StageFailed(", ".join(f"[{name}] failed" for name in sorted(failed)))
+    return elapsed
+
+
+def validate_outputs(name, stage, root):
+    """
+    Checks the declared rules of a stage's outputs right after it runs.
+
+    Raises:
+        StageFailed: If any output breaks a rule, so later stages never read it.
+    """
+    from validation import ARTIFACTS, validate_artifacts
+
+    artifacts = [output for output in stage["outputs"] if output in ARTIFACTS]
+    if artifacts and not validate_artifacts(artifacts, root):
+        raise StageFailed(f"[{name}] wrote data that failed validation")
+
+
+def run_pipeline(
+    root=PROJECT_ROOT,
+    force=(),
+    dry_run=False,
+    jobs=1,
+    validate=False,
+    profile=(),
+    warm=False,
+    frames=None,
+):
+    """
+    Runs every stale stage in dependency order.
+
+    Args:
+        root: Directory the data paths are relative to.
+        force: Stage names to rerun even if up to date ("all" forces every stage).
+        dry_run: If True, only report which stages are stale.
+        jobs: Worker processes for running independent stages concurrently;
+              1 runs every stage in turn.
+        validate: If True, check each stage's outputs against their rules in
+                  validation.ARTIFACTS as soon as it finishes.
+        profile: Stage names whose stacks are sampled while they run, saved to
+                 profile_<stage>.folded in the current directory. Profiled stages
+                 run in their own process, even with jobs > 1.
+        warm: If True, run every stage in this process, one after another, handing
+              the DataFrames each stage returns to the stages after it instead of
+              writing and re-reading them (the outputs are still saved). Python,
+              pandas and pyarrow start up once for the whole run; `jobs` is ignored.
+        frames: (Optional) Dict of DataFrames returned by stages in earlier warm
+                runs, updated in place, so repeated runs in one process reuse the
+                outputs of stages that were up to date.
+
+    Returns:
+        A dict of stage name to the reason it ran (or would run), or None if skipped.
+
+    Raises:
+        StageFailed: If a stage fails; the stages after it are not run.
+    """
+    force = set(STAGES) if "all" in force else set(force)
+    unknown = force - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+
+    state = load_state(root)
+    file_cache = state["files"]
+    results = {}
+    if warm and frames is None:
+        frames = {}
+
+    for level in dependency_levels(STAGES):
+        to_run = []
+        for name in level:
+            stage = STAGES[name]
+            reason = stale_reason(name, stage, root, state, file_cache, force)
+
+            # In a dry run upstream stages don't actually rerun, so a stage whose
+            # dependency is stale is reported as stale too
+            if reason is None and dry_run:
+                upstream = [dep for dep in stage["depends_on"] if results.get(dep)]
+                if upstream:
+                    reason = f"upstream {', '.join(upstream)} stale"
+
+            results[name] = reason
+            if reason is None:
+                print(f"[{name}] up to date, skipping")
+            elif dry_run:
+                print(f"[{name}] stale: {reason}")
+            else:
+                print(f"[{name}] running {stage['script']} ({reason})")
+                to_run.append(name)
+
+        if warm:
+            elapsed = {}
+            for name in to_run:
+                stage = STAGES[name]
+                if name in profile:
+                    # Profiled in its own process, so later stages read its output from disk
+                    elapsed[name] = run_stage(
+                        name, stage, root, os.path.abspath(f"profile_{name}.folded")
+                    )
+                    frames.pop(stage.get("returns"), None)
+                else:
+                    elapsed[name] = run_stage_warm(name, stage, root, frames)
+        elif jobs > 1 and len(to_run) > 1 and not set(to_run) & set(profile):
+            elapsed = run_stages_in_parallel(to_run, root, jobs)
+        else:
+            elapsed = {
+                name: run_stage(
+                    name,
+                    STAGES[name],
+                    root,
+                    os.path.abspath(f"profile_{name}.folded") if name in profile else None,
+                )
+                for name in to_run
+            }
+
+        for name in to_run:
+            stage = STAGES[name]
+            if validate:
+                validate_outputs(name, stage, root)
+            state["stages"][name] = {
+                "fingerprint": stage_fingerprint(stage, root, file_cache),
+                "outputs": output_digests(stage, root, file_cache),
+            }
+            save_state(root, state)
+            print(f"[{name}] finished in {elapsed[name]:.1f}s")
+
+    if not dry_run:
+        save_state(root, state)
+    return results
+
+
+#### Run pipeline ####
+
+
+def main(argv=None):
+    """Runs the pipeline from the command line (the `cae-pipeline` command)."""
+    parser = argparse.ArgumentParser(
+        description="Run the data pipeline, skipping stages that are up to date"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show which stages are stale without running them",
+    )
+    parser.add_argument(
+        "--force",
+        action="append",
+        default=[],
+        metavar="STAGE",
+        help="Rerun a stage even if it is up to date (repeatable; 'all' for every stage)",
+    )
+    parser.add_argument(
+        "--root",
+        default=PROJECT_ROOT,
+        help="Directory the data paths are relative to (defaults to the project root)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Run independent stages (e.g. 02.2 and 02.3) concurrently in up to N worker processes",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Check each stage's outputs against their declared rules as soon as it finishes",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Append timed spans of every stage to this JSON-lines file",
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        default=[],
+        metavar="STAGE",
+        help="Sample a stage's stacks while it runs, saving them to profile_<STAGE>.folded",
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="Run every stage in this process, passing DataFrames between stages in memory",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="Peak memory each cleaning stage stays under; a stage whose data would "
+        "not fit whole processes it in chunks (sets PIPELINE_MEMORY_BUDGET)",
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="SECONDS",
+        help="Keep running, checking for stale stages every SECONDS; with --warm, "
+        "the loaded modules and the stages' DataFrames are kept between runs",
+    )
+    args = parser.parse_args(argv)
+
+    # Set before anything imports tracing.py, memory_budget.py, pandas or pyarrow, so
+    # this process, the worker processes and the stage scripts all trace to the same
+    # file and share one memory budget (and the allocator it picks)
+    if args.trace:
+        os.environ["PIPELINE_TRACE"] = os.path.abspath(args.trace)
+    if args.memory_budget is not None:
+        from stages import set_memory_budget
+
+        set_memory_budget(args.memory_budget * 2**20)
+
+    frames = {} if args.warm else None
+    force = args.force
+    try:
+        while True:
+            run_pipeline(
+                root=args.root,
+                force=force,
+                dry_run=args.dry_run,
+                jobs=args.jobs,
+                validate=args.validate,
+                profile=args.profile,
+                warm=args.warm,
+                frames=frames,
+            )
+            if args.watch is None:
+                break
+            # Forced stages run once; later runs only pick up changes
+            force = ()
+            time.sleep(args.watch)
+    except StageFailed as error:
+        # The stage's own output (and traceback) has already been printed
+        print(error, file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,801 @@
+#### Preamble ####
+# Purpose: A lazy query plan over the clean datasets: records scans, filters, grouped
+# means, pivots and joins, pushes filters and projections down to the scans, fuses
+# pivots into the joins that use them, and runs the plan on Arrow compute
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: from query_plan import scan
+#        plan = scan(path).filter([("Year", "in", [2023])]).pivot(...)
+#        print(plan.explain()); table = plan.collect()
+
+#### Workspace setup ####
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.acero as ac
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from datasets import open_dataset
+from tracing import span
+
+#### Define plan nodes ####
+
+# Each node records one operation and the nodes it reads from. Building a plan does
+# no work beyond reading dataset schemas; optimize() rewrites the tree and collect()
+# runs it. Scans stream their record batches through Acero (filter, project and
+# the grouped collection of values) in one pass, so only grouped results and join
+# outputs are ever materialized.
+#
+# Means use pandas' compensated (Kahan) summation over each group's values in scan
+# order, and derived columns use NumPy's ufuncs, so results match a pandas build of
+# the same data bit for bit (Arrow's own hash_mean and log10 differ in the last bit).
+
+
+class Node:
+    """Base class of the plan nodes."""
+
+    inputs = ()
+
+    def columns(self):
+        """Returns the node's output column names, in order."""
+        return self.inputs[0].columns()
+
+    def replace(self, *inputs, **attrs):
+        """Returns a copy of the node reading from other inputs, with any attributes changed."""
+        node = object.__new__(type(self))
+        node.__dict__.update(self.__dict__, inputs=tuple(inputs), **attrs)
+        return node
+
+
+class Scan(Node):
+    """Reads a registered dataset directory (or a DataFrame) with pushed-down columns and filters."""
+
+    def __init__(self, source, columns=None, filters=None):
+        self.source = source
+        if isinstance(source, pd.DataFrame):
+            self.label = "DataFrame"
+            available = list(source.columns)
+        else:
+            self.label = os.path.basename(os.path.normpath(source))
+            available = open_dataset(source).schema.names
+        self.scan_columns = list(columns or available)
+        self.filters = normalize_filters(filters)
+
+    def __str__(self):
+        text = f"Scan {self.label} [{', '.join(self.scan_columns)}]"
+        return text + (f" where {format_filters(self.filters)}" if self.filters else "")
+
+    def columns(self):
+        return list(self.scan_columns)
+
+
+class Filter(Node):
+    """Keeps the rows passing row predicates in pyarrow's DNF form."""
+
+    def __init__(self, source, filters):
+        self.inputs = (source,)
+        self.filters = normalize_filters(filters)
+
+    def __str__(self):
+        return f"Filter {format_filters(self.filters)}"
+
+
+class Derive(Node):
+    """
+    Adds or replaces columns computed from others.
+
+    Each column is given as (function, *arguments), where string arguments name
+    columns: ("divide", "a", "b"), ("log10", "a") or ("cast", "a", pa.int64()).
+    """
+
+    def __init__(self, source, derived):
+        self.inputs = (source,)
+        self.derived = dict(derived)
+
+    def __str__(self):
+        return "Derive " + ", ".join(
+            f"{name} = {format_expression(spec)}" for name, spec in self.derived.items()
+        )
+
+    def columns(self):
+        columns = self.inputs[0].columns()
+        return columns + [name for name in self.derived if name not in columns]
+
+
+class Project(Node):
+    """Keeps (and renames) columns; `mapping` maps each output column to its input column."""
+
+    def __init__(self, source, mapping):
+        self.inputs = (source,)
+        self.mapping = dict(mapping)
+
+    def __str__(self):
+        return "Project " + ", ".join(
+            name if name == col else f"{name} = {col}" for name, col in self.mapping.items()
+        )
+
+    def columns(self):
+        return list(self.mapping)
+
+
+class Sort(Node):
+    """Sorts the rows by columns, ascending."""
+
+    def __init__(self, source, keys):
+        self.inputs = (source,)
+        self.keys = list(keys)
+
+    def __str__(self):
+        return f"Sort [{', '.join(self.keys)}]"
+
+
+class Aggregate(Node):
+    """Averages a column per group of key columns (NaN and missing values are skipped)."""
+
+    def __init__(self, source, keys, value, name):
+        self.inputs = (source,)
+        self.keys = list(keys)
+        self.value = value
+        self.name = name
+
+    def __str__(self):
+        return f"Aggregate {self.name} = mean({self.value}) by [{', '.join(self.keys)}]"
+
+    def columns(self):
+        return self.keys + [self.name]
+
+
+class Pivot(Node):
+    """
+    Averages a value per index and pivot column value, one output column per value (as pivot_table()).
+
+    `names` maps the pivot column values kept to their output column names.
+    """
+
+    def __init__(self, source, index, column, value, names):
+        self.inputs = (source,)
+        self.index = list(index)
+        self.column = column
+        self.value = value
+        self.names = dict(names)
+
+    def __str__(self):
+        return (
+            f"Pivot mean({self.value}) by [{', '.join(self.index)}] x {self.column} -> "
+            + ", ".join(self.names.values())
+        )
+
+    def columns(self):
+        return self.index + list(self.names.values())
+
+
+class Join(Node):
+    """Left-joins the right input's columns onto each left row by key columns, keeping the left order."""
+
+    def __init__(self, left, right, on):
+        self.inputs = (left, right)
+        self.on = list(on)
+
+    def __str__(self):
+        return f"Join left on [{', '.join(self.on)}]"
+
+    def columns(self):
+        left, right = self.inputs
+        return left.columns() + [col for col in right.columns() if col not in self.on]
+
+
+class AsofJoin(Node):
+    """
+    Left-joins the latest right row per `by` key whose `right_on` is at or before the left row's `on`.
+
+    With interpolate=True, values between two right rows are interpolated linearly
+    (as census_vintages.align_vintages()). The left order is kept.
+    """
+
+    def __init__(self, left, right, by, on, right_on, interpolate=False):
+        self.inputs = (left, right)
+        self.by = by
+        self.on = on
+        self.right_on = right_on
+        self.interpolate = interpolate
+
+    def __str__(self):
+        how = "interpolated between" if self.interpolate else "latest"
+        return f"AsofJoin by {self.by}: {how} {self.right_on} <= {self.on}"
+
+    def columns(self):
+        left, right = self.inputs
+        return left.columns() + [col for col in right.columns() if col != self.by]
+
+
+class PivotJoin(Node):
+    """
+    A Pivot fused into the Join that uses it (made by optimize()).
+
+    The grouped means are scattered straight into the left rows' new columns, so the
+    wide pivot table is never built and joined.
+    """
+
+    def __init__(self, left, right, pivot):
+        self.inputs = (left, right)
+        self.pivot = pivot
+
+    def __str__(self):
+        pivot = self.pivot
+        return (
+            f"PivotJoin left on [{', '.join(pivot.index)}]: mean({pivot.value}) x "
+            f"{pivot.column} -> {', '.join(pivot.names.values())}"
+        )
+
+    def columns(self):
+        return self.inputs[0].columns() + list(self.pivot.names.values())
+
+
+#### Define plan building ####
+
+
+class Plan:
+    """
+    A lazy query over datasets: each method records an operation and returns a new Plan.
+
+    Examples:
+        plan = scan("data/02-analysis_data/clean_commute_data").pivot(
+            ["CMA_ID", "Census_Year"], "Commute_Mode", "Commute_Value", {"Public transit": "Transit"})
+        print(plan.explain())
+        table = plan.collect()
+    """
+
+    def __init__(self, node):
+        self.node = node
+
+    def filter(self, filters):
+        """Keeps the rows passing `filters` (pyarrow's DNF form, as for read_partitioned())."""
+        return Plan(Filter(self.node, filters))
+
+    def derive(self, **derived):
+        """Adds or replaces columns, each given as (function, *arguments) (see Derive)."""
+        return Plan(Derive(self.node, derived))
+
+    def select(self, columns):
+        """Keeps the listed columns in order, or renames them if given a {new: old} dict."""
+        mapping = columns if isinstance(columns, dict) else {col: col for col in columns}
+        return Plan(Project(self.node, mapping))
+
+    def sort(self, keys):
+        """Sorts the rows by the key columns."""
+        return Plan(Sort(self.node, keys))
+
+    def aggregate(self, keys, value, name):
+        """Averages `value` per group of `keys`, as column `name`."""
+        return Plan(Aggregate(self.node, keys, value, name))
+
+    def pivot(self, index, column, value, names):
+        """Averages `value` per `index` and `column` value, into one column per value in `names`."""
+        return Plan(Pivot(self.node, index, column, value, names))
+
+    def join(self, other, on):
+        """Left-joins another plan's columns by the `on` columns."""
+        return Plan(Join(self.node, other.node, on))
+
+    def asof_join(self, other, by, on, right_on, interpolate=False):
+        """Left-joins the latest row of another plan at or before each row (see AsofJoin)."""
+        return Plan(AsofJoin(self.node, other.node, by, on, right_on, interpolate))
+
+    def optimize(self):
+        """Returns the plan with filters, projections and sorts pushed down and pivots fused into joins."""
+        node = push_down_filters(self.node)
+        node = push_down_sorts(node)
+        node = fuse_pivot_joins(node)
+        node = prune_columns(node, self.node.columns())
+        return Plan(node)
+
+    def explain(self, optimize=True):
+        """Returns the plan as an indented tree, each operation above the inputs it reads."""
+        node = self.optimize().node if optimize else self.node
+        return "\n".join(explain_lines(node))
+
+    def collect(self):
+        """Optimizes and runs the plan, returning an Arrow table."""
+        node = self.optimize().node
+        with span("plan", "collect query plan") as plan_span:
+            table = execute(node)
+            plan_span.set(rows_out=table.num_rows)
+        return table
+
+
+def scan(source, columns=None):
+    """
+    Starts a plan reading a registered dataset directory or a DataFrame.
+
+    Args:
+        source: A directory registered in datasets.PARTITION_FIELDS (read through
+                datasets.open_dataset(), so from the Arrow cache when it is valid),
+                or the same data already in memory.
+        columns: (Optional) Columns to scan; the columns later operations use are
+                 worked out by optimize(), so this is rarely needed.
+    """
+    return Plan(Scan(source, columns))
+
+
+def explain_lines(node, depth=0):
+    """Returns the lines of explain(): each node, then its inputs indented beneath it."""
+    lines = ["  " * depth + str(node)]
+    for child in node.inputs:
+        lines += explain_lines(child, depth + 1)
+    return lines
+
+
+#### Define filter helpers ####
+
+
+def normalize_filters(filters):
+    """Returns filters in pyarrow's DNF form as a list of conjunctions (lists of (column, op, value))."""
+    if not filters:
+        return []
+    if isinstance(filters[0], tuple):
+        return [list(filters)]
+    return [list(conjunction) for conjunction in filters]
+
+
+def conjoin(filters, other):
+    """Returns the DNF filter of rows passing both DNF filters."""
+    if not filters:
+        return other
+    if not other:
+        return filters
+    return [left + right for left in filters for right in other]
+
+
+def filter_columns(filters):
+    """Returns the set of columns a DNF filter refers to."""
+    return {col for conjunction in filters for col, _, _ in conjunction}
+
+
+def format_filters(filters):
+    """Formats a DNF filter as text, e.g. Year in [2023, 2024] and Unit == 'Percent'."""
+    conjunctions = [
+        " and ".join(f"{col} {op} {value!r}" for col, op, value in conjunction)
+        for conjunction in filters
+    ]
+    if len(conjunctions) == 1:
+        return conjunctions[0]
+    return " or ".join(f"({conjunction})" for conjunction in conjunctions)
+
+
+def format_expression(spec):
+    """Formats a derived column's (function, *arguments) as text, e.g. divide(a, b)."""
+    function, *arguments = spec
+    return f"{function}({', '.join(str(argument) for argument in arguments)})"
+
+
+def expression_columns(spec):
+    """Returns the columns a derived column's (function, *arguments) reads."""
+    return {argument for argument in spec[1:] if isinstance(argument, str)}
+
+
+#### Define plan rewrites ####
+
+
+def push_down_filters(node, filters=None):
+    """
+    Moves every Filter as far down the tree as it stays correct, merging it into a Scan where it reaches one.
+
+    A filter passes a Derive, Project or Sort that does not compute its columns, a
+    grouped mean or pivot whose keys it tests, and a left join to the left side
+    when the left side provides all its columns.
+    """
+    filters = filters or []
+    if isinstance(node, Filter):
+        return push_down_filters(node.inputs[0], conjoin(filters, node.filters))
+    if isinstance(node, Scan):
+        return node.replace(filters=conjoin(node.filters, filters))
+
+    kept = filters
+    if isinstance(node, (Derive, Project, Sort, Aggregate, Pivot)):
+        passable = passes_through(node, filter_columns(filters))
+        below = renamed_filters(node, filters) if passable else []
+        kept = [] if passable else filters
+        pushed = node.replace(push_down_filters(node.inputs[0], below))
+    elif isinstance(node, (Join, AsofJoin, PivotJoin)):
+        left, right = node.inputs
+        passable = filter_columns(filters) <= set(left.columns())
+        kept = [] if passable else filters
+        pushed = node.replace(
+            push_down_filters(left, filters if passable else []), push_down_filters(right)
+        )
+    else:
+        pushed = node.replace(*[push_down_filters(child) for child in node.inputs])
+    return Filter(pushed, kept) if kept else pushed
+
+
+def passes_through(node, columns):
+    """Checks whether a filter or sort on `columns` can move below a single-input node."""
+    if isinstance(node, Derive):
+        return not columns & set(node.derived)
+    if isinstance(node, Project):
+        return columns <= set(node.mapping)
+    if isinstance(node, Aggregate):
+        return columns <= set(node.keys)
+    if isinstance(node, Pivot):
+        return columns <= set(node.index)
+    return True
+
+
+def renamed_filters(node, filters):
+    """Rewrites a filter passing a Project to the Project's input column names."""
+    if not isinstance(node, Project):
+        return filters
+    return [
+        [(node.mapping[col], op, value) for col, op, value in conjunction]
+        for conjunction in filters
+    ]
+
+
+def push_down_sorts(node):
+    """
+    Moves every Sort below the nodes that keep their left input's row order.
+
+    Joins keep the order of their left side, so sorting the (smaller) left side
+    before them gives the same rows in the same order for less work.
+    """
+    if isinstance(node, Sort):
+        child = node.inputs[0]
+        keys = set(node.keys)
+        if isinstance(child, (Derive, Project)) and passes_through(child, keys):
+            if isinstance(child, Project):
+                below_keys = [child.mapping[key] for key in node.keys]
+            else:
+                below_keys = node.keys
+            return push_down_sorts(child.replace(Sort(child.inputs[0], below_keys)))
+        if isinstance(child, (Join, AsofJoin, PivotJoin)) and keys <= set(child.inputs[0].columns()):
+            left, right = child.inputs
+            return push_down_sorts(child.replace(Sort(left, node.keys), right))
+    return node.replace(*[push_down_sorts(child) for child in node.inputs])
+
+
+def fuse_pivot_joins(node):
+    """Replaces each Join whose right side is a Pivot on the join keys with a PivotJoin."""
+    inputs = [fuse_pivot_joins(child) for child in node.inputs]
+    if isinstance(node, Join) and isinstance(inputs[1], Pivot) and inputs[1].index == node.on:
+        pivot = inputs[1]
+        return PivotJoin(inputs[0], pivot.inputs[0], pivot)
+    return node.replace(*inputs)
+
+
+def prune_columns(node, required):
+    """
+    Drops every column no operation above a node uses, down to the scans.
+
+    Scans then read only the columns the plan uses, and Derive and Project nodes
+    compute and keep only those.
+    """
+    required = set(required)
+    if isinstance(node, Scan):
+        return node.replace(scan_columns=[col for col in node.scan_columns if col in required])
+    if isinstance(node, Filter):
+        return node.replace(prune_columns(node.inputs[0], required | filter_columns(node.filters)))
+    if isinstance(node, Sort):
+        return node.replace(prune_columns(node.inputs[0], required | set(node.keys)))
+    if isinstance(node, Project):
+        mapping = {name: col for name, col in node.mapping.items() if name in required}
+        return Project(prune_columns(node.inputs[0], mapping.values()), mapping)
+    if isinstance(node, Derive):
+        derived = {name: spec for name, spec in node.derived.items() if name in required}
+        below = required - set(derived)
+        for spec in derived.values():
+            below |= expression_columns(spec)
+        return Derive(prune_columns(node.inputs[0], below), derived)
+    if isinstance(node, Aggregate):
+        return node.replace(prune_columns(node.inputs[0], node.keys + [node.value]))
+    if isinstance(node, Pivot):
+        return node.replace(prune_columns(node.inputs[0], node.index + [node.column, node.value]))
+
+    left, right = node.inputs
+    if isinstance(node, PivotJoin):
+        pivot = node.pivot
+        left_keys = set(pivot.index)
+        right_required = pivot.index + [pivot.column, pivot.value]
+    elif isinstance(node, AsofJoin):
+        left_keys = {node.by, node.on}
+        right_required = (required & set(right.columns())) | {node.by, node.right_on}
+    else:
+        left_keys = set(node.on)
+        right_required = (required & set(right.columns())) | left_keys
+    return node.replace(
+        prune_columns(left, (required & set(left.columns())) | left_keys),
+        prune_columns(right, right_required),
+    )
+
+
+#### Define plan execution ####
+
+
+def streams(node):
+    """Checks whether a node runs inside an Acero stream (no pipeline break)."""
+    if isinstance(node, Derive):
+        return all(spec[0] == "cast" for spec in node.derived.values())
+    return isinstance(node, (Scan, Filter, Project))
+
+
+def execute(node):
+    """Runs an optimized plan node, returning an Arrow table."""
+    if streams(node):
+        return declaration(node).to_table(use_threads=False)
+    if isinstance(node, Derive):
+        return derive_columns(execute(node.inputs[0]), node.derived)
+    if isinstance(node, Sort):
+        return execute(node.inputs[0]).sort_by([(key, "ascending") for key in node.keys])
+    if isinstance(node, Aggregate):
+        return grouped_means(node.inputs[0], node.keys, node.value, node.name)
+    if isinstance(node, Pivot):
+        means = grouped_means(node.inputs[0], node.index + [node.column], node.value, node.value)
+        with span("pivot", f"pivot {node.column}", rows_in=means.num_rows) as pivot_span:
+            keys = means.group_by(node.index, use_threads=False).aggregate([])
+            table = scatter_means(keys, means, node.index, node.column, node.value, node.names)
+            pivot_span.set(rows_out=table.num_rows)
+        return table
+    if isinstance(node, PivotJoin):
+        pivot = node.pivot
+        left = execute(node.inputs[0])
+        means = grouped_means(node.inputs[1], pivot.index + [pivot.column], pivot.value, pivot.value)
+        with span("merge", f"join pivoted {pivot.column}", rows_in=left.num_rows) as merge_span:
+            table = scatter_means(left, means, pivot.index, pivot.column, pivot.value, pivot.names)
+            merge_span.set(rows_out=table.num_rows)
+        return table
+    if isinstance(node, Join):
+        left, right = (execute(child) for child in node.inputs)
+        with span("merge", "join", rows_in=left.num_rows) as merge_span:
+            table = left_join(left, right, node.on)
+            merge_span.set(rows_out=table.num_rows)
+        return table
+    if isinstance(node, AsofJoin):
+        left, right = (execute(child) for child in node.inputs)
+        with span("merge", f"as-of join on {node.on}", rows_in=left.num_rows) as merge_span:
+            table = asof_join(left, right, node.by, node.on, node.right_on, node.interpolate)
+            merge_span.set(rows_out=table.num_rows)
+        return table
+    raise TypeError(f"Cannot execute {type(node).__name__}")
+
+
+def declaration(node):
+    """
+    Compiles a chain of streaming nodes (Scan, Filter, Project, cast-only Derive) into an Acero declaration.
+
+    Any other node is run first and its table becomes the declaration's source.
+    """
+    if not streams(node):
+        return ac.Declaration("table_source", ac.TableSourceNodeOptions(execute(node)))
+    if isinstance(node, Scan):
+        return scan_declaration(node)
+
+    if isinstance(node, Filter):
+        kind, options = "filter", ac.FilterNodeOptions(pq.filters_to_expression(node.filters))
+    elif isinstance(node, Project):
+        kind, options = "project", ac.ProjectNodeOptions(
+            [pc.field(col) for col in node.mapping.values()], list(node.mapping)
+        )
+    else:
+        columns = node.columns()
+        kind, options = "project", ac.ProjectNodeOptions(
+            [
+                pc.field(node.derived[col][1]).cast(node.derived[col][2])
+                if col in node.derived
+                else pc.field(col)
+                for col in columns
+            ],
+            columns,
+        )
+    return ac.Declaration(kind, options, inputs=[declaration(node.inputs[0])])
+
+
+def scan_declaration(node):
+    """
+    Compiles a Scan into an Acero scan, row filter and projection.
+
+    Partition and row group pruning happen in the scan; the filter node then drops
+    the remaining rows that fail. Dictionary-encoded columns (categoricals and string
+    partition keys) are decoded, so keys compare and join as plain values.
+    """
+    if isinstance(node.source, pd.DataFrame):
+        dataset = ds.dataset(pa.Table.from_pandas(node.source, preserve_index=False))
+    else:
+        dataset = open_dataset(node.source)
+    expression = pq.filters_to_expression(node.filters) if node.filters else None
+    needed = sorted(set(node.scan_columns) | filter_columns(node.filters))
+    stages = [ac.Declaration("scan", ac.ScanNodeOptions(dataset, columns=needed, filter=expression))]
+    if expression is not None:
+        stages.append(ac.Declaration("filter", ac.FilterNodeOptions(expression)))
+
+    schema = dataset.schema
+    expressions = [
+        pc.field(col).cast(schema.field(col).type.value_type)
+        if pa.types.is_dictionary(schema.field(col).type)
+        else pc.field(col)
+        for col in node.scan_columns
+    ]
+    stages.append(ac.Declaration("project", ac.ProjectNodeOptions(expressions, node.scan_columns)))
+    return ac.Declaration.from_sequence(stages)
+
+
+def grouped_means(node, keys, value, name):
+    """
+    Averages `value` per group of `keys` over a streamed input, with pandas' Kahan summation.
+
+    Acero collects each group's values in input order as the batches stream in; the
+    compensated sums then run over every group at once, one value position at a time.
+    """
+    collect = ac.Declaration(
+        "aggregate",
+        ac.AggregateNodeOptions([(value, "hash_list", None, "values")], keys=keys),
+        inputs=[declaration(node)],
+    )
+    with span("groupby", f"average {value}") as groupby_span:
+        grouped = collect.to_table(use_threads=False)
+        values = grouped.column("values").combine_chunks()
+        lengths = pc.list_value_length(values).to_numpy(zero_copy_only=False)
+        means = kahan_means(as_float(pc.list_flatten(values)), lengths)
+        groupby_span.set(rows_in=int(lengths.sum()), rows_out=len(means))
+    return grouped.select(keys).append_column(name, pa.array(means))
+
+
+def kahan_means(values, lengths):
+    """
+    Averages consecutive runs of values (one run per group) as pandas' group_mean() does.
+
+    NaN values are skipped, and a group without values gets NaN. The compensated sum
+    adds each group's values in order, so the means match pandas bit for bit.
+    """
+    starts = np.cumsum(lengths) - lengths
+    totals = np.zeros(len(lengths))
+    compensations = np.zeros(len(lengths))
+    counts = np.zeros(len(lengths))
+    for position in range(int(lengths.max(initial=0))):
+        groups = np.flatnonzero(lengths > position)
+        group_values = values[starts[groups] + position]
+        present = ~np.isnan(group_values)
+        groups, group_values = groups[present], group_values[present]
+
+        adjusted = group_values - compensations[groups]
+        new_totals = totals[groups] + adjusted
+        compensation = new_totals - totals[groups] - adjusted
+        # An infinite value makes the compensation NaN, which would turn the mean NaN
+        compensations[groups] = np.where(np.isnan(compensation), 0.0, compensation)
+        totals[groups] = new_totals
+        counts[groups] += 1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, totals / counts, np.nan)
+
+
+def key_positions(left, right, on):
+    """Returns the (left row, right row) pairs whose `on` columns match, as NumPy arrays."""
+    left_keys = left.select(on).append_column("__left", pa.array(np.arange(left.num_rows)))
+    right_keys = right.select(on).append_column("__right", pa.array(np.arange(right.num_rows)))
+    pairs = left_keys.join(right_keys, keys=on, join_type="inner", use_threads=False)
+    return pairs.column("__left").to_numpy(), pairs.column("__right").to_numpy()
+
+
+def scatter_means(left, means, on, column, value, names):
+    """Adds one column per pivot value in `names` to `left`, holding the mean of its matching row."""
+    left_rows, mean_rows = key_positions(left, means, on)
+    pivot_values = means.column(column).take(pa.array(mean_rows)).to_numpy(zero_copy_only=False)
+    mean_values = means.column(value).to_numpy()[mean_rows]
+    for pivot_value, name in names.items():
+        matched = pivot_values == pivot_value
+        scattered = np.full(left.num_rows, np.nan)
+        scattered[left_rows[matched]] = mean_values[matched]
+        left = left.append_column(name, pa.array(scattered))
+    return left
+
+
+def left_join(left, right, on):
+    """Left-joins `right` onto `left` by the `on` columns, keeping the left row order."""
+    left_rows, right_rows = key_positions(left, right, on)
+    unmatched = np.setdiff1d(np.arange(left.num_rows), left_rows)
+    rows = np.concatenate([left_rows, unmatched])
+    right_rows = np.concatenate([right_rows, np.full(len(unmatched), -1)])
+    order = np.argsort(rows, kind="stable")
+    rows, right_rows = rows[order], right_rows[order]
+
+    table = left.take(pa.array(rows))
+    indices = pa.array(right_rows, mask=right_rows < 0)
+    for col in right.column_names:
+        if col not in on:
+            table = table.append_column(col, right.column(col).take(indices))
+    return table
+
+
+def asof_positions(left_codes, left_on, right_codes, right_on, direction):
+    """
+    Matches each left row to a right row of the same key at or before (or after) its `on` value.
+
+    Keys are integer codes (-1 for a left key missing on the right). Each row's key
+    and `on` value are packed into one integer, so the match is one binary search
+    over the sorted right rows for every left row at once.
+
+    Returns each left row's right row position, or -1 where there is none.
+    """
+    if len(right_codes) == 0:
+        return np.full(len(left_codes), -1)
+    low = min(left_on.min(initial=0), right_on.min())
+    width = max(left_on.max(initial=0), right_on.max()) - low + 1
+    right_packed = right_codes * width + (right_on - low)
+    order = np.argsort(right_packed, kind="stable")
+    right_packed = right_packed[order]
+    left_packed = left_codes * width + (left_on - low)
+
+    if direction == "backward":
+        positions = np.searchsorted(right_packed, left_packed, side="right") - 1
+    else:
+        positions = np.searchsorted(right_packed, left_packed, side="left")
+    in_range = (positions >= 0) & (positions < len(order))
+    positions = order[np.clip(positions, 0, len(order) - 1)]
+    found = in_range & (left_codes >= 0) & (right_codes[positions] == left_codes)
+    return np.where(found, positions, -1)
+
+
+def asof_join(left, right, by, on, right_on, interpolate=False):
+    """Runs an AsofJoin on two tables (see census_vintages.align_vintages() for the semantics)."""
+    keys = pc.unique(right.column(by))
+    left_codes = pc.fill_null(pc.index_in(left.column(by), value_set=keys), -1).to_numpy()
+    right_codes = pc.index_in(right.column(by), value_set=keys).to_numpy()
+    left_on = left.column(on).to_numpy().astype(np.int64)
+    right_years = right.column(right_on).to_numpy().astype(np.int64)
+
+    def take(positions):
+        indices = pa.array(positions, mask=positions < 0)
+        return {col: right.column(col).take(indices) for col in right.column_names if col != by}
+
+    aligned = take(asof_positions(left_codes, left_on, right_codes, right_years, "backward"))
+    if interpolate:
+        following = take(asof_positions(left_codes, left_on, right_codes, right_years, "forward"))
+        previous_year = as_float(aligned[right_on])
+        gap = as_float(following[right_on]) - previous_year
+        elapsed = left_on.astype(np.float64) - previous_year
+        # Zero at a vintage, after the latest one, and where there is no earlier one
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = np.where(gap > 0, elapsed / gap, 0.0)
+        for col in aligned:
+            if col == right_on:
+                continue
+            previous = as_float(aligned[col])
+            change = as_float(following[col]) - previous
+            aligned[col] = pa.array(
+                previous + np.where((weight > 0) & ~np.isnan(change), weight * change, 0.0)
+            )
+
+    for col, values in aligned.items():
+        left = left.append_column(col, values)
+    return left
+
+
+def as_float(column):
+    """Returns an Arrow column as a float64 NumPy array, with missing values as NaN."""
+    return pc.cast(column, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def derive_columns(table, derived):
+    """
+    Adds derived columns to a table.
+
+    Arithmetic runs as NumPy ufuncs over the columns, as pandas' does, so derived
+    values match a pandas computation exactly; casts run on Arrow.
+    """
+    for name, (function, *arguments) in derived.items():
+        if function == "cast":
+            values = table.column(arguments[0]).cast(arguments[1])
+        else:
+            operands = [as_float(table.column(arg)) if isinstance(arg, str) else arg for arg in arguments]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = pa.array(getattr(np, function)(*operands))
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, values)
+        else:
+            table = table.append_column(name, values)
+    return table
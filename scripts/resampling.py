@@ -0,0 +1,376 @@
+#### Preamble ####
+# Purpose: Cluster-bootstrap and permutation inference for the random-intercept
+# participation model, fitting replicates in vectorized batches across processes
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: 03-analysis_data.py
+# Usage: python scripts/resampling.py [--replicates N] [--seed S] [--jobs N]
+
+#### Workspace setup ####
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from mixed_model import GroupStatistics, fit_statistics, group_statistics, model_design
+
+#### Define resampling settings ####
+
+# Replicates fitted together in one vectorized batch (and sent to a worker as one task)
+CHUNK_SIZE = 250
+
+# The participation model of 06-model_data.py
+PARTICIPATION_MODEL = {
+    "response": "Participation_Rate",
+    "terms": ["Transit_Access_Prop", "Commute_Ratio", "Log_Population"],
+    "group_col": "CMA_ID",
+    "factors": ["Year"],
+}
+
+#### Define resampling functions ####
+
+
+@dataclass
+class ResamplingDesign:
+    """
+    The parts of a model's data shared by every replicate.
+
+    Each group's cross-products are computed once, so a cluster-bootstrap replicate
+    is assembled by summing the blocks of the groups it draws, without touching rows.
+    """
+
+    X: np.ndarray
+    y: np.ndarray
+    group_codes: np.ndarray
+    coef_names: list
+    group_XtX: np.ndarray
+    group_Xty: np.ndarray
+    group_yty: np.ndarray
+    group_sizes: np.ndarray
+    group_X_sums: np.ndarray
+    group_y_sums: np.ndarray
+    reml: bool
+
+    @property
+    def n_groups(self):
+        return len(self.group_sizes)
+
+
+def resampling_design(data, response, terms, group_col, factors=(), reml=True):
+    """Builds the ResamplingDesign of `response ~ terms + as.factor(factors) + (1 | group_col)`."""
+    design = model_design(data, response, terms, group_col, factors)
+    X, y, codes = design.X, design.y, design.group_codes
+    n_groups = len(design.group_levels)
+
+    group_XtX = np.zeros((n_groups, X.shape[1], X.shape[1]))
+    np.add.at(group_XtX, codes, np.einsum("ni,nj->nij", X, X))
+    group_Xty = np.zeros((n_groups, X.shape[1]))
+    np.add.at(group_Xty, codes, X * y[:, None])
+    stats = group_statistics(X, y, codes, n_groups)
+
+    return ResamplingDesign(
+        X=X,
+        y=y,
+        group_codes=codes,
+        coef_names=design.coef_names,
+        group_XtX=group_XtX,
+        group_Xty=group_Xty,
+        group_yty=np.bincount(codes, weights=y**2, minlength=n_groups),
+        group_sizes=stats.sizes,
+        group_X_sums=stats.X_sums,
+        group_y_sums=stats.y_sums,
+        reml=reml,
+    )
+
+
+def bootstrap_statistics(design, draws):
+    """
+    Sums the per-group blocks of a batch of cluster-bootstrap samples.
+
+    Args:
+        design: A ResamplingDesign.
+        draws: Array of shape (replicates, groups) holding the groups each replicate
+               draws; a group drawn twice counts as two separate groups.
+    """
+    return GroupStatistics(
+        XtX=design.group_XtX[draws].sum(axis=1),
+        Xty=design.group_Xty[draws].sum(axis=1),
+        yty=design.group_yty[draws].sum(axis=1),
+        sizes=design.group_sizes[draws],
+        X_sums=design.group_X_sums[draws],
+        y_sums=design.group_y_sums[draws],
+    )
+
+
+def permutation_statistics(design, column, permutations):
+    """
+    Builds the statistics of a batch of designs whose `column` is permuted between groups.
+
+    Each group's block of values moves as a whole to another group, so the within-group
+    pattern (e.g. across years) is kept. Requires every group to have the same rows.
+
+    Args:
+        design: A ResamplingDesign.
+        column: Position of the permuted column in the design matrix.
+        permutations: Array of shape (replicates, groups); replicate r gives group g
+                      the values of group permutations[r, g].
+    """
+    n_groups = design.n_groups
+    rows_per_group = len(design.y) // n_groups
+    blocks = design.X[:, column].reshape(n_groups, rows_per_group)
+
+    X = np.broadcast_to(design.X, (len(permutations), *design.X.shape)).copy()
+    X[:, :, column] = blocks[permutations].reshape(len(permutations), -1)
+    batch = (len(permutations),)
+    return GroupStatistics(
+        XtX=np.einsum("bni,bnj->bij", X, X),
+        Xty=np.einsum("bni,n->bi", X, design.y),
+        yty=np.full(batch, design.y @ design.y),
+        sizes=np.broadcast_to(design.group_sizes, (*batch, n_groups)),
+        X_sums=X.reshape(*batch, n_groups, rows_per_group, -1).sum(axis=2),
+        y_sums=np.broadcast_to(design.group_y_sums, (*batch, n_groups)),
+    )
+
+
+# Design shared with the worker processes, set once per worker by init_worker()
+_worker_design = None
+
+
+def init_worker(design):
+    """Receives the design once per worker process instead of once per task."""
+    global _worker_design
+    _worker_design = design
+
+
+def run_chunk(kind, seed, n_replicates, column=None, design=None):
+    """
+    Fits one batch of replicates.
+
+    Each chunk draws from its own child of the run's seed sequence, so results do not
+    depend on the number of workers or on which worker runs which chunk.
+
+    Returns:
+        The replicate fixed effects and standard errors, each (n_replicates, p), and thetas.
+    """
+    design = design if design is not None else _worker_design
+    rng = np.random.default_rng(seed)
+    if kind == "bootstrap":
+        draws = rng.integers(0, design.n_groups, size=(n_replicates, design.n_groups))
+        stats = bootstrap_statistics(design, draws)
+    else:
+        permutations = rng.permuted(
+            np.tile(np.arange(design.n_groups), (n_replicates, 1)), axis=1
+        )
+        stats = permutation_statistics(design, column, permutations)
+
+    theta, beta, _, std_err, _ = fit_statistics(stats, design.reml)
+    return beta, std_err, theta
+
+
+def run_replicates(design, kind, n_replicates, seed, jobs=None, chunk_size=CHUNK_SIZE, column=None):
+    """Fits `n_replicates` replicates in chunks, in a process pool if jobs is more than 1."""
+    chunk_sizes = [chunk_size] * (n_replicates // chunk_size)
+    if n_replicates % chunk_size:
+        chunk_sizes.append(n_replicates % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        results = [
+            run_chunk(kind, chunk_seed, size, column, design)
+            for chunk_seed, size in zip(seeds, chunk_sizes)
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_worker, initargs=(design,)
+        ) as executor:
+            results = list(executor.map(
+                run_chunk,
+                [kind] * len(chunk_sizes),
+                seeds,
+                chunk_sizes,
+                [column] * len(chunk_sizes),
+            ))
+
+    beta, std_err, theta = (np.concatenate(parts) for parts in zip(*results))
+    return beta, std_err, theta
+
+
+@dataclass
+class BootstrapResult:
+    """Cluster-bootstrap replicates of a model's fixed effects. Printing it gives a summary."""
+
+    coef_names: list
+    estimate: np.ndarray
+    replicates: np.ndarray
+    theta: np.ndarray
+    seed: int
+
+    @property
+    def std_err(self):
+        return self.replicates.std(axis=0, ddof=1)
+
+    def confidence_intervals(self, level=0.95):
+        """Returns percentile confidence intervals for each fixed effect."""
+        tail = (1 - level) / 2
+        lower, upper = np.quantile(self.replicates, [tail, 1 - tail], axis=0)
+        return pd.DataFrame(
+            {"Estimate": self.estimate, "Boot SE": self.std_err, "Lower": lower, "Upper": upper},
+            index=pd.Index(self.coef_names),
+        )
+
+    def __str__(self):
+        return (
+            f"Cluster bootstrap: {len(self.replicates)} replicates (seed {self.seed})\n"
+            + self.confidence_intervals().to_string(float_format=lambda value: f"{value:.6g}")
+        )
+
+
+@dataclass
+class PermutationResult:
+    """A permutation test of one fixed effect, using its t value as the test statistic."""
+
+    term: str
+    observed: float
+    null_distribution: np.ndarray
+    seed: int
+
+    @property
+    def p_value(self):
+        """Two-sided p-value, counting the observed statistic as one of the replicates."""
+        extreme = np.count_nonzero(np.abs(self.null_distribution) >= abs(self.observed))
+        return (extreme + 1) / (len(self.null_distribution) + 1)
+
+    def __str__(self):
+        return (
+            f"Permutation test of {self.term}: {len(self.null_distribution)} replicates "
+            f"(seed {self.seed})\n"
+            f"t = {self.observed:.4f}, permutation p = {self.p_value:.4f}"
+        )
+
+
+def cluster_bootstrap(
+    data,
+    response,
+    terms,
+    group_col,
+    factors=(),
+    n_replicates=10000,
+    seed=0,
+    jobs=None,
+    chunk_size=CHUNK_SIZE,
+    reml=True,
+):
+    """
+    Cluster-bootstraps a random-intercept model, resampling whole groups with replacement.
+
+    Replicates are fitted `chunk_size` at a time as one vectorized batch, and chunks
+    are spread over a process pool. The same seed gives the same replicates whatever
+    the number of jobs.
+
+    Args:
+        data, response, terms, group_col, factors, reml: The model, as in
+            mixed_model.fit_random_intercept().
+        n_replicates: Number of bootstrap samples.
+        seed: Seed of the run.
+        jobs: Worker processes; all CPUs if None, in-process if 1.
+        chunk_size: Replicates per batch.
+
+    Returns:
+        A BootstrapResult.
+    """
+    design = resampling_design(data, response, terms, group_col, factors, reml)
+    full_stats = bootstrap_statistics(design, np.arange(design.n_groups)[None, :])
+    _, estimate, _, _, _ = fit_statistics(full_stats, reml)
+    beta, _, theta = run_replicates(design, "bootstrap", n_replicates, seed, jobs, chunk_size)
+    return BootstrapResult(
+        coef_names=design.coef_names,
+        estimate=estimate[0],
+        replicates=beta,
+        theta=theta,
+        seed=seed,
+    )
+
+
+def permutation_test(
+    data,
+    response,
+    terms,
+    group_col,
+    term,
+    factors=(),
+    n_replicates=10000,
+    seed=0,
+    jobs=None,
+    chunk_size=CHUNK_SIZE,
+    reml=True,
+):
+    """
+    Tests a fixed effect by permuting its values between groups.
+
+    Under the null of no effect, the group each block of `term` values belongs to is
+    exchangeable; the model is refitted for each permutation and the observed t value
+    compared with the permuted ones. Every group must have the same number of rows
+    (here, one per year).
+
+    Args:
+        data, response, terms, group_col, factors, reml: The model, as in
+            mixed_model.fit_random_intercept().
+        term: The predictor to test; one of `terms`.
+        n_replicates, seed, jobs, chunk_size: As in cluster_bootstrap().
+
+    Returns:
+        A PermutationResult.
+    """
+    design = resampling_design(data, response, terms, group_col, factors, reml)
+    if len(np.unique(design.group_sizes)) != 1:
+        raise ValueError("Permutation between groups needs every group to have the same rows")
+    column = design.coef_names.index(term)
+
+    identity = np.arange(design.n_groups)[None, :]
+    _, beta, _, std_err, _ = fit_statistics(permutation_statistics(design, column, identity), reml)
+    observed = float(beta[0, column] / std_err[0, column])
+
+    beta, std_err, _ = run_replicates(
+        design, "permutation", n_replicates, seed, jobs, chunk_size, column
+    )
+    return PermutationResult(
+        term=term,
+        observed=observed,
+        null_distribution=beta[:, column] / std_err[:, column],
+        seed=seed,
+    )
+
+
+#### Run resampling inference ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cluster-bootstrap and permutation inference for the participation model"
+    )
+    parser.add_argument("--data", default="data/02-analysis_data/analysis_data.parquet")
+    parser.add_argument("--replicates", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    model_data = pd.read_parquet(args.data)
+    options = {
+        "n_replicates": args.replicates,
+        "seed": args.seed,
+        "jobs": args.jobs,
+        "chunk_size": args.chunk_size,
+    }
+
+    start = time.perf_counter()
+    print(cluster_bootstrap(model_data, **PARTICIPATION_MODEL, **options))
+    for term in PARTICIPATION_MODEL["terms"]:
+        print()
+        print(permutation_test(model_data, **PARTICIPATION_MODEL, term=term, **options))
+    print(f"\nFinished in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,831 @@
+#### Preamble ####
+# Purpose: Defines each pipeline stage (scripts 01 to 04 and 06) as an importable
+# function with explicit inputs and outputs
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: from stages import clean_transit, clean_labour, clean_commute, build_analysis_data
+
+#### Workspace setup ####
+import functools
+import os
+
+# pandas, pyarrow and the helper modules built on them are imported inside each
+# stage, so importing this module (e.g. to check which stages are stale) is
+# cheap, and a process running several stages pays for those imports once.
+
+#### Set up the memory budget ####
+
+
+def set_memory_budget(budget):
+    """
+    Sets the memory budget, in bytes, of this process and the stage scripts it runs.
+
+    Under a budget, Arrow allocates from jemalloc, which returns freed memory to the
+    operating system where Arrow's default pool (mimalloc) keeps it, so a stage
+    processing in chunks does not grow with every chunk it frees. Arrow picks its
+    pool when pandas or pyarrow is first imported, so this is called before either.
+    """
+    os.environ["PIPELINE_MEMORY_BUDGET"] = str(budget)
+    if budget > 0:
+        os.environ.setdefault("ARROW_DEFAULT_MEMORY_POOL", "jemalloc")
+        # Freed pages are returned at once rather than after a second (about 50 MB
+        # less at 02.1's peak, for about a fifth more time)
+        os.environ.setdefault("JE_ARROW_MALLOC_CONF", "dirty_decay_ms:0,muzzy_decay_ms:0")
+
+
+# A budget set in the environment by hand picks the same allocator
+if int(os.environ.get("PIPELINE_MEMORY_BUDGET", 0)) > 0:
+    set_memory_budget(int(os.environ["PIPELINE_MEMORY_BUDGET"]))
+
+#### Define stage settings ####
+
+# Data paths, relative to the project root. Each stage's inputs default to the saved
+# data; a DataFrame already in memory can be passed instead of a path to skip the
+# read (see datasets.read_partitioned()).
+raw_transit_csv_path = "data/01-raw_data/public_transport_access.csv"
+raw_labour_csv_path = "data/01-raw_data/labour_rates.csv"
+raw_commute_csv_path = "data/01-raw_data/commute_times.csv"
+
+raw_transit_path = "data/01-raw_data/public_transport_access"
+raw_labour_path = "data/01-raw_data/labour_rates"
+raw_commute_path = "data/01-raw_data/commute_times"
+
+clean_transit_path = "data/02-analysis_data/clean_transit_data"
+clean_labour_path = "data/02-analysis_data/clean_labour_data"
+clean_commute_path = "data/02-analysis_data/clean_commute_data"
+transit_profile_path = "data/02-analysis_data/profiles/clean_transit_data.json"
+
+transit_cube_path = "data/02-analysis_data/transit_cube.npz"
+
+analysis_csv_path = "data/02-analysis_data/analysis_data.csv"
+analysis_parquet_path = "data/02-analysis_data/analysis_data.parquet"
+participation_model_path = "models/participation_model.npz"
+
+# Columns kept from each raw table
+transit_columns = [
+    "GEO",
+    "REF_DATE",
+    "DGUID",
+    "Distance-capacity public transit service area",
+    "Demographic and socio-economic",
+    "Sustainable Development Goals (SDGs) 11.2.1 indicator",
+    "UOM",
+    "VALUE"
+]
+labour_columns = [
+    "REF_DATE",
+    "GEO",
+    "DGUID",
+    "Labour force characteristics",
+    "Data type",
+    "UOM",
+    "VALUE"
+]
+commute_columns = [
+    "GEO",
+    "REF_DATE",
+    "DGUID",
+    "Main mode of commuting (21)",
+    "Commuting duration (7)",
+    "VALUE"
+]
+
+# New names of the columns kept from each raw table
+transit_names = {
+    "GEO": "CMA",
+    "REF_DATE": "Year",
+    "DGUID": "CMA_ID",
+    "Distance-capacity public transit service area": "Transit_Distance_Category",
+    "Demographic and socio-economic": "Transit_Profile_Characteristic",
+    "Sustainable Development Goals (SDGs) 11.2.1 indicator": "Measure",
+    "UOM": "Transit_Unit_of_Measure",
+    "VALUE": "Transit_Value"
+}
+labour_names = {
+    "REF_DATE": "Time_Period",
+    "GEO": "CMA",
+    "DGUID": "CMA_ID",
+    "Labour force characteristics": "Labour_Metric",
+    "Data type": "Labour_Data_Type",
+    "UOM": "Labour_Unit_of_Measure",
+    "VALUE": "Labour_Value"
+}
+commute_names = {
+    "GEO": "CMA",
+    "REF_DATE": "Census_Year",
+    "DGUID": "CMA_ID",
+    "Main mode of commuting (21)": "Commute_Mode",
+    "Commuting duration (7)": "Average_Commute_Duration",
+    "VALUE": "Commute_Value"
+}
+
+# Labour rows used for the annual averages: rates in 'Percent' OR Population in
+# 'Persons in thousands'
+labour_units = {
+    "Employment rate": "Percent",
+    "Participation rate": "Percent",
+    "Unemployment rate": "Percent",
+    "Population": "Persons in thousands",
+}
+rate_metrics = ["Unemployment rate", "Participation rate"]
+labour_metrics = [*rate_metrics, "Population"]
+labour_years = ["2023", "2024"]
+
+labour_conditions = [
+    ("Labour_Data_Type", "==", "Seasonally adjusted"),
+    ("Year", "in", labour_years),
+]
+
+
+def labour_row_filters(metrics=labour_metrics):
+    """Returns the labour rows averaged for `metrics` in pyarrow's DNF form, one condition list per unit."""
+    unknown = [metric for metric in metrics if metric not in labour_units]
+    if unknown:
+        raise ValueError(f"Unknown labour metric(s): {', '.join(unknown)}")
+    by_unit = {}
+    for metric in metrics:
+        by_unit.setdefault(labour_units[metric], []).append(metric)
+    return [
+        [("Labour_Metric", "in", names), ("Labour_Unit_of_Measure", "==", unit), *labour_conditions]
+        for unit, names in by_unit.items()
+    ]
+
+
+labour_filters = labour_row_filters()
+
+# Transit access variant used in the analysis data; every distance category and
+# demographic group is kept in the analysis store
+transit_years = [2023, 2024]
+transit_category = "500 metres from all public transit stops"
+transit_characteristic = "15 to 64 years"
+
+# Commute modes used in the analysis data, and kept in the analysis store by default
+commute_metrics = ["Car, truck or van", "Public transit"]
+
+#### Define stage functions ####
+
+
+def download_data(mode="streaming", block_size=None, download=False, base_url=None):
+    """
+    Saves the StatCan CSV tables as Parquet datasets partitioned by year and dimension (01).
+
+    Args:
+        mode: 'streaming' converts each table in bounded batches and drops unused
+              columns; 'eager' loads each full CSV with pandas first.
+        block_size: (Optional) Bytes of CSV parsed per batch in streaming mode.
+        download: If True, download the full tables from StatCan instead of reading
+                  the CSVs in data/01-raw_data, streaming each zipped CSV into its
+                  dataset (see statcan_download.py). Tables unchanged since their
+                  last download are skipped.
+        base_url: (Optional) URL the table zips are downloaded from, e.g. a local
+                  table_server.py; StatCan's if None.
+
+    Returns:
+        The number of rows written to each dataset directory.
+    """
+    if download:
+        from statcan_download import BASE_URL, TABLES, download_tables
+
+        results = download_tables(base_url=base_url or BASE_URL, block_size=block_size)
+        return {
+            TABLES[name]["dataset"]: rows for name, (_, rows) in results.items() if rows is not None
+        }
+
+    import pandas as pd
+    from datasets import write_partitioned
+    from ingest import (
+        stream_csv_to_parquet,
+        statcan_column_types,
+        read_csv_header,
+        DEFAULT_BLOCK_SIZE,
+        DICTIONARY_TYPE,
+    )
+
+    tables = [
+        (raw_transit_csv_path, raw_transit_path),
+        (raw_labour_csv_path, raw_labour_path),
+        (raw_commute_csv_path, raw_commute_path),
+    ]
+
+    rows = {}
+    for csv_path, dataset_path in tables:
+        if mode == "streaming":
+            # Full-size tables run to gigabytes, so each one is parsed and written
+            # row group by row group and peak memory stays flat
+            rows[dataset_path] = stream_csv_to_parquet(
+                csv_path, dataset_path, block_size=block_size or DEFAULT_BLOCK_SIZE
+            )
+        elif mode == "eager":
+            # String dimensions are read as categoricals, matching the streaming schema
+            column_types = statcan_column_types(read_csv_header(csv_path))
+            dimensions = [col for col, col_type in column_types.items() if col_type == DICTIONARY_TYPE]
+            data = pd.read_csv(csv_path, dtype=dict.fromkeys(dimensions, "category"))
+            if dataset_path == raw_labour_path:
+                data["REF_YEAR"] = data["REF_DATE"].str[:4].astype(int)
+            write_partitioned(data, dataset_path)
+            rows[dataset_path] = len(data)
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+        print(f"Wrote {rows[dataset_path]} rows to {dataset_path}")
+    return rows
+
+
+def copy_on_write(stage):
+    """
+    Runs a stage with pandas' copy-on-write mode on.
+
+    Renames, column selections and column assignments then share the data they
+    start from instead of copying it, and a frame is only copied if it is changed
+    while another still refers to it, so each stage materializes its data once.
+    Copy-on-write is always on from pandas 3, where the option is deprecated, so
+    there the stage runs as it is.
+    """
+
+    @functools.wraps(stage)
+    def run(*args, **kwargs):
+        import pandas as pd
+
+        if int(pd.__version__.split(".")[0]) >= 3:
+            return stage(*args, **kwargs)
+        with pd.option_context("mode.copy_on_write", True):
+            return stage(*args, **kwargs)
+
+    return run
+
+
+def clean_transit_rows(transit_data):
+    """Renames the raw transit columns and shortens the CMA names, for the whole data or one chunk."""
+    from utility_functions import map_categories
+
+    # Rename columns for clarity
+    transit_data = transit_data.rename(columns=transit_names)
+
+    # Change the values in 'CMA' by removing the string ", Census metropolitan area (CMA)" to make it cleaner
+    # (CMA is categorical, so each distinct name is cleaned once rather than every row)
+    transit_data['CMA'] = map_categories(
+        transit_data['CMA'], lambda cma: cma.replace(", Census metropolitan area (CMA)", ""))
+    return transit_data
+
+
+@copy_on_write
+def clean_transit(raw_transit_data=raw_transit_path, memory_budget=None):
+    """
+    Cleans the raw public transit data, saves it and profiles the saved dataset (02.1).
+
+    Args:
+        raw_transit_data: The raw transit dataset directory, or the data in memory.
+        memory_budget: (Optional) Peak memory in bytes to stay under; the data is
+                       cleaned in chunks if it would not fit whole (see
+                       memory_budget.py). PIPELINE_MEMORY_BUDGET if None.
+
+    Returns:
+        The clean transit data, or None if it was cleaned in chunks.
+    """
+    import numpy as np
+    import pandas as pd
+    from datasets import read_partitioned, read_batches, write_partitioned
+    from column_profile import profile_parquet, write_profile, print_profile
+    from memory_budget import fits_budget
+
+    # Drop Census Metropolitan Areas (CMAs) with missing values, looking for them one
+    # chunk at a time so the whole column is never converted at once
+    missing_cmas = [
+        value_data.loc[value_data['VALUE'].isna(), 'GEO'].astype(object).unique()
+        for value_data in read_batches(raw_transit_data, columns=["GEO", "VALUE"])
+    ]
+    cmas_to_drop = pd.unique(np.concatenate(missing_cmas))
+    print("CMAs with missing values in VALUE:", cmas_to_drop)
+
+    # Analysis verified that 1 CMA had no recorded data for public transit access, so we will drop it entirely
+    row_filters = [("GEO", "not in", list(cmas_to_drop))] if len(cmas_to_drop) else None
+    if fits_budget(raw_transit_data, transit_columns, row_filters, memory_budget):
+        transit_data = clean_transit_rows(read_partitioned(
+            raw_transit_data, columns=transit_columns, filters=row_filters))
+        write_partitioned(transit_data, clean_transit_path)
+    else:
+        transit_data = None
+        batches = read_batches(raw_transit_data, columns=transit_columns, filters=row_filters)
+        write_partitioned(map(clean_transit_rows, batches), clean_transit_path)
+
+    # Profile the saved dataset one row group at a time, with approximate distinct counts
+    # for high-cardinality columns such as Transit_Value, and save it for diffing between runs
+    profile = profile_parquet(clean_transit_path)
+    write_profile(profile, transit_profile_path)
+    print_profile(profile)
+    return transit_data
+
+
+def clean_labour_rows(labour_data):
+    """Renames the crosswalked labour columns and adds each row's year, for the whole data or one chunk."""
+    from utility_functions import map_categories
+
+    clean_labour_data = labour_data.rename(columns=labour_names)
+
+    # Create a 'Year' column by splitting the 'Time_Period' string, once per distinct period
+    clean_labour_data['Time_Period'] = clean_labour_data['Time_Period'].astype("category")
+    clean_labour_data['Year'] = map_categories(
+        clean_labour_data['Time_Period'], lambda period: period.split('-')[0])
+    return clean_labour_data
+
+
+@copy_on_write
+def clean_labour(
+    transit_ids=None,
+    clean_transit_data=clean_transit_path,
+    raw_labour_data=raw_labour_path,
+    memory_budget=None,
+):
+    """
+    Cleans the raw labour data, checking its IDs against the clean transit data, and saves it (02.2).
+
+    Args:
+        transit_ids: (Optional) IdIndex of the clean transit data's CMA_ID and CMA
+                     columns, as returned by read_transit_ids(). Built from
+                     `clean_transit_data` if None, so a caller running several
+                     stages can share one copy.
+        clean_transit_data: The clean transit dataset directory, or the data in memory.
+        raw_labour_data: The raw labour dataset directory, or the data in memory.
+        memory_budget: (Optional) Peak memory in bytes to stay under; the data is
+                       cleaned in chunks if it would not fit whole (see
+                       memory_budget.py). PIPELINE_MEMORY_BUDGET if None.
+
+    Returns:
+        The clean labour data, or None if it was cleaned in chunks.
+    """
+    from utility_functions import check_id_consistency
+    from datasets import read_partitioned, read_batches, write_partitioned, read_transit_ids
+    from crosswalk import load_crosswalk, apply_crosswalk
+    from memory_budget import fits_budget
+    from tracing import span
+
+    # Read in the raw data, decoding only the columns this stage uses. Over the memory
+    # budget, only the ID columns are read whole, for the consistency checks
+    in_memory = fits_budget(raw_labour_data, labour_columns, budget=memory_budget)
+    labour_data = read_partitioned(
+        raw_labour_data, columns=labour_columns if in_memory else ["DGUID", "GEO"])
+
+    # Only the ID index of the transit data is needed for the consistency checks,
+    # and it is built once for both of them
+    if transit_ids is None:
+        transit_ids = read_transit_ids(clean_transit_data)
+
+    # Check the unique IDs and names in the labour data
+    print(check_id_consistency(
+        df1=transit_ids,
+        df2=labour_data,
+        id_col2="DGUID",
+        name_col2="GEO",
+        label1="Transit Data",
+        label2="Labour Data"))
+
+    # To ensure consistency between datasets, the labour data DGUIDs are fixed with the
+    # geography crosswalk (data/00-reference/dguid_crosswalk.csv):
+    # - DGUID ‘2021S05031’ corresponds to St. John’s, matching the CMA_ID ‘2021S0503001’
+    #   in the transit data, so it is remapped to enable accurate merging.
+    # - No data was found for Saguenay, Quebec (DGUID ‘2021S0503408’) in the transit
+    #   dataset, so this city is dropped.
+    # - For Ottawa-Gatineau, Ontario/Quebec (DGUID ‘2021S0503505’), the city is split into
+    #   Ontario and Quebec parts in the transit data, which are already represented as
+    #   separate entries; therefore, the combined DGUID is dropped.
+    crosswalk = load_crosswalk("labour_rates")
+    with span("merge", "apply crosswalk", rows_in=len(labour_data)) as merge_span:
+        labour_data = apply_crosswalk(labour_data, crosswalk)
+        merge_span.set(rows_out=len(labour_data))
+
+    # Check ID consistency again after adjustments, should show no inconsistencies now
+    id_check = check_id_consistency(
+        df1=transit_ids,
+        df2=labour_data,
+        id_col2="DGUID",
+        name_col2="GEO",
+        label1="Transit Data",
+        label2="Labour Data")
+    print(id_check)
+    if not id_check.is_consistent:
+        raise ValueError("Labour data CMA IDs do not match the transit data")
+
+    if not in_memory:
+        batches = read_batches(raw_labour_data, columns=labour_columns)
+        write_partitioned(
+            (clean_labour_rows(apply_crosswalk(batch, crosswalk)) for batch in batches),
+            clean_labour_path)
+        return None
+
+    clean_labour_data = clean_labour_rows(labour_data)
+    write_partitioned(clean_labour_data, clean_labour_path)
+    return clean_labour_data
+
+
+def clean_commute_chunk(commute_data, crosswalk, vintage):
+    """Cleans one chunk of the raw commute data the way clean_commute() cleans it whole."""
+    from crosswalk import apply_crosswalk
+    from census_vintages import remap_vintage
+
+    commute_data = apply_crosswalk(commute_data, crosswalk)
+    commute_data["DGUID"] = remap_vintage(commute_data["DGUID"], vintage)
+    return commute_data[commute_columns].rename(columns=commute_names)
+
+
+@copy_on_write
+def clean_commute(
+    transit_ids=None,
+    clean_transit_data=clean_transit_path,
+    raw_commute_data=raw_commute_path,
+    memory_budget=None,
+):
+    """
+    Cleans the raw commute data, checking its IDs against the clean transit data, and saves it (02.3).
+
+    Args:
+        transit_ids: (Optional) IdIndex of the clean transit data's CMA_ID and CMA
+                     columns, as returned by read_transit_ids(). Built from
+                     `clean_transit_data` if None, so a caller running several
+                     stages can share one copy.
+        clean_transit_data: The clean transit dataset directory, or the data in memory.
+        raw_commute_data: The raw commute dataset directory, or the data in memory.
+        memory_budget: (Optional) Peak memory in bytes to stay under; the data is
+                       cleaned in chunks if it would not fit whole (see
+                       memory_budget.py). PIPELINE_MEMORY_BUDGET if None.
+
+    Returns:
+        The clean commute data, or None if it was cleaned in chunks.
+    """
+    from utility_functions import check_id_consistency
+    from datasets import read_partitioned, read_batches, write_partitioned, read_transit_ids
+    from crosswalk import load_crosswalk, apply_crosswalk
+    from census_vintages import dguid_vintages, remap_vintage
+    from memory_budget import fits_budget
+    from tracing import span
+
+    # Read in the raw data, decoding only the columns this stage uses. The raw dataset
+    # is partitioned by census year (REF_DATE), so it can hold several census tables.
+    # Over the memory budget, only the ID columns are read whole, for the consistency checks
+    in_memory = fits_budget(raw_commute_data, commute_columns, budget=memory_budget)
+    commute_data = read_partitioned(
+        raw_commute_data, columns=commute_columns if in_memory else ["DGUID", "GEO"])
+
+    # Only the ID index of the transit data is needed for the consistency checks,
+    # and it is built once for both of them
+    if transit_ids is None:
+        transit_ids = read_transit_ids(clean_transit_data)
+
+    print(check_id_consistency(
+        df1=transit_ids,
+        df2=commute_data,
+        id_col2="DGUID",
+        name_col2="GEO",
+        label1="Transit Data",
+        label2="Commute Data"))
+
+    # There are inconsistencies with Ottawa-Gatineau, Ontario/Quebec (DGUID ‘2021S0503505’) in the commute data. In the transit data, Ottawa-Gatineau is split into two parts: Ontario part (DGUID ‘2021S050535505’) and Quebec part(DGUID ‘2021S050524505’). To resolve this, the geography crosswalk splits the Ottawa-Gatineau data in the commute dataset into two separate entries, one for each part, copying the average commute durations to both.
+    crosswalk = load_crosswalk("commute_times")
+    with span("merge", "apply crosswalk", rows_in=len(commute_data)) as merge_span:
+        commute_data = apply_crosswalk(commute_data, crosswalk)
+        merge_span.set(rows_out=len(commute_data))
+
+    # Each census table uses the DGUIDs of its own vintage (e.g. 2016S0503535 for
+    # Toronto in 2016); they are rewritten to the transit data's vintage, so one
+    # geography has one ID across census years. Geographies whose boundaries changed
+    # between vintages are remapped by the crosswalk above.
+    transit_vintage = dguid_vintages(transit_ids.ids.index)[-1]
+    commute_data["DGUID"] = remap_vintage(commute_data["DGUID"], transit_vintage)
+
+    # Check ID consistency again, should show no inconsistencies now; commute data
+    # also covers census agglomerations that the transit data leaves out
+    id_check = check_id_consistency(
+        df1=transit_ids,
+        df2=commute_data,
+        id_col2="DGUID",
+        name_col2="GEO",
+        label1="Transit Data",
+        label2="Commute Data")
+    print(id_check)
+    if not id_check.only_in_1.empty:
+        raise ValueError("Some transit CMAs have no commute data")
+
+    if not in_memory:
+        batches = read_batches(raw_commute_data, columns=commute_columns)
+        write_partitioned(
+            (clean_commute_chunk(batch, crosswalk, transit_vintage) for batch in batches),
+            clean_commute_path)
+        return None
+
+    clean_commute_data = commute_data[commute_columns].rename(columns=commute_names)
+    write_partitioned(clean_commute_data, clean_commute_path)
+    return clean_commute_data
+
+
+def save_analysis_data(analysis_data):
+    """Saves the analysis data as CSV and Parquet."""
+    from tracing import path_bytes, span
+
+    with span("write", "write analysis_data", rows_in=len(analysis_data)) as write_span:
+        analysis_data.to_csv(analysis_csv_path, index=False)
+        analysis_data.to_parquet(analysis_parquet_path)
+        if write_span.enabled:
+            write_span.set(bytes_written=path_bytes([analysis_csv_path, analysis_parquet_path]))
+
+
+def analysis_plan(
+    clean_transit_data=clean_transit_path,
+    clean_labour_data=clean_labour_path,
+    clean_commute_data=clean_commute_path,
+    interpolate_census=False,
+):
+    """
+    Records the analysis data's filter-pivot-merge-derive chain as a lazy query plan.
+
+    Nothing is read until the plan is collected. Its optimize() step pushes the
+    filters and the final column selection down to the three scans, sorts the
+    transit means before the joins rather than after, and fuses each pivot into the
+    join that uses it. The CMA names come from the transit scan itself, as a
+    grouping key (each CMA_ID has one name), instead of a separate join.
+
+    Args:
+        clean_transit_data: The clean transit dataset directory, or the data in memory.
+        clean_labour_data: The clean labour dataset directory, or the data in memory.
+        clean_commute_data: The clean commute dataset directory, or the data in memory.
+        interpolate_census: As for build_analysis_data().
+
+    Returns:
+        A query_plan.Plan whose collect() gives the analysis data as an Arrow table.
+    """
+    import pyarrow as pa
+    from query_plan import scan
+    from analysis_store import METRIC_COLUMNS, ANALYSIS_COLUMNS
+
+    labour = (
+        scan(clean_labour_data)
+        .filter(labour_filters)
+        .derive(Year=("cast", "Year", pa.int64()))
+        .pivot(
+            ["CMA_ID", "Year"],
+            "Labour_Metric",
+            "Labour_Value",
+            {metric: METRIC_COLUMNS[metric] for metric in labour_metrics},
+        )
+    )
+    commute = (
+        scan(clean_commute_data)
+        .filter([("Commute_Mode", "in", commute_metrics)])
+        .pivot(
+            ["CMA_ID", "Census_Year"],
+            "Commute_Mode",
+            "Commute_Value",
+            {mode: METRIC_COLUMNS[mode] for mode in commute_metrics},
+        )
+    )
+    return (
+        scan(clean_transit_data)
+        .filter([
+            ("Year", "in", transit_years),
+            ("Transit_Unit_of_Measure", "==", "Percent"),
+            ("Transit_Distance_Category", "==", transit_category),
+            ("Transit_Profile_Characteristic", "==", transit_characteristic),
+        ])
+        .aggregate(["CMA_ID", "CMA", "Year"], "Transit_Value", "Transit_Access_Prop")
+        .select({"CMA_ID": "CMA_ID", "CMA_Name": "CMA", "Year": "Year",
+                 "Transit_Access_Prop": "Transit_Access_Prop"})
+        .asof_join(commute, by="CMA_ID", on="Year", right_on="Census_Year",
+                   interpolate=interpolate_census)
+        .join(labour, on=["CMA_ID", "Year"])
+        # Commute Ratio (Transit time relative to Car time), and Log Population
+        # (Logarithm of Population to reduce skewness)
+        .derive(
+            Commute_Ratio=("divide", "Avg_Commute_Transit", "Avg_Commute_Car"),
+            Log_Population=("log10", "Population"),
+        )
+        .sort(["CMA_ID", "Year"])
+        .select(ANALYSIS_COLUMNS)
+    )
+
+
+def build_analysis_data(
+    clean_transit_data=clean_transit_path,
+    clean_labour_data=clean_labour_path,
+    clean_commute_data=clean_commute_path,
+    incremental=False,
+    months=None,
+    interpolate_census=False,
+    lazy=False,
+    metrics=labour_metrics,
+    modes=commute_metrics,
+):
+    """
+    Merges the clean transit, labour and commute data into the analysis data and saves it (03).
+
+    Each clean table is read once and averaged in one grouped pass over every variant
+    (distance category x demographic group for transit, each of `metrics` for labour
+    and each of `modes` for commute). The results are stacked into one long store,
+    keyed by variant, from which the wide analysis data of any variant is sliced
+    without recomputation.
+
+    Args:
+        clean_transit_data: The clean transit dataset directory, or the data in memory.
+        clean_labour_data: The clean labour dataset directory, or the data in memory.
+        clean_commute_data: The clean commute dataset directory, or the data in memory.
+        incremental: If True, fold new or revised labour months into the persisted
+                     running sums and update only the affected analysis rows,
+                     instead of rebuilding everything.
+        months: (Optional) 'YYYY-MM' months to fold in with `incremental`; revised
+                months must be listed. Defaults to the months not aggregated yet.
+        interpolate_census: If True, commute times of years between two census
+                            years are interpolated linearly between them, instead
+                            of taking the earlier census year's.
+        lazy: If True, build only the analysis data, with the lazy query plan of
+              analysis_plan() run straight on the clean datasets; the analysis
+              store and the labour running sums are left as they are.
+        metrics: Labour metrics averaged into the store (keys of `labour_units`);
+                 an incremental refresh must use those of the last full build.
+        modes: Commute modes averaged into the store.
+
+    Returns:
+        The analysis data: one row per CMA and year.
+    """
+    import pandas as pd
+    from datasets import read_partitioned
+    from tracing import span
+    from analysis_store import (
+        METRIC_COLUMNS,
+        transit_variants,
+        labour_variants,
+        commute_variants,
+        combine_store,
+        write_analysis_store,
+        slice_analysis_data,
+        update_labour_values,
+    )
+    from labour_aggregates import (
+        rebuild_labour_aggregates,
+        refresh_labour_aggregates,
+        update_analysis_rows,
+    )
+
+    # StatCan publishes one labour month at a time; each release only changes the annual
+    # averages of its year, so those are updated from the running sums of the monthly
+    # values and everything else in the analysis data is left as it is
+    if incremental:
+        changed = refresh_labour_aggregates(
+            clean_labour_data, labour_row_filters(metrics), months=months
+        )
+        with span("read", "read analysis_data") as read_span:
+            analysis_data = pd.read_parquet(analysis_parquet_path)
+            read_span.set(rows_out=len(analysis_data))
+        updated_rows = update_analysis_rows(analysis_data, changed, METRIC_COLUMNS)
+        update_labour_values(changed)
+        print(f"Updated {len(changed)} labour aggregates and {updated_rows} analysis rows")
+
+        save_analysis_data(analysis_data)
+        return analysis_data
+
+    # The plan streams each clean dataset once through its filters and grouped means,
+    # and joins the (small) results, so no full intermediate table is built
+    if lazy:
+        plan = analysis_plan(
+            clean_transit_data, clean_labour_data, clean_commute_data, interpolate_census)
+        analysis_data = plan.collect().to_pandas()
+        analysis_data = analysis_data.astype({"CMA_ID": "category", "CMA_Name": "category"})
+        save_analysis_data(analysis_data)
+        return analysis_data
+
+    # Each dataset is read with only the columns and rows this stage uses, so
+    # partitions and row groups that fail the filters are never decoded. Dimensions
+    # load as categoricals, so the filters and groupings compare integer codes
+    # rather than strings; `observed=True` keeps them to the categories present
+    transit_rows, cma_names = transit_variants(clean_transit_data, transit_years)
+
+    labour_filter = read_partitioned(
+        clean_labour_data,
+        columns=["CMA_ID", "Labour_Metric", "Year", "Time_Period", "Labour_Value"],
+        filters=labour_row_filters(metrics),
+    )
+
+    # Save the running sums of the monthly values, so later releases can be folded in
+    # incrementally
+    rebuild_labour_aggregates(labour_filter)
+
+    # The labour data contains monthly entries; for our analysis, we will compute annual averages.
+    labour_rows = labour_variants(labour_filter)
+
+    # Commute times come from the census, so each transit year takes the latest
+    # census year at or before it (see census_vintages.align_vintages())
+    commute_rows = commute_variants(clean_commute_data, modes)
+
+    analysis_store = combine_store(transit_rows, labour_rows, commute_rows, cma_names)
+    write_analysis_store(analysis_store)
+
+    # Slice the wide analysis data (one row per CMA and year) for the chosen variant
+    analysis_data = slice_analysis_data(
+        analysis_store, transit_category, transit_characteristic, interpolate=interpolate_census
+    )
+    save_analysis_data(analysis_data)
+    return analysis_data
+
+
+def build_transit_cube(clean_transit_data=clean_transit_path, cube_path=transit_cube_path):
+    """
+    Materializes the clean transit data as a cube with roll-ups across CMAs and saves it (03.1).
+
+    Dashboards look values up in the cube (see transit_cube.py) instead of filtering
+    and pivoting the clean transit data for every question.
+
+    Args:
+        clean_transit_data: The clean transit dataset directory, or the data in memory.
+        cube_path: File the cube is saved to.
+
+    Returns:
+        The TransitCube.
+    """
+    from datasets import read_partitioned
+    from transit_cube import CUBE_DIMENSIONS, build_cube, save_cube
+    from tracing import path_bytes, span
+
+    transit_data = read_partitioned(
+        clean_transit_data, columns=[*CUBE_DIMENSIONS, "CMA", "Transit_Value"]
+    )
+    with span("pivot", "build transit cube", rows_in=len(transit_data)) as pivot_span:
+        cube = build_cube(transit_data)
+        pivot_span.set(rows_out=cube.values.size)
+    with span("write", "write transit_cube") as write_span:
+        save_cube(cube, cube_path)
+        if write_span.enabled:
+            write_span.set(bytes_written=path_bytes(cube_path))
+    print(f"Wrote a {' x '.join(map(str, cube.values.shape))} cube to {cube_path}")
+    return cube
+
+
+def test_data(artifacts=None):
+    """
+    Validates the raw, cleaned and analysis datasets against their declared rules (04).
+
+    Each artifact's schema and rules (types, key uniqueness, value ranges, and years
+    and CMAs checked against the upstream tables) are declared in
+    validation.ARTIFACTS; all the rules of a table are checked in one pass over it.
+
+    Args:
+        artifacts: (Optional) Artifact paths to check alone, e.g. after the stage that
+                   writes them. Checks every artifact if None.
+
+    Raises:
+        RuntimeError: If any rule fails.
+    """
+    from validation import validate_artifacts
+
+    if not validate_artifacts(artifacts):
+        print("One or more tests failed.")
+        raise RuntimeError("One or more tests failed")
+    print("PASS: All tests passed.")
+
+
+def fit_participation_model(analysis_data=analysis_parquet_path, model_path=participation_model_path):
+    """
+    Fits the participation rate model and saves it (06).
+
+    A model already fitted to the same data, formula and options is loaded from the
+    model registry instead of being refitted (see model_registry.py).
+
+    Args:
+        analysis_data: The analysis data Parquet file, or the data in memory.
+        model_path: File the fitted model is saved to.
+
+    Returns:
+        The fitted MixedModelResult.
+    """
+    import pandas as pd
+    from mixed_model import save_model
+    from model_registry import REGISTRY_BYTES, fit_cached
+    from tracing import span
+
+    if isinstance(analysis_data, (str, os.PathLike)):
+        with span("read", "read analysis_data") as read_span:
+            analysis_data = pd.read_parquet(analysis_data)
+            read_span.set(rows_out=len(analysis_data))
+
+    # Linear Mixed Model Regression for Participation Rates, the same model as
+    # 06-model_data.R fits with lmer:
+    # Participation_Rate ~ Transit_Access_Prop + Commute_Ratio + Log_Population +
+    #   as.factor(Year) + (1 | CMA_ID)
+    with span("fit", "fit participation model", rows_in=len(analysis_data)) as fit_span:
+        registered = fit_cached(
+            analysis_data,
+            response="Participation_Rate",
+            terms=["Transit_Access_Prop", "Commute_Ratio", "Log_Population"],
+            factors=["Year"],
+            group_col="CMA_ID",
+        )
+        fit_span.set(cached=registered.cached)
+    participation_model = registered.model
+
+    if registered.cached:
+        print(f"Loaded from the model registry as {registered.key[:12]}")
+    elif REGISTRY_BYTES > 0:
+        print(f"Saved to the model registry as {registered.key[:12]}")
+    print(participation_model)
+    print(f"\nICC: {participation_model.icc:.3f}")
+
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    save_model(participation_model, model_path)
+    return participation_model
@@ -0,0 +1,358 @@
+#### Preamble ####
+# Purpose: Downloads the full StatCan tables as CSV zips, concurrently and resumably,
+# and streams each zip's CSV straight into the partitioned Parquet datasets
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/statcan_download.py [TABLE ...] [--base-url URL] [--jobs N] [--force]
+
+#### Workspace setup ####
+import argparse
+import contextlib
+import csv
+import http.client
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from tracing import span
+
+#### Define download settings ####
+
+# StatCan's full-table downloads: one zip per table, holding `<pid>.csv` and
+# `<pid>_MetaData.csv`. The full tables cover every geography, period and
+# dimension of the table, not only the selections linked in 01-download_data.py.
+BASE_URL = "https://www150.statcan.gc.ca/n1/tbl/csv/"
+
+# Table name: StatCan product ID and the raw dataset its CSV is saved to
+TABLES = {
+    "public_transport_access": {
+        "pid": "23100313",
+        "dataset": "data/01-raw_data/public_transport_access",
+    },
+    "labour_rates": {
+        "pid": "14100459",
+        "dataset": "data/01-raw_data/labour_rates",
+    },
+    "commute_times": {
+        "pid": "98100504",
+        "dataset": "data/01-raw_data/commute_times",
+    },
+}
+
+# Downloaded zips, each with a JSON file of the ETag and Last-Modified it was served
+# with; a download in progress is kept as `<zip>.part` so it can be resumed
+DOWNLOAD_DIR = "data/01-raw_data/downloads"
+
+# Bytes read from the network and written to disk at a time
+CHUNK_SIZE = 1024 * 1024
+
+# Seconds without data before a connection is given up on
+TIMEOUT = 60
+
+MAX_REDIRECTS = 5
+RETRIES = 3
+
+#### Define download functions ####
+
+
+def table_url(pid, base_url=BASE_URL):
+    """Returns the URL of a table's full CSV zip."""
+    return urljoin(base_url, f"{pid}-eng.zip")
+
+
+class ConnectionPool:
+    """
+    Keeps idle HTTP(S) connections per host, so concurrent and repeated requests
+    reuse them instead of opening (and TLS-negotiating) a new one each time.
+    """
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def connect(self, scheme, netloc):
+        connection_class = (
+            http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        )
+        return connection_class(netloc, timeout=self.timeout)
+
+    def acquire(self, key):
+        """Returns an idle connection to a host and whether it was reused."""
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self.connect(*key), False
+
+    def release(self, key, connection):
+        with self.lock:
+            self.idle.setdefault(key, []).append(connection)
+
+    @contextlib.contextmanager
+    def request(self, method, url, headers=None):
+        """
+        Sends a request and yields its response.
+
+        The connection goes back to the pool if the response was read to the end and
+        the server keeps it open; a reused connection the server had already closed
+        is replaced once.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        connection, reused = self.acquire(key)
+        try:
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if not reused:
+                    raise
+                connection.close()
+                connection = self.connect(*key)
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+            yield response
+        except BaseException:
+            connection.close()
+            raise
+        if response.isclosed() and not response.will_close:
+            self.release(key, connection)
+        else:
+            connection.close()
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+def read_json(path):
+    """Reads a JSON file, or returns an empty dict if it is missing."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(data, path):
+    """Writes a JSON file atomically, sorted and indented."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def validators(response):
+    """Returns the ETag and Last-Modified headers of a response."""
+    return {
+        "etag": response.getheader("ETag"),
+        "last_modified": response.getheader("Last-Modified"),
+    }
+
+
+def fetch(pool, url, zip_path, force=False):
+    """
+    Downloads a file unless the server reports it unchanged, resuming a partial download.
+
+    The request is conditional on the ETag and Last-Modified the saved copy was served
+    with, so an unchanged table costs one empty 304 response. A partial download
+    (`<zip>.part`) is resumed with a Range request that only applies if the file is
+    still the version it started from (If-Range); otherwise it starts over.
+
+    Args:
+        pool: A ConnectionPool.
+        url: URL of the file.
+        zip_path: Where the file is saved.
+        force: If True, download it even if unchanged.
+
+    Returns:
+        'unchanged', 'downloaded' or 'resumed'.
+    """
+    part_path = zip_path + ".part"
+    saved = read_json(zip_path + ".json")
+    partial = read_json(part_path + ".json")
+
+    headers = {}
+    if os.path.exists(zip_path) and not force:
+        if saved.get("etag"):
+            headers["If-None-Match"] = saved["etag"]
+        if saved.get("last_modified"):
+            headers["If-Modified-Since"] = saved["last_modified"]
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = partial.get("etag") or partial.get("last_modified")
+    if offset and validator:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+
+    for _ in range(MAX_REDIRECTS + 1):
+        with pool.request("GET", url, headers) as response:
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if response.status == 304:
+                response.read()
+                return "unchanged"
+            if response.status == 416:
+                # The partial file is not a prefix of the current file; start over
+                response.read()
+                os.remove(part_path)
+                headers.pop("Range", None)
+                headers.pop("If-Range", None)
+                continue
+            if response.status not in (200, 206):
+                response.read()
+                raise RuntimeError(f"GET {url} failed: {response.status} {response.reason}")
+
+            resumed = response.status == 206
+            if resumed:
+                start = int(response.getheader("Content-Range").split()[1].split("-")[0])
+                if start != offset:
+                    raise RuntimeError(f"GET {url} resumed at byte {start}, not {offset}")
+            else:
+                offset = 0
+                write_json(validators(response), part_path + ".json")
+
+            with span("download", f"download {os.path.basename(zip_path)}") as download_span:
+                with open(part_path, "ab" if resumed else "wb") as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                        f.write(chunk)
+                    size = f.tell()
+                download_span.set(bytes_read=size - offset, resumed=resumed)
+
+            # A dropped connection can end the body early without an error; the
+            # partial file is kept and the retry resumes from its end
+            expected = response.getheader("Content-Length")
+            if expected is not None and size - offset < int(expected):
+                raise http.client.IncompleteRead(b"", int(expected) - (size - offset))
+
+            os.replace(part_path, zip_path)
+            os.remove(part_path + ".json")
+            write_json(dict(validators(response), url=url, bytes=size), zip_path + ".json")
+            return "resumed" if resumed else "downloaded"
+    raise RuntimeError(f"GET {url} redirected too many times")
+
+
+def fetch_with_retries(pool, url, zip_path, force=False, retries=RETRIES):
+    """Runs fetch(), resuming from where it stopped after a dropped connection."""
+    for attempt in range(retries + 1):
+        try:
+            return fetch(pool, url, zip_path, force=force)
+        except (OSError, http.client.HTTPException):
+            if attempt == retries:
+                raise
+            time.sleep(2**attempt)
+
+
+def zip_csv_header(archive, member):
+    """Returns the column names of a CSV inside a zip, reading only its first line."""
+    with archive.open(member) as f:
+        return next(csv.reader(io.TextIOWrapper(f, encoding="utf-8-sig", newline="")))
+
+
+def convert_zip(zip_path, pid, dataset_path, block_size=None):
+    """
+    Streams a table's CSV out of its zip into a partitioned Parquet dataset.
+
+    The CSV is decompressed batch by batch as the Parquet writer reads it, so it is
+    never written to disk and memory stays bounded by the block size.
+
+    Returns:
+        The number of rows written.
+    """
+    from ingest import DEFAULT_BLOCK_SIZE, stream_csv_to_parquet
+
+    member = f"{pid}.csv"
+    with zipfile.ZipFile(zip_path) as archive:
+        columns = zip_csv_header(archive, member)
+        with archive.open(member) as f:
+            return stream_csv_to_parquet(
+                f, dataset_path, block_size=block_size or DEFAULT_BLOCK_SIZE, columns=columns
+            )
+
+
+def download_table(pool, name, base_url=BASE_URL, force=False, block_size=None):
+    """
+    Downloads one table and converts it to Parquet if it changed (or was never converted).
+
+    Returns:
+        The download status and the rows written (None if the dataset was up to date).
+    """
+    table = TABLES[name]
+    zip_path = os.path.join(DOWNLOAD_DIR, f"{table['pid']}-eng.zip")
+    status = fetch_with_retries(pool, table_url(table["pid"], base_url), zip_path, force=force)
+
+    rows = None
+    if status != "unchanged" or force or not os.path.exists(table["dataset"]):
+        rows = convert_zip(zip_path, table["pid"], table["dataset"], block_size=block_size)
+    return status, rows
+
+
+def download_tables(names=None, base_url=BASE_URL, jobs=3, force=False, block_size=None):
+    """
+    Downloads and converts several tables concurrently over pooled connections.
+
+    Args:
+        names: (Optional) Table names in TABLES; all tables if None.
+        base_url: URL the `<pid>-eng.zip` files are under, e.g. a local server
+                  (see table_server.py) to run without network access.
+        jobs: Tables downloaded at the same time.
+        force: If True, download and convert tables even if unchanged.
+        block_size: (Optional) Bytes of CSV parsed per batch.
+
+    Returns:
+        A dict of table name to its download status and rows written.
+    """
+    names = list(TABLES) if names is None else names
+    unknown = set(names) - set(TABLES)
+    if unknown:
+        raise ValueError(f"Unknown table(s): {', '.join(sorted(unknown))}")
+
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    pool = ConnectionPool()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(names)))) as executor:
+            futures = {
+                name: executor.submit(download_table, pool, name, base_url, force, block_size)
+                for name in names
+            }
+            results = {name: future.result() for name, future in futures.items()}
+    finally:
+        pool.close()
+
+    for name, (status, rows) in results.items():
+        converted = f", wrote {rows} rows to {TABLES[name]['dataset']}" if rows is not None else ""
+        print(f"{name}: {status}{converted}")
+    return results
+
+
+#### Download tables ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Download the full StatCan tables and save them as Parquet"
+    )
+    parser.add_argument(
+        "tables", nargs="*", metavar="TABLE", help=f"Tables to download (default: all of {', '.join(TABLES)})"
+    )
+    parser.add_argument("--base-url", default=BASE_URL, help="URL the table zips are under")
+    parser.add_argument("--jobs", type=int, default=3, help="Tables downloaded at the same time")
+    parser.add_argument(
+        "--force", action="store_true", help="Download and convert even if unchanged"
+    )
+    args = parser.parse_args()
+
+    download_tables(args.tables or None, base_url=args.base_url, jobs=args.jobs, force=args.force)
@@ -0,0 +1,388 @@
+#### Preamble ####
+# Purpose: Writes synthetic Statistics Canada CSV tables with the exact column layout of
+# the raw transit, labour and commute tables, at any number of geographies, years,
+# months and demographic groups
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/synthetic_data.py <root> [--geographies N] [--years N]
+# [--months N] [--demographics N] [--seed N]
+
+#### Workspace setup ####
+import argparse
+import os
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pv
+
+#### Define table layouts ####
+
+# Column layouts of the CSVs downloaded from StatCan (see 01-download_data.py)
+TRANSIT_COLUMNS = [
+    "REF_DATE",
+    "GEO",
+    "DGUID",
+    "Distance-capacity public transit service area",
+    "Location",
+    "Gender",
+    "Demographic and socio-economic",
+    "Sustainable Development Goals (SDGs) 11.2.1 indicator",
+    "UOM",
+    "UOM_ID",
+    "SCALAR_FACTOR",
+    "SCALAR_ID",
+    "VECTOR",
+    "COORDINATE",
+    "VALUE",
+    "STATUS",
+    "SYMBOL",
+    "TERMINATED",
+    "DECIMALS",
+]
+LABOUR_COLUMNS = [
+    "REF_DATE",
+    "GEO",
+    "DGUID",
+    "Labour force characteristics",
+    "Statistics",
+    "Data type",
+    "UOM",
+    "UOM_ID",
+    "SCALAR_FACTOR",
+    "SCALAR_ID",
+    "VECTOR",
+    "COORDINATE",
+    "VALUE",
+    "STATUS",
+    "SYMBOL",
+    "TERMINATED",
+    "DECIMALS",
+]
+COMMUTE_COLUMNS = [
+    "REF_DATE",
+    "GEO",
+    "DGUID",
+    "Time arriving at work (16)",
+    "Main mode of commuting (21)",
+    "Commuting duration (7)",
+    "UOM",
+    "UOM_ID",
+    "SCALAR_FACTOR",
+    "SCALAR_ID",
+    "VECTOR",
+    "COORDINATE",
+    "VALUE",
+    "STATUS",
+    "SYMBOL",
+    "TERMINATED",
+    "DECIMALS",
+]
+
+DISTANCE_CATEGORIES = [
+    "400 metres from all public transit stops",
+    "400 metres from low-capacity public transit stops only",
+    "500 metres from all public transit stops",
+    "500 metres from low-capacity public transit stops only",
+]
+
+# The published demographic groups, starting with the one the analysis uses;
+# larger scales add numbered groups after them
+DEMOGRAPHIC_GROUPS = [
+    "15 to 64 years",
+    "Total - Age groups of the population - 100% data",
+    "0 to 14 years",
+    "65 years and over",
+    "Total - Population aged 15 years and over by labour force status - 25% sample data",
+    "In the labour force",
+    "Employed",
+    "Unemployed",
+    "Not in the labour force",
+]
+
+# (Indicator, UOM, UOM_ID) of the transit table
+TRANSIT_INDICATORS = [
+    ("Count of population within service area", "Persons", "249"),
+    ("Proportion of population within service area", "Percent", "239"),
+]
+
+# (Characteristic, UOM, UOM_ID, lowest value, highest value) of the labour table
+LABOUR_METRICS = [
+    ("Population", "Persons in thousands", "428", 50.0, 6000.0),
+    ("Employment rate", "Percent", "239", 40.0, 74.0),
+    ("Participation rate", "Percent", "239", 42.0, 77.0),
+    ("Unemployment rate", "Percent", "239", 1.0, 11.0),
+]
+LABOUR_DATA_TYPES = ["Seasonally adjusted", "Unadjusted"]
+
+COMMUTE_MODES = [
+    "Total - Main mode of commuting",
+    "Car, truck or van",
+    "Sustainable transportation",
+    "Public transit",
+]
+
+# Latest reference year; the analysis (03-analysis_data.py) keeps 2023 and 2024
+LAST_YEAR = 2024
+
+# Rows written to the CSV per batch, so memory stays bounded at any scale
+BATCH_ROWS = 1024 * 1024
+
+#### Define generator functions ####
+
+
+@dataclass
+class SyntheticScale:
+    """The size of a synthetic dataset along each dimension the tables vary by."""
+
+    geographies: int = 41
+    years: int = 2
+    months: int = 12
+    demographics: int = len(DEMOGRAPHIC_GROUPS)
+
+    def __post_init__(self):
+        if min(self.geographies, self.years, self.months, self.demographics) < 1:
+            raise ValueError("Every dimension of a synthetic dataset needs at least one value")
+        if self.months > 12:
+            raise ValueError("A year has at most 12 months")
+
+
+def geography_names(count):
+    """
+    Returns synthetic CMA DGUIDs and names.
+
+    The DGUIDs use a geographic schema no real table does, so none of them matches
+    an entry of the DGUID crosswalk and every table shares the same geographies.
+    """
+    dguids = [f"2021S0599{i:06d}" for i in range(count)]
+    names = [f"Synthetic CMA {i}" for i in range(count)]
+    return dguids, names
+
+
+def demographic_groups(count):
+    """Returns the published demographic groups, followed by numbered ones if more are asked for."""
+    extra = [f"Synthetic group {i}" for i in range(count - len(DEMOGRAPHIC_GROUPS))]
+    return (DEMOGRAPHIC_GROUPS + extra)[:count]
+
+
+def dimension(codes, values):
+    """Builds a dictionary-encoded string column from integer codes into `values`."""
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes, pa.int32()), pa.array(values, pa.string())
+    )
+
+
+def constant(value, num_rows):
+    """Builds a dictionary-encoded column repeating one string."""
+    return dimension(np.zeros(num_rows, dtype=np.int32), [value])
+
+
+def grid(*sizes):
+    """Returns the codes of every combination of the dimensions' values, last varying fastest."""
+    return [codes.ravel() for codes in np.indices(sizes, dtype=np.int32)]
+
+
+def write_statcan_csv(path, columns, batches):
+    """
+    Writes batches of columns as a StatCan CSV: UTF-8 with a byte-order mark, every
+    value quoted, and the trailing blank lines of the downloads.
+
+    Returns:
+        The number of data rows written.
+    """
+    num_rows = 0
+    options = pv.WriteOptions(include_header=False, quoting_style="all_valid")
+    with open(path, "wb") as f:
+        f.write(b"\xef\xbb\xbf" + ",".join(f'"{col}"' for col in columns).encode() + b"\n")
+        for batch in batches:
+            table = pa.table({col: batch[col] for col in columns})
+            pv.write_csv(table, f, write_options=options)
+            num_rows += table.num_rows
+        f.write(b"\n\n")
+    return num_rows
+
+
+def geography_chunks(num_geographies, rows_per_geography):
+    """Splits the geographies into runs of about BATCH_ROWS rows each."""
+    step = max(1, BATCH_ROWS // rows_per_geography)
+    for start in range(0, num_geographies, step):
+        yield start, min(num_geographies, start + step)
+
+
+def transit_batches(scale, rng):
+    """Yields the rows of the transit table, one batch of geographies at a time."""
+    dguids, names = geography_names(scale.geographies)
+    names = [f"{name}, Census metropolitan area (CMA)" for name in names]
+    groups = demographic_groups(scale.demographics)
+    years = [str(year) for year in range(LAST_YEAR - scale.years + 1, LAST_YEAR + 1)]
+    shape = (len(DISTANCE_CATEGORIES), len(groups), len(TRANSIT_INDICATORS), len(years))
+    rows_per_geography = int(np.prod(shape))
+
+    for start, stop in geography_chunks(scale.geographies, rows_per_geography):
+        geo, distance, group, indicator, year = grid(stop - start, *shape)
+        geo += start
+        num_rows = len(geo)
+
+        # The proportion within the service area, and the persons it covers
+        population = rng.uniform(1e3, 5e6, scale.geographies)
+        proportion = np.round(rng.uniform(20.0, 95.0, num_rows), 1)
+        count = np.round(population[geo] * proportion / 100)
+        is_percent = indicator == 1
+
+        series = ((geo * shape[0] + distance) * shape[1] + group) * shape[2] + indicator
+        yield {
+            "REF_DATE": dimension(year, years),
+            "GEO": dimension(geo, names),
+            "DGUID": dimension(geo, dguids),
+            "Distance-capacity public transit service area": dimension(distance, DISTANCE_CATEGORIES),
+            "Location": constant("Total, location", num_rows),
+            "Gender": constant("Total, gender", num_rows),
+            "Demographic and socio-economic": dimension(group, groups),
+            "Sustainable Development Goals (SDGs) 11.2.1 indicator": dimension(
+                indicator, [name for name, _, _ in TRANSIT_INDICATORS]
+            ),
+            "UOM": dimension(indicator, [uom for _, uom, _ in TRANSIT_INDICATORS]),
+            "UOM_ID": dimension(indicator, [uom_id for _, _, uom_id in TRANSIT_INDICATORS]),
+            "SCALAR_FACTOR": constant("units", num_rows),
+            "SCALAR_ID": constant("0", num_rows),
+            "VECTOR": pa.array(np.char.add("v", (1631837298 + series).astype(str))),
+            "COORDINATE": pa.array(np.char.add("14.", series.astype(str))),
+            "VALUE": pa.array(np.where(is_percent, proportion, count)),
+            "STATUS": constant("", num_rows),
+            "SYMBOL": constant("", num_rows),
+            "TERMINATED": constant("", num_rows),
+            "DECIMALS": dimension(is_percent.astype(np.int32), ["0", "1"]),
+        }
+
+
+def labour_batches(scale, rng):
+    """Yields the rows of the labour table, one batch of geographies at a time."""
+    dguids, names = geography_names(scale.geographies)
+    names = [f"{name}, Synthetic Province" for name in names]
+    periods = [
+        f"{year}-{month:02d}"
+        for year in range(LAST_YEAR - scale.years + 1, LAST_YEAR + 1)
+        for month in range(1, scale.months + 1)
+    ]
+    shape = (len(LABOUR_METRICS), len(LABOUR_DATA_TYPES), len(periods))
+    rows_per_geography = int(np.prod(shape))
+    low = np.array([metric[3] for metric in LABOUR_METRICS])
+    high = np.array([metric[4] for metric in LABOUR_METRICS])
+
+    for start, stop in geography_chunks(scale.geographies, rows_per_geography):
+        geo, metric, data_type, period = grid(stop - start, *shape)
+        geo += start
+        num_rows = len(geo)
+
+        value = np.round(rng.uniform(low[metric], high[metric]), 1)
+        series = (geo * shape[0] + metric) * shape[1] + data_type
+        yield {
+            "REF_DATE": dimension(period, periods),
+            "GEO": dimension(geo, names),
+            "DGUID": dimension(geo, dguids),
+            "Labour force characteristics": dimension(metric, [m[0] for m in LABOUR_METRICS]),
+            "Statistics": constant("Estimate", num_rows),
+            "Data type": dimension(data_type, LABOUR_DATA_TYPES),
+            "UOM": dimension(metric, [m[1] for m in LABOUR_METRICS]),
+            "UOM_ID": dimension(metric, [m[2] for m in LABOUR_METRICS]),
+            "SCALAR_FACTOR": constant("units", num_rows),
+            "SCALAR_ID": constant("0", num_rows),
+            "VECTOR": pa.array(np.char.add("v", (1643278014 + series).astype(str))),
+            "COORDINATE": pa.array(np.char.add("3.", series.astype(str))),
+            "VALUE": pa.array(value),
+            "STATUS": constant("", num_rows),
+            "SYMBOL": constant("", num_rows),
+            "TERMINATED": constant("", num_rows),
+            "DECIMALS": constant("1", num_rows),
+        }
+
+
+def commute_batches(scale, rng):
+    """Yields the rows of the commute table (2021 census only), one batch of geographies at a time."""
+    dguids, names = geography_names(scale.geographies)
+    names = [f"{name} (CMA), Synthetic Province" for name in names]
+    rows_per_geography = len(COMMUTE_MODES)
+
+    for start, stop in geography_chunks(scale.geographies, rows_per_geography):
+        geo, mode = grid(stop - start, len(COMMUTE_MODES))
+        geo += start
+        num_rows = len(geo)
+
+        # Transit commutes take longer than car commutes, as in the published table
+        value = np.round(np.where(
+            mode == COMMUTE_MODES.index("Public transit"),
+            rng.uniform(24.0, 49.0, num_rows),
+            rng.uniform(13.0, 28.0, num_rows),
+        ), 1)
+        yield {
+            "REF_DATE": constant("2021", num_rows),
+            "GEO": dimension(geo, names),
+            "DGUID": dimension(geo, dguids),
+            "Time arriving at work (16)": constant("Total - Time arriving at work", num_rows),
+            "Main mode of commuting (21)": dimension(mode, COMMUTE_MODES),
+            "Commuting duration (7)": constant("Average commuting duration (in minutes)", num_rows),
+            "UOM": constant("", num_rows),
+            "UOM_ID": constant("0", num_rows),
+            "SCALAR_FACTOR": constant("units", num_rows),
+            "SCALAR_ID": constant("0", num_rows),
+            "VECTOR": constant("", num_rows),
+            "COORDINATE": pa.array(np.char.add("1.", (geo * rows_per_geography + mode).astype(str))),
+            "VALUE": pa.array(value),
+            "STATUS": constant("", num_rows),
+            "SYMBOL": constant("", num_rows),
+            "TERMINATED": constant("", num_rows),
+            "DECIMALS": constant("1", num_rows),
+        }
+
+
+def write_synthetic_data(root, scale=SyntheticScale(), seed=0):
+    """
+    Writes synthetic raw CSVs under `root`, laid out like the project's data directory.
+
+    Every stage of the pipeline can then run with `root` as its working directory
+    (the DGUID crosswalk is read from the project itself; see crosswalk.py).
+
+    Args:
+        root: Directory to write data/01-raw_data into.
+        scale: A SyntheticScale.
+        seed: Seed of the values, so the same scale and seed give identical files.
+
+    Returns:
+        A dict of CSV path (relative to `root`) to its number of data rows.
+    """
+    rng = np.random.default_rng(seed)
+    raw_dir = os.path.join(root, "data/01-raw_data")
+    os.makedirs(raw_dir, exist_ok=True)
+
+    tables = [
+        ("data/01-raw_data/public_transport_access.csv", TRANSIT_COLUMNS, transit_batches),
+        ("data/01-raw_data/labour_rates.csv", LABOUR_COLUMNS, labour_batches),
+        ("data/01-raw_data/commute_times.csv", COMMUTE_COLUMNS, commute_batches),
+    ]
+    return {
+        csv_path: write_statcan_csv(os.path.join(root, csv_path), columns, batches(scale, rng))
+        for csv_path, columns, batches in tables
+    }
+
+
+#### Write synthetic data ####
+
+if __name__ == "__main__":
+    defaults = SyntheticScale()
+    parser = argparse.ArgumentParser(description="Write synthetic StatCan-shaped raw CSVs")
+    parser.add_argument("root", help="Directory to write the data/ tree into")
+    parser.add_argument("--geographies", type=int, default=defaults.geographies)
+    parser.add_argument("--years", type=int, default=defaults.years)
+    parser.add_argument("--months", type=int, default=defaults.months)
+    parser.add_argument("--demographics", type=int, default=defaults.demographics)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scale = SyntheticScale(args.geographies, args.years, args.months, args.demographics)
+    row_counts = write_synthetic_data(args.root, scale, seed=args.seed)
+    print(f"Scale: {asdict(scale)}")
+    for csv_path, num_rows in row_counts.items():
+        print(f"Wrote {num_rows} rows to {os.path.join(args.root, csv_path)}")
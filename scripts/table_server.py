@@ -0,0 +1,197 @@
+#### Preamble ####
+# Purpose: Serves table zips over HTTP the way StatCan's full-table downloads do
+# (ETag, Last-Modified, conditional and Range requests), so the downloader can be
+# run and checked offline
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/table_server.py DIR [--from-csvs data/01-raw_data] [--port 8000]
+# [--drop-after BYTES]
+#        python scripts/statcan_download.py --base-url http://127.0.0.1:8000/
+
+#### Workspace setup ####
+import argparse
+import email.utils
+import functools
+import http.server
+import os
+import re
+import threading
+import zipfile
+
+from statcan_download import TABLES
+
+#### Define server settings ####
+
+# Bytes sent per write
+CHUNK_SIZE = 64 * 1024
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)$")
+
+#### Define server functions ####
+
+
+def zip_tables(csv_dir, zip_dir):
+    """
+    Packs table CSVs (e.g. the ones in data/01-raw_data, or written by synthetic_data.py)
+    into zips laid out like StatCan's full-table downloads: `<pid>-eng.zip` holding
+    `<pid>.csv` and `<pid>_MetaData.csv`.
+
+    Returns:
+        The paths of the zips written.
+    """
+    os.makedirs(zip_dir, exist_ok=True)
+    zip_paths = []
+    for name, table in TABLES.items():
+        csv_path = os.path.join(csv_dir, f"{name}.csv")
+        if not os.path.exists(csv_path):
+            continue
+        zip_path = os.path.join(zip_dir, f"{table['pid']}-eng.zip")
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(csv_path, f"{table['pid']}.csv")
+            archive.writestr(f"{table['pid']}_MetaData.csv", f'"Cube Title"\n"{name}"\n')
+        zip_paths.append(zip_path)
+    return zip_paths
+
+
+class TableRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves files with an ETag and Last-Modified, answering conditional requests with
+    304 and Range requests (honouring If-Range) with 206, over keep-alive connections.
+
+    With `drop_after`, the first full response for each file is cut off after that
+    many bytes, as a dropped connection would, to exercise resumed downloads.
+    """
+
+    protocol_version = "HTTP/1.1"
+    drop_after = None
+    dropped = set()
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def serve(self, send_body):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+        if_none_match = self.headers.get("If-None-Match")
+        if_modified_since = self.headers.get("If-Modified-Since")
+        not_modified = if_none_match == etag if if_none_match else (
+            if_modified_since is not None
+            and email.utils.parsedate_to_datetime(if_modified_since).timestamp() >= int(stat.st_mtime)
+        )
+        if not_modified:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end, status = 0, size - 1, 200
+        match = RANGE_PATTERN.match(self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if match and if_range in (None, etag, last_modified):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not send_body:
+            return
+
+        limit = end - start + 1
+        if status == 200 and self.drop_after is not None and path not in self.dropped:
+            self.dropped.add(path)
+            limit = min(limit, self.drop_after)
+            self.close_connection = True
+        with open(path, "rb") as f:
+            f.seek(start)
+            while limit > 0:
+                chunk = f.read(min(CHUNK_SIZE, limit))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                limit -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(directory, port=0, drop_after=None):
+    """
+    Serves a directory of table zips from a background thread.
+
+    Args:
+        directory: Directory holding the `<pid>-eng.zip` files.
+        port: Port to listen on; 0 picks a free one.
+        drop_after: (Optional) Cut the first full response for each file after this
+                    many bytes.
+
+    Returns:
+        The server (stop it with shutdown()) and its base URL.
+    """
+    handler = type(
+        "FixtureHandler", (TableRequestHandler,), {"drop_after": drop_after, "dropped": set()}
+    )
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", port), functools.partial(handler, directory=directory)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+#### Serve tables ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve table zips like StatCan's downloads")
+    parser.add_argument("directory", help="Directory of <pid>-eng.zip files to serve")
+    parser.add_argument(
+        "--from-csvs",
+        metavar="CSV_DIR",
+        help="First zip the table CSVs in this directory (e.g. data/01-raw_data) into it",
+    )
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--drop-after",
+        type=int,
+        metavar="BYTES",
+        help="Cut the first full response for each file after this many bytes",
+    )
+    args = parser.parse_args()
+
+    if args.from_csvs:
+        for zip_path in zip_tables(args.from_csvs, args.directory):
+            print(f"Wrote {zip_path}")
+    server, base_url = start_server(args.directory, port=args.port, drop_after=args.drop_after)
+    print(f"Serving {args.directory} at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,341 @@
+#### Preamble ####
+# Purpose: Records timed spans (reads, filters, pivots, merges, writes) of the pipeline
+# scripts as JSON-lines traces, and samples stacks of one stage for profiling
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: PIPELINE_TRACE=trace.jsonl python scripts/03-analysis_data.py
+#        PIPELINE_PROFILE=03.folded python scripts/03-analysis_data.py
+#        python scripts/tracing.py trace.jsonl [--chrome trace.json]
+
+#### Workspace setup ####
+import argparse
+import atexit
+import collections
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+#### Define tracing settings ####
+
+# Tracing is off unless PIPELINE_TRACE names a file to append spans to. The setting
+# is read from the environment so stages run as child processes inherit it.
+TRACE_PATH = os.environ.get("PIPELINE_TRACE")
+
+# PIPELINE_PROFILE names a file to write sampled stacks to, in the folded format
+# of flame graph tools ("outer;inner;leaf count" per line)
+PROFILE_PATH = os.environ.get("PIPELINE_PROFILE")
+PROFILE_INTERVAL = float(os.environ.get("PIPELINE_PROFILE_INTERVAL", "0.005"))
+
+# Linux can reset a process's peak RSS, which gives each span its own peak;
+# elsewhere spans report the process's peak so far
+PEAK_RESET_PATH = "/proc/self/clear_refs"
+STATUS_PATH = "/proc/self/status"
+
+#### Define tracing functions ####
+
+
+def read_peak_rss():
+    """Returns the peak resident set size since the last reset, in bytes."""
+    if os.path.exists(STATUS_PATH):
+        with open(STATUS_PATH) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def reset_peak_rss():
+    """Resets the peak RSS to the current RSS, where the OS allows it."""
+    try:
+        with open(PEAK_RESET_PATH, "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def path_bytes(paths):
+    """Returns the total size in bytes of files, or of every file under directories."""
+    if isinstance(paths, str):
+        paths = [paths]
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+class Tracer:
+    """Writes finished spans to a JSON-lines file as Chrome trace events."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    @property
+    def stack(self):
+        """The calling thread's open spans, innermost last."""
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def emit(self, event):
+        # One write per line in append mode, so stages tracing to the same file
+        # from several processes don't interleave within a line
+        line = json.dumps(event, default=str) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class Span:
+    """
+    One timed step of a script, with attributes such as rows and bytes in and out.
+
+    Used as a context manager; attributes known only at the end (e.g. the rows a
+    filter kept) are added with set().
+    """
+
+    enabled = True
+
+    def __init__(self, tracer, kind, label, attrs):
+        self.tracer = tracer
+        self.kind = kind
+        self.label = label
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Adds attributes to the span."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        # The peak so far counts towards every open span before it is reset
+        peak = read_peak_rss()
+        for parent in self.tracer.stack:
+            parent.peak_rss = max(parent.peak_rss, peak)
+        reset_peak_rss()
+
+        self.peak_rss = 0
+        self.tracer.stack.append(self)
+        self.wall_start = time.time_ns()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter_ns() - self.start
+        self.peak_rss = max(self.peak_rss, read_peak_rss())
+        self.tracer.stack.pop()
+        if self.tracer.stack:
+            parent = self.tracer.stack[-1]
+            parent.peak_rss = max(parent.peak_rss, self.peak_rss)
+
+        args = dict(self.attrs, peak_rss_bytes=self.peak_rss)
+        if exc_type is not None:
+            args["error"] = exc_type.__name__
+        self.tracer.emit({
+            "name": self.label or self.kind,
+            "cat": self.kind,
+            "ph": "X",
+            "ts": self.wall_start // 1000,
+            "dur": duration / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+        return False
+
+
+class NullSpan:
+    """The span handed out while tracing is off; every operation is a no-op."""
+
+    enabled = False
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+_tracer = Tracer(TRACE_PATH) if TRACE_PATH else None
+
+
+def span(kind, label=None, **attrs):
+    """
+    Times a step of a script as a span of the trace.
+
+    While tracing is off this returns a shared no-op span, so instrumented code costs
+    one function call per span. Work done only to fill in attributes (e.g. summing
+    file sizes) should check the span's `enabled` flag first.
+
+    Args:
+        kind: The kind of step: 'stage', 'read', 'filter', 'groupby', 'pivot',
+              'merge', 'write', ...
+        label: (Optional) Name of this particular step, e.g. 'read clean_transit_data'.
+        **attrs: Attributes of the span, e.g. rows_in=len(data) or path=...
+
+    Examples:
+        with span("filter", rows_in=len(data)) as s:
+            data = data[data["Year"] >= 2023]
+            s.set(rows_out=len(data))
+    """
+    if _tracer is None:
+        return NULL_SPAN
+    return Span(_tracer, kind, label, attrs)
+
+
+def tracing_enabled():
+    """Returns True if spans are being recorded."""
+    return _tracer is not None
+
+
+def start_stage_span():
+    """
+    Opens a span covering the whole running script, closed when the process exits.
+
+    Called on import, so every script that imports this module (directly or through
+    datasets.py) gets a stage span without changes of its own.
+    """
+    script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+    stage_span = span("stage", script).__enter__()
+    atexit.register(stage_span.__exit__, None, None, None)
+
+
+#### Define profiling functions ####
+
+
+class StackSampler:
+    """
+    Samples the main thread's Python stack at a fixed interval from a background thread.
+
+    Sampling costs the profiled code nothing between samples, so it can run on a
+    full-size stage; stacks are counted in folded form for flame graph tools.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.thread_id = threading.main_thread().ident
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        """Saves the sampled stacks in folded format, most frequent first."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def start_profiler(path):
+    """Samples the running script's stacks until it exits, then writes them to `path`."""
+    sampler = StackSampler().start()
+
+    def finish():
+        sampler.stop()
+        sampler.write(path)
+
+    atexit.register(finish)
+    return sampler
+
+
+if _tracer is not None:
+    start_stage_span()
+if PROFILE_PATH:
+    start_profiler(PROFILE_PATH)
+
+
+#### Define trace reading functions ####
+
+
+def read_trace(path):
+    """Reads the spans of a JSON-lines trace."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_chrome_trace(events, path):
+    """Saves spans as one Chrome trace JSON file, for chrome://tracing or Perfetto."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def enclosing_stage(event, stage_events):
+    """
+    Returns the name of the innermost stage span of the same process that contains an event.
+
+    One process can run several stages (a warm pipeline run or a pool worker), so
+    spans are matched to stages by time as well as by process.
+    """
+    end = event["ts"] + event["dur"]
+    containing = [
+        stage
+        for stage in stage_events
+        if stage["pid"] == event["pid"]
+        and stage["ts"] <= event["ts"]
+        and end <= stage["ts"] + stage["dur"] + 1
+    ]
+    if not containing:
+        return "?"
+    return min(containing, key=lambda stage: stage["dur"])["name"]
+
+
+def summarize_trace(events):
+    """Prints the total time, count and largest peak RSS of the spans of each stage and kind."""
+    stage_events = [event for event in events if event["cat"] == "stage"]
+    totals = collections.defaultdict(lambda: [0, 0.0, 0])
+    for event in events:
+        key = (enclosing_stage(event, stage_events), event["cat"], event["name"])
+        total = totals[key]
+        total[0] += 1
+        total[1] += event["dur"] / 1e6
+        total[2] = max(total[2], event["args"].get("peak_rss_bytes", 0))
+
+    print(f"{'stage':<32} {'kind':<8} {'span':<40} {'count':>5} {'seconds':>8} {'peak MB':>8}")
+    for (stage, kind, name), (count, seconds, peak) in sorted(totals.items()):
+        print(f"{stage:<32} {kind:<8} {name[:40]:<40} {count:>5} {seconds:>8.3f} {peak / 2**20:>8.1f}")
+
+
+#### Summarize a trace ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a JSON-lines pipeline trace")
+    parser.add_argument("trace", help="Trace written with PIPELINE_TRACE")
+    parser.add_argument("--chrome", help="Also save it as a Chrome trace JSON file")
+    args = parser.parse_args()
+
+    trace_events = read_trace(args.trace)
+    summarize_trace(trace_events)
+    if args.chrome:
+        write_chrome_trace(trace_events, args.chrome)
@@ -0,0 +1,349 @@
+#### Preamble ####
+# Purpose: Materializes the clean transit data as a cube over all its dimensions, with
+# roll-ups across CMAs, and answers slice and dice lookups from it in memory
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: 02.1-clean_transit_data.py
+# Usage: python scripts/transit_cube.py --geography Halifax --year 2024 --distance "500 metres
+# from all public transit stops" --characteristic "15 to 64 years"
+#        python scripts/transit_cube.py --serve [--port 8001]
+
+#### Workspace setup ####
+import argparse
+import http.server
+import json
+import threading
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+#### Define cube settings ####
+
+cube_path = "data/02-analysis_data/transit_cube.npz"
+
+# Axes of the cube, in order, and the query keys that select along them
+CUBE_DIMENSIONS = [
+    "CMA_ID",
+    "Year",
+    "Transit_Distance_Category",
+    "Transit_Profile_Characteristic",
+    "Measure",
+]
+QUERY_KEYS = {
+    "geography": "CMA_ID",
+    "year": "Year",
+    "distance": "Transit_Distance_Category",
+    "characteristic": "Transit_Profile_Characteristic",
+    "measure": "Measure",
+}
+
+COUNT_MEASURE = "Count of population within service area"
+PROPORTION_MEASURE = "Proportion of population within service area"
+
+# Label of the roll-up across every CMA, kept after the CMAs on the geography axis.
+# Counts are summed; proportions are weighted by each CMA's population, which is
+# recovered as count / proportion (so CMAs with a proportion of 0 are left out of
+# the weights). The other dimensions are not rolled up: distance categories nest
+# and demographic groups overlap, so their totals would double count.
+ALL_CMAS = "All"
+ALL_CMAS_NAME = "All CMAs"
+
+#### Define cube functions ####
+
+
+@dataclass
+class TransitCube:
+    """
+    A dense array of transit values with one axis per dimension in CUBE_DIMENSIONS.
+
+    `labels` holds each axis's labels, sorted (the geography axis ends with the
+    ALL_CMAS roll-up), and `names` the CMA name of each geography label. A hash index
+    from label (and, for geographies, CMA name) to position is built on load, so a
+    lookup is a few dict gets and one array index; missing cells are NaN.
+    """
+
+    labels: list
+    values: np.ndarray
+    names: np.ndarray
+    index: list = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.index = []
+        for labels in self.labels:
+            positions = {label: pos for pos, label in enumerate(labels.tolist())}
+            # Also accept labels as text, e.g. years from a query string
+            positions.update({str(label): pos for label, pos in list(positions.items())})
+            self.index.append(positions)
+        self.index[0].update({name: pos for pos, name in enumerate(self.names.tolist())})
+
+    def positions(self, axis, selector):
+        """
+        Returns the positions a selector picks on one axis.
+
+        Args:
+            axis: Position of the dimension in CUBE_DIMENSIONS.
+            selector: None for every label (without the roll-up), a label, a list of
+                      labels, or a slice of labels with inclusive bounds (e.g.
+                      slice(2016, 2020)), which is found by binary search.
+
+        Returns:
+            A position, or an array of positions.
+        """
+        labels = self.labels[axis]
+        stop = len(labels) - 1 if axis == 0 else len(labels)
+        if selector is None:
+            return np.arange(stop)
+        if isinstance(selector, slice):
+            # The roll-up is past the sorted labels, so it is never in a range
+            start = 0 if selector.start is None else np.searchsorted(labels[:stop], selector.start)
+            end = stop if selector.stop is None else np.searchsorted(
+                labels[:stop], selector.stop, side="right"
+            )
+            return np.arange(start, end)
+        if isinstance(selector, (list, tuple, np.ndarray, pd.Index)):
+            return np.array([self.position(axis, label) for label in selector], dtype=int)
+        return self.position(axis, selector)
+
+    def position(self, axis, label):
+        try:
+            return self.index[axis][label]
+        except KeyError:
+            raise KeyError(f"{label!r} is not a {CUBE_DIMENSIONS[axis]} in the cube") from None
+
+    def select(self, **selectors):
+        """
+        Returns the cells a query picks, without building a DataFrame.
+
+        Args:
+            **selectors: One per query key in QUERY_KEYS (geography, year, distance,
+                         characteristic, measure); see positions(). Keys left out
+                         select every label.
+
+        Returns:
+            The labels of each dimension that was not fixed to one label, and the
+            values (a float if every dimension was fixed).
+        """
+        unknown = set(selectors) - set(QUERY_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown query key(s): {', '.join(sorted(unknown))}")
+
+        picked = [
+            self.positions(axis, selectors.get(key))
+            for axis, key in enumerate(QUERY_KEYS)
+        ]
+        free = [axis for axis, pos in enumerate(picked) if not np.isscalar(pos)]
+        if not free:
+            return {}, float(self.values[tuple(picked)])
+
+        # Fixed axes index directly; the free ones are crossed with np.ix_
+        crossed = np.ix_(*(picked[axis] for axis in free))
+        key = list(picked)
+        for axis, positions in zip(free, crossed):
+            key[axis] = positions
+        values = self.values[tuple(key)]
+        labels = {CUBE_DIMENSIONS[axis]: self.labels[axis][picked[axis]] for axis in free}
+        return labels, values
+
+    def query(self, **selectors):
+        """
+        Looks up a slice of the cube.
+
+        Returns:
+            A float if every dimension is fixed to one label, otherwise a DataFrame
+            with a column per free dimension and a 'Value' column, one row per cell
+            that has a value.
+        """
+        labels, values = self.select(**selectors)
+        if not labels:
+            return values
+        values = values.ravel()
+        has_value = ~np.isnan(values)
+        grids = np.meshgrid(*labels.values(), indexing="ij")
+        cells = {dim: grid.ravel()[has_value] for dim, grid in zip(labels, grids)}
+        cells["Value"] = values[has_value]
+        return pd.DataFrame(cells)
+
+
+def dimension_codes(column):
+    """Returns each row's position among the column's sorted distinct labels, and the labels."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Sorted through the categories, so the strings are compared once each
+        column = column.cat.remove_unused_categories()
+        categories = column.cat.categories
+        order = categories.argsort()
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return rank[column.cat.codes.to_numpy()], categories[order].to_numpy()
+    codes, labels = pd.factorize(column, sort=True)
+    return codes, np.asarray(labels)
+
+
+def roll_up_cmas(values, measures):
+    """Fills the ALL_CMAS slot (the last on the geography axis) of each measure."""
+    measures = list(measures)
+    cmas = values[:-1]
+    if COUNT_MEASURE in measures:
+        count = cmas[..., measures.index(COUNT_MEASURE)]
+        has_count = ~np.isnan(count).all(axis=0)
+        values[-1, ..., measures.index(COUNT_MEASURE)] = np.where(
+            has_count, np.nansum(count, axis=0), np.nan
+        )
+        if PROPORTION_MEASURE in measures:
+            proportion = cmas[..., measures.index(PROPORTION_MEASURE)]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                population = np.where(proportion > 0, count * 100 / proportion, np.nan)
+                weighted = np.where(np.isnan(population), np.nan, count)
+                values[-1, ..., measures.index(PROPORTION_MEASURE)] = (
+                    100 * np.nansum(weighted, axis=0) / np.nansum(population, axis=0)
+                )
+
+
+def build_cube(transit_data):
+    """
+    Builds the cube from the clean transit data in one vectorized scatter.
+
+    Args:
+        transit_data: DataFrame with the CUBE_DIMENSIONS, CMA and Transit_Value columns.
+
+    Returns:
+        A TransitCube.
+    """
+    codes, labels = zip(*(dimension_codes(transit_data[dim]) for dim in CUBE_DIMENSIONS))
+    labels = list(labels)
+    shape = [len(dim_labels) for dim_labels in labels]
+
+    flat = np.ravel_multi_index(codes, shape)
+    if len(np.unique(flat)) != len(flat):
+        raise ValueError(f"The transit data has more than one value per {', '.join(CUBE_DIMENSIONS)}")
+
+    # One extra slot on the geography axis for the roll-up
+    values = np.full([shape[0] + 1, *shape[1:]], np.nan)
+    values[codes] = transit_data["Transit_Value"].to_numpy(dtype="float64")
+    roll_up_cmas(values, labels[-1])
+
+    names = (
+        transit_data[["CMA_ID", "CMA"]]
+        .drop_duplicates("CMA_ID")
+        .astype(object)
+        .set_index("CMA_ID")["CMA"]
+        .reindex(labels[0])
+        .to_numpy(dtype=object)
+    )
+    labels[0] = np.append(labels[0].astype(object), ALL_CMAS)
+    return TransitCube(labels=labels, values=values, names=np.append(names, ALL_CMAS_NAME))
+
+
+def save_cube(cube, path=cube_path):
+    """Saves a cube as an uncompressed .npz archive, which loads without unpickling."""
+    np.savez(
+        path,
+        values=cube.values,
+        names=cube.names.astype(str),
+        **{f"labels_{axis}": labels.astype(str) for axis, labels in enumerate(cube.labels)},
+        year_labels=cube.labels[CUBE_DIMENSIONS.index("Year")].astype("int64"),
+    )
+
+
+def load_cube(path=cube_path):
+    """Loads a cube saved by save_cube()."""
+    with np.load(path, allow_pickle=False) as saved:
+        labels = [saved[f"labels_{axis}"].astype(object) for axis in range(len(CUBE_DIMENSIONS))]
+        labels[CUBE_DIMENSIONS.index("Year")] = saved["year_labels"]
+        return TransitCube(labels=labels, values=saved["values"], names=saved["names"].astype(object))
+
+
+class CubeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers GET /query?geography=...&year=...&distance=...&characteristic=...&measure=...
+    with the matching cells as JSON, and GET /dimensions with every axis's labels.
+
+    A repeated key selects several labels; a key left out selects all of them.
+    """
+
+    protocol_version = "HTTP/1.1"
+    cube = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            if url.path == "/dimensions":
+                body = {
+                    key: self.cube.labels[axis].tolist()
+                    for axis, key in enumerate(QUERY_KEYS)
+                }
+                body["geography_names"] = self.cube.names.tolist()
+            elif url.path == "/query":
+                selectors = {
+                    key: values[0] if len(values) == 1 else values
+                    for key, values in parse_qs(url.query).items()
+                }
+                result = self.cube.query(**selectors)
+                body = (
+                    {"value": None if np.isnan(result) else result}
+                    if isinstance(result, float)
+                    else {"cells": json.loads(result.to_json(orient="records"))}
+                )
+            else:
+                self.send_json(404, {"error": f"Unknown path: {url.path}"})
+                return
+        except (KeyError, ValueError) as error:
+            self.send_json(400, {"error": str(error.args[0])})
+            return
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_cube_server(cube, port=8001):
+    """
+    Serves cube lookups over HTTP on localhost from a background thread.
+
+    Returns:
+        The server (stop it with shutdown()) and its base URL.
+    """
+    handler = type("LoadedCubeHandler", (CubeRequestHandler,), {"cube": cube})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+#### Query the cube ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up transit access values in the cube")
+    parser.add_argument("--cube", default=cube_path, help="Cube file written by 03.1-transit_cube.py")
+    for key in QUERY_KEYS:
+        parser.add_argument(f"--{key}", nargs="+", help=f"{QUERY_KEYS[key]} label(s); all if omitted")
+    parser.add_argument("--serve", action="store_true", help="Serve lookups over HTTP instead")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    cube = load_cube(args.cube)
+    if args.serve:
+        server, base_url = start_cube_server(cube, port=args.port)
+        print(f"Serving {args.cube} at {base_url}query and {base_url}dimensions")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        selectors = {
+            key: values[0] if len(values) == 1 else values
+            for key in QUERY_KEYS
+            if (values := getattr(args, key)) is not None
+        }
+        result = cube.query(**selectors)
+        print(result.to_string(index=False) if isinstance(result, pd.DataFrame) else result)
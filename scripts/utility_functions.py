@@ -0,0 +1,171 @@
+#### Preamble ####
+# Purpose: Defines utility functions for data processing tasks
+# Author: Arusan Surendiran
+# Date: 1 December 2025
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+
+#### Workspace setup ####
+from dataclasses import dataclass
+
+import pandas as pd
+
+#### Define utility functions ####
+
+
+def map_categories(series, func):
+    """
+    Applies a string clean-up to a categorical Series once per category instead of once per row.
+
+    Args:
+        series: A Series of strings; converted to a categorical if it is not one already.
+        func: A function mapping one category value to its cleaned value.
+
+    Returns:
+        A categorical Series of the cleaned values. Categories that clean to the same
+        value are merged.
+    """
+    series = series.astype("category")
+    categories = series.cat.categories
+    cleaned = pd.Index([func(value) for value in categories])
+    if cleaned.is_unique:
+        return series.cat.rename_categories(cleaned)
+
+    # Several categories clean to the same value, so recode rows to the merged ones
+    merged = cleaned.unique()
+    codes = merged.get_indexer(cleaned)[series.cat.codes.to_numpy()]
+    codes[series.isna().to_numpy()] = -1
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=merged), index=series.index, name=series.name
+    )
+
+
+@dataclass
+class IdIndex:
+    """
+    The distinct IDs of a DataFrame with their row counts and a representative name.
+
+    `ids` is indexed by ID, sorted, with a 'rows' column and, if a name column was
+    given, a 'name' column holding the first name seen for each ID.
+    """
+
+    ids: pd.DataFrame
+    id_col: str
+    name_col: str = None
+
+
+def build_id_index(df, id_col, name_col=None):
+    """Summarizes the ID column of a DataFrame in one hashed pass over its rows."""
+    grouped = df.groupby(id_col, sort=True, observed=True)
+    ids = grouped.size().to_frame("rows")
+    if name_col:
+        ids["name"] = grouped[name_col].first()
+    if isinstance(ids.index, pd.CategoricalIndex):
+        # Plain IDs, so indexes built from differently encoded columns align
+        ids.index = ids.index.astype(object)
+        ids = ids.sort_index()
+    return IdIndex(ids=ids, id_col=id_col, name_col=name_col)
+
+
+@dataclass
+class IdConsistency:
+    """
+    The result of comparing the IDs of two datasets.
+
+    Each frame has the ID and name columns of its dataset plus row counts: 'rows'
+    for the one-sided frames, and 'rows_1' and 'rows_2' for `in_both`, whose names
+    come from the first dataset. Printing the result gives a readable report.
+    """
+
+    only_in_1: pd.DataFrame
+    only_in_2: pd.DataFrame
+    in_both: pd.DataFrame
+    label1: str = "Dataset 1"
+    label2: str = "Dataset 2"
+
+    @property
+    def is_consistent(self):
+        """True if every ID appears in both datasets."""
+        return self.only_in_1.empty and self.only_in_2.empty
+
+    def __str__(self):
+        lines = [f"--- Comparison: {self.label1} vs. {self.label2} ---\n"]
+
+        # Only in Dataset 1, then only in Dataset 2
+        for label, only_in in [
+            (self.label1, self.only_in_1),
+            (self.label2, self.only_in_2),
+        ]:
+            lines.append(f"IDs only in {label}: ({len(only_in)})")
+            lines.append(only_in.to_string(index=False) if len(only_in) else "None")
+            lines.append("-" * 40)
+
+        # Common to both, limited to 3 rows for readability
+        lines.append(f"IDs present in BOTH: ({len(self.in_both)})")
+        if len(self.in_both):
+            lines.append(self.in_both.head(3).to_string(index=False))
+            if len(self.in_both) > 3:
+                lines.append(f"...and {len(self.in_both) - 3} more.")
+        else:
+            lines.append("None")
+        return "\n".join(lines)
+
+
+def id_report(aligned, index, suffix, row_cols):
+    """Labels part of an aligned ID frame with the ID and name columns of `index`."""
+    report = pd.DataFrame({index.id_col: aligned.index})
+    if index.name_col:
+        report[index.name_col] = aligned[f"name{suffix}"].to_numpy()
+    for col, label in row_cols.items():
+        report[label] = aligned[col].to_numpy().astype("int64")
+    return report
+
+
+def check_id_consistency(
+    df1,
+    df2,
+    id_col1=None,
+    id_col2=None,
+    name_col1=None,
+    name_col2=None,
+    label1="Dataset 1",
+    label2="Dataset 2",
+):
+    """
+    Compares unique identifiers between two DataFrames to check for consistency.
+
+    Each side is reduced to its distinct IDs in one hashed pass, and the two ID
+    indexes are aligned with a single sorted outer join.
+
+    Args:
+        df1, df2: The DataFrames to compare, or IdIndex objects from build_id_index()
+                  so repeated checks against the same table don't rescan it.
+        id_col1, id_col2: The names of the ID columns to match on. Not needed for an IdIndex.
+        name_col1, name_col2: (Optional) Descriptive columns to display alongside IDs.
+                              If None, only IDs are displayed.
+        label1, label2: (Optional) String labels for the printed report.
+
+    Returns:
+        An IdConsistency with the IDs only in df1, only in df2, and in both.
+    """
+    index1 = df1 if isinstance(df1, IdIndex) else build_id_index(df1, id_col1, name_col1)
+    index2 = df2 if isinstance(df2, IdIndex) else build_id_index(df2, id_col2, name_col2)
+
+    aligned = index1.ids.add_suffix("_1").join(index2.ids.add_suffix("_2"), how="outer")
+    in_1 = aligned["rows_1"].notna()
+    in_2 = aligned["rows_2"].notna()
+
+    only_in_1 = id_report(aligned[in_1 & ~in_2], index1, "_1", {"rows_1": "rows"})
+    only_in_2 = id_report(aligned[in_2 & ~in_1], index2, "_2", {"rows_2": "rows"})
+    in_both = id_report(
+        aligned[in_1 & in_2], index1, "_1", {"rows_1": "rows_1", "rows_2": "rows_2"}
+    )
+
+    return IdConsistency(
+        only_in_1=only_in_1,
+        only_in_2=only_in_2,
+        in_both=in_both,
+        label1=label1,
+        label2=label2,
+    )
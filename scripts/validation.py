@@ -0,0 +1,647 @@
+#### Preamble ####
+# Purpose: Declares the schema and rules of every pipeline artifact and checks all the
+# rules of a table in one streaming pass over its row groups
+# Author: Arusan Surendiran
+# Date: 18 October 2026
+# Contact: arusan.surendiran@utoronto.ca
+# License: MIT
+# Pre-requisites: None
+# Usage: python scripts/validation.py [<artifact> ...]
+
+#### Workspace setup ####
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from datasets import partitioning
+from stages import transit_years
+from tracing import span
+
+#### Define validation rules ####
+
+# Each rule names the columns it needs, checks the table's schema before the scan,
+# updates its running state from every record batch, and reports its failures at the
+# end. The columns of every rule of a table are read together, once.
+
+
+class Rule:
+    """Base class of the validation rules."""
+
+    columns = ()
+
+    def resolve(self, root):
+        """Looks up the values the rule takes from upstream artifacts under `root`."""
+
+    def start(self):
+        """Resets the running state before a scan."""
+
+    def check_schema(self, schema):
+        """Returns failure messages that the schema alone shows (e.g. missing columns)."""
+        missing = [col for col in self.columns if col not in schema.names]
+        return [f"missing column(s): {', '.join(missing)}"] if missing else []
+
+    def update(self, batch):
+        """Adds an Arrow record batch holding (at least) the rule's columns."""
+
+    def failures(self):
+        """Returns the failure messages of the values seen in the scan."""
+        return []
+
+
+# Arrow type checks by expected kind; dictionary columns are checked by their values
+TYPE_KINDS = {
+    "string": pa.types.is_string,
+    "integer": pa.types.is_integer,
+    "float": pa.types.is_floating,
+    "numeric": lambda arrow_type: pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type),
+}
+
+
+class ColumnTypes(Rule):
+    """Every listed column exists and has the expected kind of type ('string', 'integer', 'float', 'numeric')."""
+
+    def __init__(self, kinds):
+        self.kinds = kinds
+        self.columns = ()
+
+    def __str__(self):
+        return f"column types of {len(self.kinds)} columns"
+
+    def check_schema(self, schema):
+        messages = []
+        for col, kind in self.kinds.items():
+            if col not in schema.names:
+                messages.append(f"missing column {col}")
+                continue
+            arrow_type = schema.field(col).type
+            if pa.types.is_dictionary(arrow_type):
+                arrow_type = arrow_type.value_type
+            if not TYPE_KINDS[kind](arrow_type):
+                messages.append(f"{col} is {arrow_type}, expected {kind}")
+        return messages
+
+
+class NotNull(Rule):
+    """The listed columns have no missing values."""
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+
+    def __str__(self):
+        return f"no missing values in {len(self.columns)} columns"
+
+    def start(self):
+        self.null_counts = dict.fromkeys(self.columns, 0)
+
+    def update(self, batch):
+        for col in self.columns:
+            self.null_counts[col] += batch.column(col).null_count
+
+    def failures(self):
+        return [
+            f"{col} has {count} missing values"
+            for col, count in self.null_counts.items()
+            if count
+        ]
+
+
+def distinct_values(array):
+    """Returns the distinct non-null values of an Arrow array as a set of Python values."""
+    values = pc.unique(array)
+    if pa.types.is_dictionary(values.type):
+        values = values.dictionary_decode()
+    return set(values.drop_null().to_pylist())
+
+
+@dataclass(frozen=True)
+class Upstream:
+    """
+    The distinct values of a column of another artifact, read when a rule is checked.
+
+    Rules compare against these rather than fixed values, so they hold for any
+    sample of CMAs and years (e.g. synthetic data). `cast` converts each value, e.g.
+    str for years that an artifact stores as text, and `among` keeps only the values
+    a stage selects from the artifact (e.g. the analysis years).
+    """
+
+    artifact: str
+    column: str
+    cast: type = None
+    among: tuple = None
+
+    def __str__(self):
+        among = "" if self.among is None else f" among {list(self.among)}"
+        return f"{self.column} of {os.path.basename(self.artifact)}{among}"
+
+    def values(self, root):
+        path = os.path.normpath(os.path.join(root, self.artifact))
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run the stage that writes it first")
+        values = set()
+        for batch in open_dataset(path).to_batches(columns=[self.column]):
+            values |= distinct_values(batch.column(self.column))
+        if self.cast is not None:
+            values = {self.cast(value) for value in values}
+        return values if self.among is None else values & set(self.among)
+
+
+def resolve_values(values, root):
+    """Returns a set of values, reading them from the artifact if they are Upstream."""
+    return values.values(root) if isinstance(values, Upstream) else set(values)
+
+
+class AllowedValues(Rule):
+    """
+    A column only holds the allowed values (a list, or an Upstream column).
+
+    With exact=True every allowed value must also occur, as for the years of a table
+    that keeps every year of its source.
+    """
+
+    def __init__(self, column, values, exact=False):
+        self.columns = (column,)
+        self.allowed = values
+        self.exact = exact
+
+    def __str__(self):
+        allowed = self.allowed if isinstance(self.allowed, Upstream) else sorted(self.allowed)
+        return f"{self.columns[0]} in {allowed}"
+
+    def resolve(self, root):
+        self.values = resolve_values(self.allowed, root)
+
+    def start(self):
+        self.seen = set()
+
+    def update(self, batch):
+        self.seen |= distinct_values(batch.column(self.columns[0]))
+
+    def failures(self):
+        messages = []
+        unexpected = self.seen - self.values
+        if unexpected:
+            messages.append(f"unexpected values {sorted(unexpected)}")
+        absent = self.values - self.seen
+        if self.exact and absent:
+            messages.append(f"values never seen {sorted(absent)}")
+        return messages
+
+
+class ValueRange(Rule):
+    """
+    A numeric column lies within [minimum, maximum] (either bound may be None).
+
+    `where` restricts the check to rows whose column equals a value, e.g.
+    ("UOM", "Percent") for the rows that are percentages.
+    """
+
+    def __init__(self, column, minimum=None, maximum=None, where=None):
+        self.column = column
+        self.minimum = minimum
+        self.maximum = maximum
+        self.where = where
+        self.columns = (column,) if where is None else (column, where[0])
+
+    def __str__(self):
+        condition = "" if self.where is None else f" where {self.where[0]} == {self.where[1]!r}"
+        return f"{self.column} in [{self.minimum}, {self.maximum}]{condition}"
+
+    def start(self):
+        self.outside = 0
+        self.low = None
+        self.high = None
+
+    def update(self, batch):
+        values = batch.column(self.column)
+        if self.where is not None:
+            values = values.filter(pc.equal(batch.column(self.where[0]), self.where[1]))
+        if len(values) == values.null_count:
+            return
+
+        outside = pa.scalar(False)
+        if self.minimum is not None:
+            outside = pc.or_(outside, pc.less(values, self.minimum))
+        if self.maximum is not None:
+            outside = pc.or_(outside, pc.greater(values, self.maximum))
+        self.outside += pc.sum(outside).as_py() or 0
+
+        bounds = pc.min_max(values).as_py()
+        self.low = bounds["min"] if self.low is None else min(self.low, bounds["min"])
+        self.high = bounds["max"] if self.high is None else max(self.high, bounds["max"])
+
+    def failures(self):
+        if not self.outside:
+            return []
+        return [f"{self.outside} values outside the range (seen {self.low} to {self.high})"]
+
+
+def row_hashes(array):
+    """
+    Hashes each value of an Arrow array to a uint64, with one shared hash for nulls.
+
+    Only the distinct values are hashed (through the array's dictionary, encoding it
+    first if needed) and the hashes are gathered by index, so string columns are
+    never converted to Python objects row by row.
+    """
+    if not pa.types.is_dictionary(array.type):
+        array = pc.dictionary_encode(array)
+    dictionary = array.dictionary.to_numpy(zero_copy_only=False)
+    value_hashes = np.append(pd.util.hash_array(dictionary, categorize=False), np.uint64(0))
+    indices = pc.fill_null(array.indices, len(dictionary)).to_numpy()
+    return value_hashes[indices]
+
+
+class UniqueKey(Rule):
+    """
+    No two rows share the same key.
+
+    Keeps one 64-bit hash per row rather than the keys themselves, so the state is
+    8 bytes a row whatever the key's width.
+    """
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+
+    def __str__(self):
+        return f"unique key ({', '.join(self.columns)})"
+
+    def start(self):
+        self.hashes = []
+
+    def update(self, batch):
+        # Combines the column hashes in order, as in FNV-1a
+        hashes = np.full(batch.num_rows, 0xCBF29CE484222325, dtype=np.uint64)
+        for col in self.columns:
+            hashes = (hashes ^ row_hashes(batch.column(col))) * np.uint64(0x100000001B3)
+        self.hashes.append(hashes)
+
+    def failures(self):
+        hashes = np.concatenate(self.hashes) if self.hashes else np.empty(0, dtype=np.uint64)
+        # Sorting in place puts repeated keys next to each other, without the copy and
+        # the unique values np.unique would build
+        hashes.sort()
+        duplicates = np.count_nonzero(hashes[1:] == hashes[:-1])
+        return [f"{duplicates} rows repeat a key"] if duplicates else []
+
+
+class IncludesValues(Rule):
+    """A column holds every one of the given values (a list, or an Upstream column), and possibly others."""
+
+    def __init__(self, column, values):
+        self.columns = (column,)
+        self.required = values
+
+    def __str__(self):
+        required = self.required if isinstance(self.required, Upstream) else sorted(self.required)
+        return f"{self.columns[0]} includes {required}"
+
+    def resolve(self, root):
+        self.values = resolve_values(self.required, root)
+
+    def start(self):
+        self.seen = set()
+
+    def update(self, batch):
+        self.seen |= distinct_values(batch.column(self.columns[0]))
+
+    def failures(self):
+        absent = self.values - self.seen
+        return [f"{len(absent)} values never seen, e.g. {sorted(absent)[:5]}"] if absent else []
+
+
+class DistinctCount(Rule):
+    """
+    A column has the expected number of distinct non-missing values (e.g. CMAs).
+
+    `expected` is a count, or an Upstream column whose distinct values are counted.
+    """
+
+    def __init__(self, column, expected):
+        self.columns = (column,)
+        self.expected = expected
+
+    def __str__(self):
+        if isinstance(self.expected, Upstream):
+            return f"as many distinct {self.columns[0]} as {self.expected}"
+        return f"{self.expected} distinct {self.columns[0]}"
+
+    def resolve(self, root):
+        if isinstance(self.expected, Upstream):
+            self.count = len(self.expected.values(root))
+        else:
+            self.count = self.expected
+
+    def start(self):
+        self.seen = set()
+
+    def update(self, batch):
+        self.seen |= distinct_values(batch.column(self.columns[0]))
+
+    def failures(self):
+        if len(self.seen) == self.count:
+            return []
+        return [f"expected {self.count}, found {len(self.seen)}"]
+
+
+#### Define artifact rules ####
+
+# Years and CMAs are checked against the tables they come from rather than against
+# one sample's values: the raw transit table sets the years, and the clean transit
+# data the CMAs that every later table must cover.
+RAW_TRANSIT_PATH = "data/01-raw_data/public_transport_access"
+RAW_COMMUTE_PATH = "data/01-raw_data/commute_times"
+CLEAN_TRANSIT_PATH = "data/02-analysis_data/clean_transit_data"
+
+TRANSIT_YEARS = Upstream(RAW_TRANSIT_PATH, "REF_DATE")
+CENSUS_YEARS = Upstream(RAW_COMMUTE_PATH, "REF_DATE")
+CMA_IDS = Upstream(CLEAN_TRANSIT_PATH, "CMA_ID")
+
+# The years of the clean transit data that 03 keeps for the analysis data
+ANALYSIS_YEARS = Upstream(CLEAN_TRANSIT_PATH, "Year", among=tuple(transit_years))
+
+ARTIFACTS = {
+    "data/01-raw_data/public_transport_access": [
+        ColumnTypes({
+            "REF_DATE": "integer",
+            "GEO": "string",
+            "DGUID": "string",
+            "Distance-capacity public transit service area": "string",
+            "Demographic and socio-economic": "string",
+            "Sustainable Development Goals (SDGs) 11.2.1 indicator": "string",
+            "UOM": "string",
+            "VALUE": "numeric",
+        }),
+        NotNull(["REF_DATE", "DGUID", "UOM"]),
+        UniqueKey([
+            "DGUID",
+            "REF_DATE",
+            "Location",
+            "Gender",
+            "Distance-capacity public transit service area",
+            "Demographic and socio-economic",
+            "Sustainable Development Goals (SDGs) 11.2.1 indicator",
+        ]),
+        ValueRange("VALUE", 0, 100, where=("UOM", "Percent")),
+        ValueRange("VALUE", 0),
+    ],
+    "data/01-raw_data/labour_rates": [
+        ColumnTypes({
+            "REF_DATE": "string",
+            "REF_YEAR": "integer",
+            "GEO": "string",
+            "DGUID": "string",
+            "Labour force characteristics": "string",
+            "Data type": "string",
+            "UOM": "string",
+            "VALUE": "numeric",
+        }),
+        NotNull(["REF_DATE", "REF_YEAR", "DGUID", "UOM"]),
+        AllowedValues("REF_YEAR", TRANSIT_YEARS, exact=True),
+        UniqueKey(["DGUID", "REF_DATE", "Labour force characteristics", "Statistics", "Data type"]),
+        ValueRange("VALUE", 0, 100, where=("UOM", "Percent")),
+        ValueRange("VALUE", 0),
+    ],
+    "data/01-raw_data/commute_times": [
+        ColumnTypes({
+            "REF_DATE": "integer",
+            "GEO": "string",
+            "DGUID": "string",
+            "Main mode of commuting (21)": "string",
+            "VALUE": "numeric",
+        }),
+        NotNull(["REF_DATE", "DGUID"]),
+        UniqueKey(["DGUID", "REF_DATE", "Main mode of commuting (21)"]),
+        ValueRange("VALUE", 0),
+    ],
+    "data/02-analysis_data/clean_transit_data": [
+        ColumnTypes({
+            "CMA": "string",
+            "CMA_ID": "string",
+            "Year": "integer",
+            "Transit_Distance_Category": "string",
+            "Transit_Profile_Characteristic": "string",
+            "Transit_Unit_of_Measure": "string",
+            "Transit_Value": "float",
+        }),
+        NotNull(["CMA", "CMA_ID", "Year", "Transit_Distance_Category", "Transit_Value"]),
+        AllowedValues("Year", TRANSIT_YEARS, exact=True),
+        UniqueKey([
+            "CMA_ID",
+            "Year",
+            "Transit_Distance_Category",
+            "Transit_Profile_Characteristic",
+            "Measure",
+        ]),
+        ValueRange("Transit_Value", 0, 100, where=("Transit_Unit_of_Measure", "Percent")),
+        ValueRange("Transit_Value", 0),
+        AllowedValues("CMA_ID", Upstream(RAW_TRANSIT_PATH, "DGUID")),
+    ],
+    "data/02-analysis_data/clean_labour_data": [
+        ColumnTypes({
+            "Time_Period": "string",
+            "CMA": "string",
+            "CMA_ID": "string",
+            "Year": "string",
+            "Labour_Metric": "string",
+            "Labour_Data_Type": "string",
+            "Labour_Value": "float",
+        }),
+        NotNull(["Time_Period", "CMA_ID", "Year", "Labour_Metric", "Labour_Value"]),
+        AllowedValues("Year", Upstream(RAW_TRANSIT_PATH, "REF_DATE", cast=str), exact=True),
+        UniqueKey(["CMA_ID", "Time_Period", "Labour_Metric", "Labour_Data_Type"]),
+        ValueRange("Labour_Value", 0, 100, where=("Labour_Unit_of_Measure", "Percent")),
+        ValueRange("Labour_Value", 0),
+        AllowedValues("CMA_ID", CMA_IDS, exact=True),
+    ],
+    "data/02-analysis_data/clean_commute_data": [
+        ColumnTypes({
+            "CMA": "string",
+            "CMA_ID": "string",
+            "Census_Year": "integer",
+            "Commute_Mode": "string",
+            "Commute_Value": "float",
+        }),
+        NotNull(["CMA_ID", "Census_Year", "Commute_Mode", "Commute_Value"]),
+        AllowedValues("Census_Year", CENSUS_YEARS, exact=True),
+        UniqueKey(["CMA_ID", "Census_Year", "Commute_Mode"]),
+        ValueRange("Commute_Value", 0, 24 * 60),
+        IncludesValues("CMA_ID", CMA_IDS),
+    ],
+    "data/02-analysis_data/analysis_data.parquet": [
+        ColumnTypes({
+            "CMA_ID": "string",
+            "CMA_Name": "string",
+            "Year": "integer",
+            "Population": "numeric",
+            "Log_Population": "numeric",
+            "Transit_Access_Prop": "numeric",
+            "Avg_Commute_Car": "numeric",
+            "Avg_Commute_Transit": "numeric",
+            "Commute_Ratio": "numeric",
+            "Participation_Rate": "numeric",
+            "Unemployment_Rate": "numeric",
+        }),
+        NotNull([
+            "CMA_ID",
+            "CMA_Name",
+            "Year",
+            "Population",
+            "Log_Population",
+            "Transit_Access_Prop",
+            "Avg_Commute_Car",
+            "Avg_Commute_Transit",
+            "Commute_Ratio",
+            "Participation_Rate",
+            "Unemployment_Rate",
+        ]),
+        AllowedValues("Year", ANALYSIS_YEARS, exact=True),
+        UniqueKey(["CMA_ID", "Year"]),
+        ValueRange("Transit_Access_Prop", 0, 100),
+        ValueRange("Participation_Rate", 0, 100),
+        ValueRange("Unemployment_Rate", 0, 100),
+        ValueRange("Population", 0),
+        ValueRange("Commute_Ratio", 0),
+        AllowedValues("CMA_ID", CMA_IDS, exact=True),
+        DistinctCount("CMA_Name", CMA_IDS),
+    ],
+}
+
+#### Define validation functions ####
+
+
+@dataclass
+class RuleResult:
+    """The outcome of one rule on one artifact."""
+
+    rule: str
+    failures: list
+
+    @property
+    def passed(self):
+        return not self.failures
+
+
+@dataclass
+class ValidationReport:
+    """The outcome of every rule of one artifact."""
+
+    path: str
+    rows: int
+    results: list
+
+    @property
+    def passed(self):
+        return all(result.passed for result in self.results)
+
+    def __str__(self):
+        lines = [f"--- {self.path} ({self.rows} rows) ---"]
+        for result in self.results:
+            if result.passed:
+                lines.append(f"ok: {result.rule}")
+            for failure in result.failures:
+                lines.append(f"FAIL: {result.rule}: {failure}")
+        return "\n".join(lines)
+
+
+def open_dataset(path):
+    """Opens a Parquet file, or a partitioned dataset directory with its partition columns."""
+    if os.path.isdir(path):
+        return ds.dataset(path, format="parquet", partitioning=partitioning(path))
+    return ds.dataset(path, format="parquet")
+
+
+def validate_dataset(path, rules, root="."):
+    """
+    Checks every rule of a table in one streaming pass over its row groups.
+
+    The schema checks run first, without reading any data, and the rules then look up
+    the values they take from upstream artifacts (see Upstream). The columns every rule
+    needs are then read together, one record batch at a time, and each batch is
+    handed to every rule as Arrow arrays, so the table is decoded once however many rules it has.
+
+    Args:
+        path: A Parquet file, or a dataset directory registered in datasets.PARTITION_FIELDS.
+        rules: The Rule objects to check.
+        root: Directory the paths of upstream artifacts are relative to.
+
+    Returns:
+        A ValidationReport.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run the stage that writes it first")
+    dataset = open_dataset(path)
+
+    schema_failures = [rule.check_schema(dataset.schema) for rule in rules]
+    scanned = [
+        rule for rule, failures in zip(rules, schema_failures)
+        if not failures and rule.columns
+    ]
+    columns = list(dict.fromkeys(col for rule in scanned for col in rule.columns))
+
+    for rule in scanned:
+        rule.resolve(root)
+        rule.start()
+    rows = 0
+    with span("validate", f"validate {os.path.basename(path)}", rules=len(rules)) as validate_span:
+        for batch in dataset.to_batches(columns=columns):
+            rows += batch.num_rows
+            for rule in scanned:
+                rule.update(batch)
+        validate_span.set(rows_in=rows)
+
+    results = []
+    for rule, failures in zip(rules, schema_failures):
+        if not failures and rule in scanned:
+            failures = rule.failures()
+        results.append(RuleResult(str(rule), failures))
+    return ValidationReport(str(path), rows, results)
+
+
+def validate_artifact(artifact, root="."):
+    """Checks the declared rules of one artifact (a key of ARTIFACTS) under `root`."""
+    return validate_dataset(os.path.normpath(os.path.join(root, artifact)), ARTIFACTS[artifact], root)
+
+
+def validate_artifacts(artifacts=None, root="."):
+    """
+    Checks several artifacts and prints each report.
+
+    Args:
+        artifacts: (Optional) Keys of ARTIFACTS to check; all of them if None.
+        root: Directory the artifact paths are relative to.
+
+    Returns:
+        True if every rule of every artifact passed.
+    """
+    artifacts = list(ARTIFACTS) if artifacts is None else artifacts
+    unknown = [artifact for artifact in artifacts if artifact not in ARTIFACTS]
+    if unknown:
+        raise ValueError(f"No rules declared for: {', '.join(unknown)}")
+
+    passed = True
+    for artifact in artifacts:
+        report = validate_artifact(artifact, root)
+        print(report)
+        passed = passed and report.passed
+    return passed
+
+
+#### Validate artifacts ####
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the declared rules of pipeline artifacts")
+    parser.add_argument(
+        "artifacts",
+        nargs="*",
+        help="Artifact paths, as listed in ARTIFACTS (default: all)",
+    )
+    parser.add_argument("--root", default=".", help="Directory the artifact paths are relative to")
+    args = parser.parse_args()
+
+    sys.exit(0 if validate_artifacts(args.artifacts or None, args.root) else 1)